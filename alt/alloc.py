@@ -0,0 +1,256 @@
+#! /usr/bin/env python3
+
+"""An alternative Memory class for the OS, with a separate free list for each small block size.
+
+alt/profile.py showed that a surprising share of the cycles spent initializing the OS go to
+Memory.alloc(). The bundled implementation keeps a single free list, searched first-fit, which is
+simple, but every allocation pays for a general-purpose search, and after a while of allocating
+and freeing small objects (Strings, mostly) the list is a long chain of small blocks that every
+search has to walk past. Freed blocks are never merged, so the heap only gets more fragmented.
+
+Here, with the same external API:
+- Blocks smaller than 16 words (most objects, and the arrays used by most Strings) are recycled
+    through a list for each exact size, so allocating or freeing one takes a constant, small number
+    of steps.
+- Larger blocks go on a single list, kept in order of address, and are merged with their neighbors
+    as they're freed.
+- New blocks are carved from the part of the heap that's never been used, as long as it lasts; a
+    large block freed next to that part goes back to it.
+- When the heap runs out, all the small free blocks are merged into the large list, and the search
+    is tried again.
+
+To use it with any platform, replace its Memory class with `with_memory()`.
+"""
+
+from nand.platform import BUNDLED_PLATFORM
+
+
+MEMORY_CLASS = BUNDLED_PLATFORM.parser("""
+class Memory {
+    /*
+     Implementation notes:
+
+     - Each block is preceded by a header word holding its size (not including the header.) When
+       the block is free, its first word holds a pointer to the next free block on its list.
+     - The heads of the lists of small free blocks are at a known location (2048 + size), followed
+       by the rest of the heap, which extends to the start of the screen (16384).
+     - A block is always at least one word, so there's room for the pointer when it's freed.
+    */
+
+    static Array smallFree;   // the first free block of each size less than 16, or null
+    static Array largeFree;   // the free block with the lowest address, or null
+    static int top;           // the first address that's never been allocated
+
+    /** Initializes the class. */
+    function void init() {
+        var int size;
+
+        let smallFree = 2048;
+        let size = 0;
+        while (size < 16) {
+            let smallFree[size] = null;
+            let size = size + 1;
+        }
+        let largeFree = null;
+        let top = 2048 + 16;
+        return;
+    }
+
+    /** Returns the RAM value at the given address. */
+    function int peek(int address) {
+        var Array ram;
+        let ram = 0;
+        return ram[address];
+    }
+
+    /** Sets the RAM value at the given address to the given value. */
+    function void poke(int address, int value) {
+        var Array ram;
+        let ram = 0;
+        let ram[address] = value;
+        return;
+    }
+
+    /** Finds an available RAM block of the given size and returns
+     *  a reference to its base address. */
+    function int alloc(int size) {
+        var Array block;
+
+        if (size < 1) {
+            let size = 1;
+        }
+
+        if (size < 16) {
+            let block = smallFree[size];
+            if (~(block = null)) {
+                let smallFree[size] = block[1];
+                return block + 1;
+            }
+        }
+        else {
+            let block = Memory.allocLarge(size);
+            if (~(block = null)) {
+                return block;
+            }
+        }
+
+        // Take a new block from the unused part of the heap, if there's enough left.
+        // Note: compared this way around so the sum can't overflow.
+        if ((16384 - top) > size) {
+            let block = top;
+            let block[0] = size;
+            let top = top + size + 1;
+            return block + 1;
+        }
+
+        // Out of space; merge all the small free blocks with their neighbors and look again.
+        // After that, the unused part of the heap may have grown, so just start over.
+        do Memory.mergeSmall();
+        let block = Memory.allocLarge(size);
+        if (~(block = null)) {
+            return block;
+        }
+        if ((16384 - top) > size) {
+            return Memory.alloc(size);
+        }
+
+        do Sys.error(1337);  // No suitable block found
+        return null;
+    }
+
+    /** De-allocates the given object (cast as an array) by making
+     *  it available for future allocations. */
+    function void deAlloc(Array arr) {
+        var Array block;
+        var int size;
+
+        let block = arr - 1;  // The block header precedes the address.
+        let size = block[0];
+        if (size < 16) {
+            let block[1] = smallFree[size];
+            let smallFree[size] = block;
+            return;
+        }
+
+        do Memory.freeLarge(block);
+        return;
+    }
+
+    /** The first block on the large list with room for the given size, or null. The block is
+     *  split if what's left over would be another large block. */
+    function int allocLarge(int size) {
+        var Array prev, block;
+
+        let prev = null;
+        let block = largeFree;
+        while (~(block = null)) {
+            if (block[0] > (size + 16)) {
+                // Take the end of the block, so the list doesn't change:
+                let block[0] = block[0] - (size + 1);
+                let block = block + block[0] + 1;
+                let block[0] = size;
+                return block + 1;
+            }
+            if (~(block[0] < size)) {
+                // Fits, maybe with a few words to spare, which stay with the block. Splitting off
+                // a small block here would leave it on the large list, where it's no use.
+                if (prev = null) {
+                    let largeFree = block[1];
+                }
+                else {
+                    let prev[1] = block[1];
+                }
+                return block + 1;
+            }
+            let prev = block;
+            let block = block[1];
+        }
+        return null;
+    }
+
+    /** Add a block (the address of its header) to the large list, in order of address, merging
+     *  it with the free blocks on either side, and with the unused part of the heap. */
+    function void freeLarge(Array block) {
+        var Array before, prev, next;
+
+        // Find the free blocks on either side, and the one before that:
+        let before = null;
+        let prev = null;
+        let next = largeFree;
+        while ((~(next = null)) & (next < block)) {
+            let before = prev;
+            let prev = next;
+            let next = next[1];
+        }
+
+        if ((block + block[0] + 1) = next) {
+            let block[0] = block[0] + next[0] + 1;
+            let next = next[1];
+        }
+        let block[1] = next;
+
+        if (prev = null) {
+            let largeFree = block;
+        }
+        else {
+            if ((prev + prev[0] + 1) = block) {
+                let prev[0] = prev[0] + block[0] + 1;
+                let prev[1] = next;
+                let block = prev;
+                let prev = before;
+            }
+            else {
+                let prev[1] = block;
+            }
+        }
+
+        // Now the last free block may be right up against the unused part of the heap:
+        if ((block + block[0] + 1) = top) {
+            let top = block;
+            if (prev = null) {
+                let largeFree = null;
+            }
+            else {
+                let prev[1] = null;
+            }
+        }
+        return;
+    }
+
+    /** Move every small free block to the large list, where it can be merged with its neighbors. */
+    function void mergeSmall() {
+        var int size;
+        var Array block, next;
+
+        let size = 1;
+        while (size < 16) {
+            let block = smallFree[size];
+            let smallFree[size] = null;
+            while (~(block = null)) {
+                let next = block[1];
+                do Memory.freeLarge(block);
+                let block = next;
+            }
+            let size = size + 1;
+        }
+        return;
+    }
+}
+""")
+
+
+def with_memory(platform, memory_class=MEMORY_CLASS):
+    """The same platform, with a different implementation of the Memory class in its library."""
+
+    return platform._replace(
+        library=[memory_class if cl.name == "Memory" else cl for cl in platform.library])
+
+
+ALLOC_PLATFORM = with_memory(BUNDLED_PLATFORM)
+
+
+if __name__ == "__main__":
+    # Note: this import requires pygame; putting it here allows the tests to import the module
+    import computer
+
+    computer.main(ALLOC_PLATFORM)
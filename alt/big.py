@@ -309,6 +309,7 @@ def assemble(f, min_static=16, max_static=1023, builtins=BUILTIN_SYMBOLS):
 #
 
 import computer
+from computer import Pacer
 import pygame.image
 import sys
 import time
@@ -318,10 +319,10 @@ EVENT_INTERVAL = 1/10
 DISPLAY_INTERVAL = 1/20  # Note: screen update is pretty slow at this point, so no point in trying for a higher frame rate.
 CYCLE_INTERVAL = 1/1.0  # How often to update the cycle and frame counters; a bit longer so they doesn't bounce around too much
 
-CYCLES_PER_CALL = 100  # Number of cycles to run in the tight loop (when not tracing)
+CYCLES_PER_CALL = 100  # Number of cycles to run between checking the time, when tracing
 
 
-def run(program, chip=BigComputer, simulator="codegen", name="Flat!", font="monaco-9", halt_addr=None, trace=None, verbose_tty=True, meters=None):
+def run(program, chip=BigComputer, simulator="codegen", name="Flat!", font="monaco-9", halt_addr=None, trace=None, verbose_tty=True, meters=None, max_cps=None):
     """Run with keyboard and text-mode graphics."""
 
     # TODO: font
@@ -335,6 +336,7 @@ def run(program, chip=BigComputer, simulator="codegen", name="Flat!", font="mona
     computer = nand.syntax.run(chip, simulator=simulator)
 
     computer.init_rom(program)
+    computer.take_tty_log()  # start logging, so no characters are lost in a long batch
 
     # Jump over low memory that we might be using for debugging:
     computer.poke(0, ROM_BASE)
@@ -351,6 +353,8 @@ def run(program, chip=BigComputer, simulator="codegen", name="Flat!", font="mona
 
     # TODO: use computer.py's "run", for many more features
 
+    pacer = Pacer(max_cps=max_cps)
+
     last_cycle_time = last_event_time = last_display_time = last_frame_time = now = time.monotonic()
     halted = False
 
@@ -367,17 +371,21 @@ def run(program, chip=BigComputer, simulator="codegen", name="Flat!", font="mona
             time.sleep(EVENT_INTERVAL)
 
         elif trace is None:
-            computer.ticktock(CYCLES_PER_CALL)
-            cycles += CYCLES_PER_CALL
+            batch = pacer.batch
+            computer.ticktock(batch)
+            cycles += batch
+            pacer.ran(batch)
 
         else:
             computer.ticktock()
             cycles += 1
+            if cycles % CYCLES_PER_CALL == 0:
+                pacer.ran(CYCLES_PER_CALL)
 
             if computer.fetch and trace is not None:
                 run_trace()
 
-        if cycles % CYCLES_PER_CALL == 0 or halted:
+        if trace is None or cycles % CYCLES_PER_CALL == 0 or halted:
             now = time.monotonic()
 
             # A few times per second, process events and update the display:
@@ -391,8 +399,10 @@ def run(program, chip=BigComputer, simulator="codegen", name="Flat!", font="mona
                 kvm.update_display(lambda x: computer.peek(SCREEN_BASE + x))
 
 
-            tty_char = computer.get_tty()
-            if tty_char:
+            tty_chars = computer.take_tty_log()
+            if tty_chars:
+                computer.get_tty()  # Reset the port
+            for tty_char in tty_chars:
                 if 32 < tty_char <= 127:
                     if not verbose_tty:
                         print(chr(tty_char), end="", flush=True)
@@ -406,6 +416,7 @@ def run(program, chip=BigComputer, simulator="codegen", name="Flat!", font="mona
             msgs.append(f"{cycles/1000:0.1f}k cycles")
             cps = (cycles - last_cycle_count)/(now - last_cycle_time)
             msgs.append(f"{cps/1000:0,.1f}k/s")
+            msgs.append(f"jitter {pacer.jitter*1000:0.1f}ms")
             msgs.append(f"@{computer.pc}")
             if meters:
                 msgs.extend(meters(computer, cycles))
@@ -465,7 +476,7 @@ def main():
     # TODO: "--debug" showing opcode-level trace. Breakpoints, stepping, peek/poke?
     # parser.add_argument("--no-waiting", action="store_true", help="(VM/Jack-only) substitute a no-op function for Sys.wait.")
     # parser.add_argument("--max-fps", action="store", type=int, help="Experimental! (VM/Jack-only) pin the game loop to a fixed rate, approximately (in games that use Sys.wait).\nMay or may not work, depending on the translator.")
-    # TODO: "--max-cps"; limit the clock speed directly. That will allow different chips to be compared (in a way).
+    parser.add_argument("--max-cps", action="store", type=int, help="Limit the clock speed to this many cycles per second (on average).")
     # TODO: "--headless" with no UI, with Keyboard and TTY connected to stdin/stdout
 
     args = parser.parse_args()
@@ -480,7 +491,7 @@ def main():
     print(f"symbols: {symbols}")
     print(f"statics: {statics}")
 
-    run(program=prg, simulator=args.simulator, halt_addr=symbols["halt"])
+    run(program=prg, simulator=args.simulator, halt_addr=symbols["halt"], max_cps=args.max_cps)
 
 
 if __name__ == "__main__":
@@ -9,9 +9,13 @@ from nand import gate_count
 import test_optimal_08
 
 from nand.platform import BUNDLED_PLATFORM, USER_PLATFORM
+from nand.solutions import solved_07
+from alt.alloc import ALLOC_PLATFORM
+from alt.screen import SCREEN_PLATFORM
 from alt.eight import EIGHT_PLATFORM
 from alt.lazy import LAZY_PLATFORM
 from alt.reg import REG_PLATFORM
+from alt.inline import INLINE_PLATFORM
 from alt.reduce import REDUCE_PLATFORM
 from alt.shift import SHIFT_PLATFORM
 from alt.sp import SP_PLATFORM
@@ -22,6 +26,8 @@ def main():
     std = measure(BUNDLED_PLATFORM)
     print_result("solutions", std)
 
+    print_relative_result("solutions, without fused ops", std, measure(BUNDLED_PLATFORM._replace(translator=UnfusedTranslator)))
+    print_relative_result("solutions, without peephole", std, measure(BUNDLED_PLATFORM._replace(translator=UnoptimizedTranslator)))
     print_relative_result("project_0x.py", std, measure(USER_PLATFORM))
     print_relative_result("alt/lazy.py", std, measure(LAZY_PLATFORM))
     print_relative_result("alt/sp.py", std, measure(SP_PLATFORM))
@@ -29,6 +35,9 @@ def main():
     print_relative_result("alt/shift.py", std, measure(SHIFT_PLATFORM))
     print_relative_result("alt/reg.py", std, measure(REG_PLATFORM))
     print_relative_result("alt/reduce.py", std, measure(REDUCE_PLATFORM))
+    print_relative_result("alt/inline.py", std, measure(INLINE_PLATFORM))
+    print_relative_result("alt/alloc.py", std, measure(ALLOC_PLATFORM))
+    print_relative_result("alt/screen.py", std, measure(SCREEN_PLATFORM))
 
     # print_relative_result("alt/eight.py", std, measure(EIGHT_PLATFORM, "vector"))
     print_relative_result("alt/eight.py", std, (gate_count(EIGHT_PLATFORM.chip)['nands'], std[1], std[2]*2, std[3]*2))  # Cheeky
@@ -39,6 +48,16 @@ def main():
     # Similar
 
 
+class UnfusedTranslator(solved_07.Translator):
+    """The standard translator, without any superinstructions (see nand.translate.FUSIONS)."""
+    FUSED_OPS = ()
+
+
+class UnoptimizedTranslator(solved_07.Translator):
+    """The standard translator, without the peephole rules (see nand.peephole)."""
+    PEEPHOLE_RULES = ()
+
+
 def print_result(name, t):
     nands, pong, frame, init = t
     print(f"{name}:")
@@ -0,0 +1,575 @@
+#! /usr/bin/env python3
+
+"""Inline calls to small subroutines, at the AST level, so the call/return overhead is avoided.
+
+In the standard VM, every call and return costs something like 100 cycles (saving and restoring
+the caller's frame), which dwarfs the cost of many tiny subroutines in the OS (e.g. Math.abs or
+String.length) and getters like Bat.getLeft(). Here, a call to one of those is replaced by the
+body of the subroutine, with its parameters and locals renamed to new locals in the caller.
+
+Only "leaf" subroutines are inlined, which don't make any calls of their own (that includes string
+constants, which are compiled to calls), and only if they're small (see `max_size`). A method's
+fields are accessed via a new local holding the object's address, treated as an Array, so it can
+be inlined into any class. A subroutine that refers to its class's static variables can only be
+inlined into the same class.
+
+A `return` is replaced with an assignment to wherever the result goes, so each `return` has to be
+the last thing that happens, in any path through the subroutine. An `if` that returns early is
+rewritten as if/else to make that true, but a subroutine that returns from inside a loop isn't
+inlined.
+
+A call is inlined where the result is used directly (e.g. `let x = Math.abs(y);`, `do poke(...)`,
+`return length();`). A call that's nested inside some larger expression (e.g. `if (Math.abs(dx) >
+5)`) is inlined only if it's the only call in the statement and the subroutine doesn't write to
+memory (i.e. fields or arrays), so it doesn't matter that the body is moved to before the statement.
+A call in a `while` condition is never inlined, because there's nowhere to put the body.
+
+Every inlined call adds code, roughly in proportion to the size of the subroutine's AST, so each
+class gets a `budget`, in AST nodes, and no more calls are inlined when it's exhausted. Note: that
+limits how much each class grows, not the size of the whole program in ROM. Classes are parsed one
+at a time, with no way to know which program they'll end up in, or how big the rest of it is, so
+there's no total to measure against. For Pong, the program grows by about 1,300 words (5%); one
+that's already close to the 32K limit could still be pushed over it, and should be translated
+without inlining.
+
+Each decision (which subroutines are candidates, and each call that's inlined or not) is recorded
+in `Inliner.log`, and printed if `verbose` is set.
+
+INLINE_PLATFORM inlines calls between the OS classes, which are always used together. When any
+other class is parsed, only calls within that same class are inlined, because there's no telling
+which implementation of the other classes it's going to be linked with (the tests for project 12,
+for instance, substitute their own Output class.) Use Inliner.inline_program() when all the
+classes are known.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from nand import jack_ast
+from nand.platform import BUNDLED_PLATFORM
+
+
+class Candidate:
+    """A subroutine that can be inlined, with what's needed to do it."""
+
+    def __init__(self, class_ast: jack_ast.Class, ast: jack_ast.SubroutineDec, size: int, statics: bool, writes_memory: bool):
+        self.class_ast = class_ast
+        self.ast = ast
+        self.size = size
+        self.statics = statics
+        self.writes_memory = writes_memory
+
+    @property
+    def name(self):
+        return f"{self.class_ast.name}.{self.ast.name}"
+
+
+class Inliner:
+    """Inline calls to small, leaf subroutines from the given classes (see the module docs.)
+
+    `max_size` is the largest subroutine that's inlined, and `budget` is the total size of all the
+    inlined code allowed in any one class, both counted in AST nodes.
+    """
+
+    def __init__(self, classes: Sequence[jack_ast.Class], max_size: int = 16, budget: int = 400, verbose: bool = False):
+        self.max_size = max_size
+        self.budget = budget
+        self.verbose = verbose
+        self.log: List[str] = []
+        self.next_id = 0
+
+        self.candidates: Dict[Tuple[str, str], Candidate] = {}
+        self.add_candidates(self.candidates, classes)
+
+    def add_candidates(self, candidates: Dict[Tuple[str, str], Candidate], classes: Sequence[jack_ast.Class]):
+        """Look at each subroutine in the classes, and note the ones that can be inlined (or
+        forget any previous candidate with the same name, if it can't.)
+        """
+
+        for class_ast in classes:
+            for sd in class_ast.subroutineDecs:
+                candidate, reason = self._candidate(class_ast, sd)
+                if candidate is not None:
+                    candidates[(class_ast.name, sd.name)] = candidate
+                    self._log(f"candidate: {candidate.name} ({candidate.size} nodes)")
+                else:
+                    candidates.pop((class_ast.name, sd.name), None)
+                    self._log(f"not a candidate: {class_ast.name}.{sd.name}: {reason}")
+
+    def inline_program(self, classes: Sequence[jack_ast.Class]) -> List[jack_ast.Class]:
+        """Inline calls within a complete program, where every class is available."""
+
+        candidates = dict(self.candidates)
+        self.add_candidates(candidates, classes)
+        return [self._inline_class(cl, candidates) for cl in classes]
+
+    def inline_class(self, class_ast: jack_ast.Class) -> jack_ast.Class:
+        """Inline calls in each subroutine of a class, to any of the candidates (including the
+        class's own subroutines.)
+        """
+
+        candidates = dict(self.candidates)
+        self.add_candidates(candidates, [class_ast])
+        return self._inline_class(class_ast, candidates)
+
+    def _inline_class(self, class_ast: jack_ast.Class, candidates: Dict[Tuple[str, str], Candidate]) -> jack_ast.Class:
+        state = _ClassState(class_ast, candidates, self.budget)
+        return class_ast._replace(
+            subroutineDecs=[self._inline_subroutine(sd, state) for sd in class_ast.subroutineDecs])
+
+    def _next_name(self) -> str:
+        result = f"$inl{self.next_id}"
+        self.next_id += 1
+        return result
+
+    def _log(self, msg: str):
+        self.log.append(msg)
+        if self.verbose:
+            print(msg)
+
+    def _candidate(self, class_ast: jack_ast.Class, sd: jack_ast.SubroutineDec) -> Tuple[Optional[Candidate], str]:
+        if sd.kind == "constructor":
+            return None, "constructor"
+        if class_ast.name == "Sys" and sd.name in ("halt", "error"):
+            # The compiler treats calls to these specially (see _has_final_return in solved_11.)
+            return None, "never returns"
+        if _has_calls(sd.body.statements):
+            return None, "makes calls"
+        size = _size(sd.body.statements)
+        if size > self.max_size:
+            return None, f"too big ({size} nodes)"
+        if _tail_returns(sd.body.statements, lambda expr: []) is None:
+            return None, "returns from inside a loop"
+
+        locals_ = {p.name for p in sd.params} | {n for vd in sd.body.varDecs for n in vd.names}
+        fields = _field_indexes(class_ast)
+        statics = {n for cvd in class_ast.varDecs if cvd.static for n in cvd.names}
+        names = _names(sd.body.statements) - locals_
+        assigned = _assigned(sd.body.statements) - locals_
+        arrays = _array_names(sd.body.statements) - locals_
+
+        if sd.kind == "function" and names & set(fields):
+            return None, "refers to fields"  # not valid, but not our problem
+        if arrays & assigned & set(fields):
+            return None, "assigns a field that's also used as an array"
+        writes_memory = bool(assigned & (set(fields) | statics)) or _writes_arrays(sd.body.statements)
+
+        return Candidate(class_ast, sd, size, statics=bool(names & statics), writes_memory=writes_memory), ""
+
+    def _inline_subroutine(self, sd: jack_ast.SubroutineDec, state: "_ClassState") -> jack_ast.SubroutineDec:
+        state.start_subroutine(sd)
+        stmts = self._inline_statements(sd.body.statements, state)
+        return sd._replace(body=jack_ast.SubroutineBody(
+            varDecs=list(sd.body.varDecs) + state.new_varDecs,
+            statements=stmts))
+
+    def _inline_statements(self, stmts: Sequence[jack_ast.Statement], state: "_ClassState") -> List[jack_ast.Statement]:
+        return [s2 for s in stmts for s2 in self._inline_statement(s, state)]
+
+    def _inline_statement(self, stmt: jack_ast.Statement, state: "_ClassState") -> List[jack_ast.Statement]:
+        if isinstance(stmt, jack_ast.IfStatement):
+            stmt = stmt._replace(
+                when_true=self._inline_statements(stmt.when_true, state),
+                when_false=self._inline_statements(stmt.when_false, state) if stmt.when_false is not None else None)
+        elif isinstance(stmt, jack_ast.WhileStatement):
+            return [stmt._replace(body=self._inline_statements(stmt.body, state))]
+
+        # First, a call whose result is used directly:
+        call = None
+        if isinstance(stmt, jack_ast.DoStatement):
+            call = stmt.expr
+        elif isinstance(stmt, (jack_ast.LetStatement, jack_ast.ReturnStatement)) and isinstance(stmt.expr, jack_ast.SubroutineCall):
+            if not (isinstance(stmt, jack_ast.LetStatement) and stmt.array_index is not None):
+                call = stmt.expr
+        if call is not None:
+            candidate = self._check_call(call, state, nested=False)
+            if candidate is None:
+                return [stmt]
+            else:
+                if isinstance(stmt, jack_ast.DoStatement):
+                    on_return = lambda expr: []
+                elif isinstance(stmt, jack_ast.LetStatement):
+                    on_return = lambda expr: [jack_ast.LetStatement(stmt.name, None, expr)]
+                else:
+                    on_return = lambda expr: [jack_ast.ReturnStatement(expr)]
+                return self._inline_statements(self._inline_call(call, candidate, state, on_return), state)
+
+        # Otherwise, a single call nested in the statement, if it's safe to evaluate it first:
+        if not isinstance(stmt, (jack_ast.WhileStatement, jack_ast.DoStatement)):
+            calls = [c for e in _statement_exprs(stmt) for c in _calls(e)]
+            if len(calls) == 1:
+                call = calls[0]
+                candidate = self._check_call(call, state, nested=True)
+                if candidate is not None:
+                    result = self._next_name()
+                    state.new_varDecs.append(jack_ast.VarDec(candidate.ast.result or "int", [result]))
+                    body = self._inline_call(call, candidate, state,
+                                             lambda expr: [jack_ast.LetStatement(result, None, expr)])
+                    return body + [_replace_call(stmt, call, jack_ast.VarRef(result))]
+
+        return [stmt]
+
+    def _check_call(self, call: jack_ast.SubroutineCall, state: "_ClassState", nested: bool) -> Optional[Candidate]:
+        """The candidate to inline for this call, if there is one and it can be inlined here."""
+
+        if call.class_name is not None:
+            key, kind = (call.class_name, call.sub_name), "function"
+        elif call.var_name is not None:
+            key, kind = (state.type_of(call.var_name), call.sub_name), "method"
+        else:
+            key, kind = (state.class_ast.name, call.sub_name), "method"
+        candidate = state.candidates.get(key)
+        if candidate is None or candidate.ast.kind != kind:
+            return None
+
+        where = f"{state.class_ast.name}.{state.subroutine.name}"
+        if key == (state.class_ast.name, state.subroutine.name):
+            return None
+        elif kind == "method" and call.var_name is None and state.subroutine.kind == "function":
+            return None
+        elif candidate.statics and candidate.class_ast.name != state.class_ast.name:
+            self._log(f"not inlined: {candidate.name} into {where}: refers to statics")
+            return None
+        elif nested and candidate.writes_memory:
+            self._log(f"not inlined: {candidate.name} into {where}: nested, and writes to memory")
+            return None
+        elif candidate.size > state.budget:
+            self._log(f"not inlined: {candidate.name} into {where}: over budget")
+            return None
+
+        state.budget -= candidate.size
+        self._log(f"inline: {candidate.name} into {where} ({candidate.size} nodes)")
+        return candidate
+
+    def _inline_call(self, call: jack_ast.SubroutineCall, candidate: Candidate, state: "_ClassState", on_return) -> List[jack_ast.Statement]:
+        """Statements which do the same thing as the call, handling each `return` with `on_return`."""
+
+        sd = candidate.ast
+        prefix = self._next_name()
+        stmts: List[jack_ast.Statement] = []
+        renames: Dict[str, jack_ast.Expression] = {}
+        assigned = _assigned(sd.body.statements) | _array_names(sd.body.statements)
+
+        def new_local(name, type_):
+            local = f"{prefix}_{name}"
+            state.new_varDecs.append(jack_ast.VarDec(type_, [local]))
+            return local
+
+        # The object, for a method:
+        this_var = None
+        if sd.kind == "method":
+            if call.var_name is not None and state.is_local(call.var_name):
+                this_var = call.var_name
+            else:
+                this_var = new_local("this", candidate.class_ast.name)
+                obj = jack_ast.VarRef(call.var_name) if call.var_name is not None else jack_ast.KeywordConstant("this")
+                stmts.append(jack_ast.LetStatement(this_var, None, obj))
+
+        # Arguments, evaluated in order; a constant or a local is just substituted, if the parameter
+        # is never assigned (or used as an array):
+        for p, arg in zip(sd.params, call.args):
+            if p.name not in assigned and (
+                    isinstance(arg, (jack_ast.IntegerConstant, jack_ast.KeywordConstant))
+                    or (isinstance(arg, jack_ast.VarRef) and state.is_local(arg.name))):
+                renames[p.name] = arg
+            else:
+                local = new_local(p.name, p.type)
+                stmts.append(jack_ast.LetStatement(local, None, arg))
+                renames[p.name] = jack_ast.VarRef(local)
+
+        # Locals, which start out as 0 (as they do when the subroutine is called), unless they're
+        # definitely assigned first:
+        initialized = _initialized(sd.body.statements, {n for vd in sd.body.varDecs for n in vd.names})
+        for vd in sd.body.varDecs:
+            for n in vd.names:
+                local = new_local(n, vd.type)
+                renames[n] = jack_ast.VarRef(local)
+                if n not in initialized:
+                    stmts.append(jack_ast.LetStatement(local, None, jack_ast.IntegerConstant(0)))
+
+        # Fields that are used as arrays get a local, because an ArrayRef needs a name:
+        fields = _field_indexes(candidate.class_ast) if sd.kind == "method" else {}
+        for n in sorted(_array_names(sd.body.statements) & set(fields)):
+            local = new_local(n, "Array")
+            stmts.append(jack_ast.LetStatement(local, None, jack_ast.ArrayRef(this_var, jack_ast.IntegerConstant(fields[n]))))
+            renames[n] = jack_ast.VarRef(local)
+
+        rewriter = _Rewriter(renames, fields, this_var)
+        body = _tail_returns(sd.body.statements, lambda expr: on_return(rewriter.expr(expr)) if expr is not None else on_return(jack_ast.IntegerConstant(0)))
+        assert body is not None
+        return stmts + [rewriter.stmt(s) for s in body]
+
+
+class _ClassState:
+    """What's known about the class and subroutine that calls are being inlined into."""
+
+    def __init__(self, class_ast: jack_ast.Class, candidates: Dict[Tuple[str, str], Candidate], budget: int):
+        self.class_ast = class_ast
+        self.candidates = candidates
+        self.budget = budget
+        self.class_types = {n: cvd.type for cvd in class_ast.varDecs for n in cvd.names}
+
+    def start_subroutine(self, sd: jack_ast.SubroutineDec):
+        self.subroutine = sd
+        self.local_types = {p.name: p.type for p in sd.params}
+        self.local_types.update({n: vd.type for vd in sd.body.varDecs for n in vd.names})
+        self.new_varDecs: List[jack_ast.VarDec] = []
+
+    def type_of(self, name: str) -> Optional[str]:
+        return self.local_types.get(name, self.class_types.get(name))
+
+    def is_local(self, name: str) -> bool:
+        """True if the name refers to a parameter or local of the subroutine (which can't be
+        modified by any other subroutine.)"""
+        return name in self.local_types
+
+
+class _Rewriter:
+    """Rename a subroutine's parameters and locals, and refer to fields via the object."""
+
+    def __init__(self, renames: Dict[str, jack_ast.Expression], fields: Dict[str, int], this_var: Optional[str]):
+        self.renames = renames
+        self.fields = fields
+        self.this_var = this_var
+
+    def name(self, name: str) -> str:
+        r = self.renames.get(name)
+        return r.name if isinstance(r, jack_ast.VarRef) else name
+
+    def expr(self, ast):
+        if isinstance(ast, jack_ast.VarRef):
+            if ast.name in self.renames:
+                return self.renames[ast.name]
+            elif ast.name in self.fields:
+                return jack_ast.ArrayRef(self.this_var, jack_ast.IntegerConstant(self.fields[ast.name]))
+            return ast
+        elif isinstance(ast, jack_ast.KeywordConstant) and ast.value == "this":
+            return jack_ast.VarRef(self.this_var)
+        elif isinstance(ast, jack_ast.ArrayRef):
+            return jack_ast.ArrayRef(self.name(ast.name), self.expr(ast.array_index))
+        elif isinstance(ast, jack_ast.BinaryExpression):
+            return jack_ast.BinaryExpression(self.expr(ast.left), ast.op, self.expr(ast.right))
+        elif isinstance(ast, jack_ast.UnaryExpression):
+            return jack_ast.UnaryExpression(ast.op, self.expr(ast.expr))
+        else:
+            return ast
+
+    def stmt(self, ast):
+        if isinstance(ast, jack_ast.LetStatement):
+            if ast.array_index is None and ast.name in self.fields and ast.name not in self.renames:
+                return jack_ast.LetStatement(self.this_var, jack_ast.IntegerConstant(self.fields[ast.name]), self.expr(ast.expr))
+            return jack_ast.LetStatement(
+                self.name(ast.name),
+                self.expr(ast.array_index) if ast.array_index is not None else None,
+                self.expr(ast.expr))
+        elif isinstance(ast, jack_ast.IfStatement):
+            return jack_ast.IfStatement(
+                self.expr(ast.cond),
+                [self.stmt(s) for s in ast.when_true],
+                [self.stmt(s) for s in ast.when_false] if ast.when_false is not None else None)
+        elif isinstance(ast, jack_ast.WhileStatement):
+            return jack_ast.WhileStatement(self.expr(ast.cond), [self.stmt(s) for s in ast.body])
+        elif isinstance(ast, jack_ast.ReturnStatement):
+            return jack_ast.ReturnStatement(self.expr(ast.expr) if ast.expr is not None else None)
+        else:
+            return ast
+
+
+def _tail_returns(stmts: Sequence[jack_ast.Statement], on_return) -> Optional[List[jack_ast.Statement]]:
+    """Rewrite the statements so that nothing follows a `return`, replacing each one with the
+    result of `on_return(expr)`. An early return from inside an `if` is handled by moving the
+    statements that follow into the other branch. Returns None if there's a return in a loop.
+    """
+
+    result: List[jack_ast.Statement] = []
+    for i, s in enumerate(stmts):
+        rest = list(stmts[i+1:])
+        if isinstance(s, jack_ast.ReturnStatement):
+            return result + on_return(s.expr)
+        elif isinstance(s, jack_ast.WhileStatement):
+            if _has_return(s.body):
+                return None
+            result.append(s)
+        elif isinstance(s, jack_ast.IfStatement) and (_has_return(s.when_true) or _has_return(s.when_false or [])):
+            when_true = _tail_returns(list(s.when_true) + ([] if _always_returns(s.when_true) else rest), on_return)
+            when_false = _tail_returns(list(s.when_false or []) + ([] if _always_returns(s.when_false or []) else rest), on_return)
+            if when_true is None or when_false is None:
+                return None
+            return result + [jack_ast.IfStatement(s.cond, when_true, when_false if when_false != [] else None)]
+        else:
+            result.append(s)
+    return result
+
+
+def _always_returns(stmts: Sequence[jack_ast.Statement]) -> bool:
+    """True if the statements always return (as opposed to falling through to whatever follows.)"""
+    for s in stmts:
+        if isinstance(s, jack_ast.ReturnStatement):
+            return True
+        elif isinstance(s, jack_ast.IfStatement) and s.when_false is not None:
+            if _always_returns(s.when_true) and _always_returns(s.when_false):
+                return True
+    return False
+
+
+def _has_return(stmts: Sequence[jack_ast.Statement]) -> bool:
+    for s in stmts:
+        if isinstance(s, jack_ast.ReturnStatement):
+            return True
+        elif isinstance(s, jack_ast.IfStatement):
+            if _has_return(s.when_true) or _has_return(s.when_false or []):
+                return True
+        elif isinstance(s, jack_ast.WhileStatement):
+            if _has_return(s.body):
+                return True
+    return False
+
+
+def _initialized(stmts: Sequence[jack_ast.Statement], locals_: set) -> set:
+    """Locals that are assigned by the leading (unconditional) let statements, before they're read."""
+
+    result = set()
+    for s in stmts:
+        if not isinstance(s, jack_ast.LetStatement) or s.array_index is not None:
+            break
+        if (_names([s.expr]) & locals_) - result:
+            break
+        result.add(s.name)
+    return result
+
+
+def _field_indexes(class_ast: jack_ast.Class) -> Dict[str, int]:
+    """The offset of each field of the class, in the object."""
+    names = [n for cvd in class_ast.varDecs if not cvd.static for n in cvd.names]
+    return {n: i for i, n in enumerate(names)}
+
+
+def _children(ast) -> list:
+    """The statements and expressions directly contained in a node (or list of nodes)."""
+
+    if isinstance(ast, (list, tuple)) and not hasattr(ast, "_fields"):
+        return list(ast)
+    elif isinstance(ast, jack_ast.LetStatement):
+        return [x for x in (ast.array_index, ast.expr) if x is not None]
+    elif isinstance(ast, jack_ast.IfStatement):
+        return [ast.cond] + list(ast.when_true) + list(ast.when_false or [])
+    elif isinstance(ast, jack_ast.WhileStatement):
+        return [ast.cond] + list(ast.body)
+    elif isinstance(ast, (jack_ast.DoStatement, jack_ast.ReturnStatement)):
+        return [ast.expr] if ast.expr is not None else []
+    elif isinstance(ast, jack_ast.SubroutineCall):
+        return list(ast.args)
+    elif isinstance(ast, jack_ast.BinaryExpression):
+        return [ast.left, ast.right]
+    elif isinstance(ast, jack_ast.UnaryExpression):
+        return [ast.expr]
+    elif isinstance(ast, jack_ast.ArrayRef):
+        return [ast.array_index]
+    else:
+        return []
+
+
+def _walk(ast):
+    """Every node, depth-first, in the order they're evaluated (roughly.)"""
+    for c in _children(ast):
+        yield from _walk(c)
+    if hasattr(ast, "_fields"):
+        yield ast
+
+
+def _size(ast) -> int:
+    return sum(1 for _ in _walk(ast))
+
+
+def _has_calls(ast) -> bool:
+    return any(isinstance(n, (jack_ast.SubroutineCall, jack_ast.StringConstant)) for n in _walk(ast))
+
+
+def _calls(ast) -> List[jack_ast.SubroutineCall]:
+    return [n for n in _walk(ast) if isinstance(n, jack_ast.SubroutineCall)]
+
+
+def _names(ast) -> set:
+    """Every variable name that's read or written."""
+    result = set()
+    for n in _walk(ast):
+        if isinstance(n, (jack_ast.VarRef, jack_ast.ArrayRef, jack_ast.LetStatement)):
+            result.add(n.name)
+        elif isinstance(n, jack_ast.SubroutineCall) and n.var_name is not None:
+            result.add(n.var_name)
+    return result
+
+
+def _assigned(ast) -> set:
+    """Names that are assigned (not including array elements.)"""
+    return {n.name for n in _walk(ast) if isinstance(n, jack_ast.LetStatement) and n.array_index is None}
+
+
+def _array_names(ast) -> set:
+    """Names that are used as arrays."""
+    return ({n.name for n in _walk(ast) if isinstance(n, jack_ast.ArrayRef)}
+            | {n.name for n in _walk(ast) if isinstance(n, jack_ast.LetStatement) and n.array_index is not None})
+
+
+def _writes_arrays(ast) -> bool:
+    return any(isinstance(n, jack_ast.LetStatement) and n.array_index is not None for n in _walk(ast))
+
+
+def _statement_exprs(stmt: jack_ast.Statement) -> list:
+    """The expressions that are evaluated by the statement itself (not by nested statements.)"""
+    if isinstance(stmt, jack_ast.IfStatement):
+        return [stmt.cond]
+    else:
+        return _children(stmt)
+
+
+def _replace_call(ast, call: jack_ast.SubroutineCall, replacement: jack_ast.Expression):
+    """Substitute an expression for a particular call (by identity), in a statement or expression
+    (but not in any nested statements.)"""
+
+    if ast is call:
+        return replacement
+    elif isinstance(ast, jack_ast.LetStatement):
+        return ast._replace(
+            array_index=_replace_call(ast.array_index, call, replacement) if ast.array_index is not None else None,
+            expr=_replace_call(ast.expr, call, replacement))
+    elif isinstance(ast, jack_ast.IfStatement):
+        return ast._replace(cond=_replace_call(ast.cond, call, replacement))
+    elif isinstance(ast, jack_ast.ReturnStatement):
+        return ast._replace(expr=_replace_call(ast.expr, call, replacement) if ast.expr is not None else None)
+    elif isinstance(ast, jack_ast.DoStatement):
+        # Note: the call itself was replaced, and its result isn't used; just evaluate the rest.
+        return ast._replace(expr=_replace_call(ast.expr, call, replacement))
+    elif isinstance(ast, jack_ast.SubroutineCall):
+        return ast._replace(args=[_replace_call(a, call, replacement) for a in ast.args])
+    elif isinstance(ast, jack_ast.BinaryExpression):
+        return ast._replace(left=_replace_call(ast.left, call, replacement), right=_replace_call(ast.right, call, replacement))
+    elif isinstance(ast, jack_ast.UnaryExpression):
+        return ast._replace(expr=_replace_call(ast.expr, call, replacement))
+    elif isinstance(ast, jack_ast.ArrayRef):
+        return ast._replace(array_index=_replace_call(ast.array_index, call, replacement))
+    else:
+        return ast
+
+
+def inline_platform(platform, max_size=16, budget=400, verbose=False):
+    """Derive a platform which inlines calls between the OS classes, and within each class that's
+    parsed.
+    """
+
+    inliner = Inliner([], max_size=max_size, budget=budget, verbose=verbose)
+    library = inliner.inline_program(platform.library)
+
+    def parser(src):
+        return inliner.inline_class(platform.parser(src))
+
+    return platform._replace(parser=parser, library=library)
+
+
+INLINE_PLATFORM = inline_platform(BUNDLED_PLATFORM)
+
+
+if __name__ == "__main__":
+    # Note: this import requires pygame; putting it here allows the tests to import the module
+    import computer
+
+    computer.main(INLINE_PLATFORM)
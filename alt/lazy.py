@@ -18,6 +18,8 @@ from nand.solutions import solved_05, solved_06, solved_07
 
 
 class Translator(solved_07.Translator):
+    FUSED_OPS = ("if_compare_goto", "if_not_goto", "add_constant", "sub_constant")
+
     def __init__(self):
         self.asm = AssemblySource()
 
@@ -27,6 +29,7 @@ class Translator(solved_07.Translator):
 
     def finish(self):
         self._fix_stack()
+        solved_07.Translator.finish(self)
 
     def push_constant(self, value):
         self._fix_stack()
@@ -193,6 +196,52 @@ class Translator(solved_07.Translator):
         solved_07.Translator.goto(self, name)
 
 
+    def if_compare_goto(self, condition, name):
+        if self.top_in_d:
+            self._start_fused("if_compare_goto", condition, name)
+            self.asm.instr("@SP")
+            self.asm.instr("AM=M-1")
+            self.asm.instr("D=M-D")
+            self.asm.instr(f"@{self.function_namespace}${name}")
+            self.asm.instr(f"D;J{condition}")
+            self.top_in_d = False
+        else:
+            solved_07.Translator.if_compare_goto(self, condition, name)
+
+    def if_not_goto(self, name):
+        if self.top_in_d:
+            self._start_fused("if_not_goto", name)
+            self.asm.instr("D=D+1")  # i.e. jump unless the value is -1 (true)
+            self.asm.instr(f"@{self.function_namespace}${name}")
+            self.asm.instr("D;JNE")
+            self.top_in_d = False
+        else:
+            solved_07.Translator.if_not_goto(self, name)
+
+    def add_constant(self, value):
+        if self.top_in_d:
+            self._start_fused("add_constant", value)
+            self._d_by_constant(value, "+")
+        else:
+            solved_07.Translator.add_constant(self, value)
+
+    def sub_constant(self, value):
+        if self.top_in_d:
+            self._start_fused("sub_constant", value)
+            self._d_by_constant(value, "-")
+        else:
+            solved_07.Translator.sub_constant(self, value)
+
+    def _d_by_constant(self, value, op):
+        """Note: the result stays in D."""
+        if value <= 2:
+            for _ in range(value):
+                self.asm.instr(f"D=D{op}1")
+        else:
+            self.asm.instr(f"@{value}")
+            self.asm.instr(f"D=D{op}A")
+
+
     def function(self, class_name, function_name, num_vars):
         assert not self.top_in_d
         solved_07.Translator.function(self, class_name, function_name, num_vars)
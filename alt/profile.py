@@ -42,6 +42,24 @@ SIMULATOR = "compiled"  # only about 30% faster, interestingly
 
 NO_WAITING = True
 
+
+def entered_function(src_map, pc, prev_pc):
+    """True if the "function" op at `pc` was just entered, by a call from the previous PC.
+
+    A function with no locals shares its address with the first op of its body, which can be
+    the label at the top of a loop, so jumping back around the loop arrives there too. That's
+    a jump from inside the function, except for a recursive call (from a "call" op.)
+    """
+
+    if prev_pc is None:
+        return True
+    fn = src_map.function_containing(pc)
+    if fn is None or prev_pc not in fn:
+        return True
+    _, op = src_map.op_containing(prev_pc)
+    return op.startswith("call ")
+
+
 def main():
     path = sys.argv[1] if len(sys.argv) == 2 else "examples/project_11/Pong"
 
@@ -98,6 +116,7 @@ def main():
 
     current_instr = None
     current_opcode = None
+    prev_pc = None
     fn_stack = [0]
     fns[0] = 1
 
@@ -124,36 +143,39 @@ def main():
         pc = computer.pc
         # raw_instructions[pc] += 1
 
-        op = src_map.get(pc)
-        if op:
+        # Note: functions with no locals don't generate any instructions for the "function"
+        # opcode, so it shares the address of the first opcode of the body. The instructions
+        # belong to the last op at each address.
+        ops = src_map.ops_at(pc)
+        if ops:
             current_instr = pc
 
-            current_opcode = op.split()[0]  # TODO: smarter than this
+            current_opcode = ops[-1].split()[0]  # TODO: smarter than this
             if current_opcode in ("push", "pop"):
-                current_opcode = " ".join(op.split()[:2])
-
-            if current_opcode == "function":
-                fn = op.split()[1]
-                if fn == "Sys.wait":
-                    current_frame += 1
-                    print("w", end="", flush=True)
-                elif fn == "Sys.halt":
-                    print(f"\nHalted")
-                    break
-
-            # Note: functions with no locals don't actually need to generate any instructions for
-            # the "function" opcode, but if they didn't, their first opcode would overwrite the
-            # "function" opcode in the source map, since it has the same instruction address.
-            # HACK: for now, generating a no-op instruction for these function opcodes works around
-            # this issue (while making the program just slightly slower.)
-            # Need to make src_map a multi-map.
-            if op.startswith(fn_prefix):
-                fn_stack.append(pc)
-                if recording:
-                    fns[pc] += 1
-            elif op.startswith("return") and len(fn_stack) > 1:
-                # TODO: wait to pop _after_ this op, so the return is charged to the function (not the caller)
-                fn_stack.pop()
+                current_opcode = " ".join(ops[-1].split()[:2])
+
+            halted = False
+            for op in ops:
+                if op.startswith("function "):
+                    if not entered_function(src_map, pc, prev_pc):
+                        continue
+                    fn = op.split()[1]
+                    if fn == "Sys.wait":
+                        current_frame += 1
+                        print("w", end="", flush=True)
+                    elif fn == "Sys.halt":
+                        halted = True
+
+                if op.startswith(fn_prefix):
+                    fn_stack.append(pc)
+                    if recording:
+                        fns[pc] += 1
+                elif op.startswith("return") and len(fn_stack) > 1:
+                    # TODO: wait to pop _after_ this op, so the return is charged to the function (not the caller)
+                    fn_stack.pop()
+            if halted:
+                print(f"\nHalted")
+                break
 
         if recording:
             if current_instr:
@@ -166,6 +188,7 @@ def main():
 
             recorded_cycles += 1
 
+        prev_pc = pc
         computer.ticktock()
 
     print()
@@ -176,7 +199,7 @@ def main():
 
     print("Instructions (top 20):")
     for addr, count in instructions.most_common(20):
-        print(f"  {100*count/recorded_cycles:0.2f}%: {src_map[addr]} @ {addr}")
+        print(f"  {100*count/recorded_cycles:0.2f}%: {' / '.join(src_map.ops_at(addr))} @ {addr}")
     print()
 
     print("Opcodes:")
@@ -184,9 +207,12 @@ def main():
         print(f"  {100*count/recorded_cycles:0.2f}%: {op}")
     print()
 
+    def fn_op(addr):
+        return next(op for op in src_map.ops_at(addr) if op.startswith(fn_prefix))
+
     print("Functions (top 20):")
     for addr, count in fn_instructions.most_common(20):
-        print(f"  {100*count/recorded_cycles:0.2f}%: {'start' if addr == 0 else src_map[addr]} @ {addr} ({fns[addr]} times)")
+        print(f"  {100*count/recorded_cycles:0.2f}%: {'start' if addr == 0 else fn_op(addr)} @ {addr} ({fns[addr]} times)")
 
 
 if __name__ == "__main__":
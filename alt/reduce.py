@@ -16,17 +16,14 @@ Specifically:
     collecting the result in a new temporary variable.
 - division by a constant 2^n: instead of calling Math.divide, substitute a call to `Math.shiftr`,
     which does `16-n` bit tests (and no multiply() or recursive calls).
+- constant expressions (e.g. `512/16`) are evaluated, with the same 16-bit arithmetic the CPU uses,
+    trivial patterns (e.g. `x*1`, `y + 0`, `-(-z)`) are simplified, and code that can never run (e.g. `if (false) { ... }`, or anything following `return`) is removed.
 - TODO: calls to Memory.peek() and .poke() are rewritten as direct read/writes using a local Array var.
 
 Note: all these transformations increase code size and introduce additional local variables, so
 this may not work well with very simple compiler/translators that struggle to fit programs in ROM.
 But they address patterns of code for which it is hard to generate compact and efficient code
 (notably, function calls.)
-
-TODO: also do some simple compile-time evaluation:
-- evaluate constant expressions (e.g. 512/16)
-- simplify trivial patterns (e.g. x*1, y + 0, ~(z = 0))
-- remove dead code (e.g. if (false) { ... })
 """
 
 from typing import Generic, List, Optional, Sequence, Tuple, TypeVar
@@ -49,6 +46,11 @@ class JackTransform(Generic[Context]):
         """If the statement should be rewritten, construct a new sequence of statements, plus any new VarDecs."""
         return None
 
+    def statements(self, asts: List[jack_ast.Statement], context: Context) -> Optional[List[jack_ast.Statement]]:
+        """If a sequence of statements (i.e. a block), each of which has already been rewritten,
+        should be rewritten as a whole, construct a new sequence."""
+        return None
+
     # TODO: probably break this out as one method for each expression type, so its cleaner
     # to override just one at a time.
     def expression(self, ast: jack_ast.Expression, context: Context) -> Optional[Tuple[List[jack_ast.VarDec], List[jack_ast.Statement], jack_ast.Expression]]:
@@ -61,13 +63,23 @@ class JackTransform(Generic[Context]):
         """Compose two transforms, applying them from left to right and taking the first result."""
         return Composed(self, other)
 
+    def nested(self) -> Optional["JackTransform[Context]"]:
+        """The transform to apply in loops, array indexes, call arguments, and `do` and `return`
+        statements, or None to leave them alone.
+
+        Rewrites that trade code size for speed (e.g. unrolling a multiplication) don't pay off in
+        those places, so by default nothing is rewritten there. A transform that only makes code
+        smaller can return itself.
+        """
+        return None
+
     #@final  # requires 3.8
     def transform(self, class_ast: jack_ast.Class, context: Context) -> jack_ast.Class:
 
         def rewrite_subroutineDec(ast: jack_ast.SubroutineDec) -> jack_ast.SubroutineDec:
             # TODO: try the transform
 
-            extra_varDecs, stmts = rewrite_statements(ast.body.statements)
+            extra_varDecs, stmts = rewrite_statements(self, ast.body.statements)
 
             sd = jack_ast.SubroutineDec(
                 kind=ast.kind,
@@ -82,21 +94,27 @@ class JackTransform(Generic[Context]):
             # print()
             return sd
 
-        def rewrite_statements(asts: Sequence[jack_ast.Statement]) -> Tuple[List[jack_ast.VarDec], List[jack_ast.Statement]]:
+        def rewrite_statements(t: Optional[JackTransform[Context]], asts: Sequence[jack_ast.Statement]) -> Tuple[List[jack_ast.VarDec], List[jack_ast.Statement]]:
+            if t is None:
+                return [], list(asts)
+
             varDecs: List[jack_ast.VarDec] = []
             stmts: List[jack_ast.Statement] = []
             for s in asts:
-                vds, ss = rewrite_statement(s)
+                vds, ss = rewrite_statement(t, s)
                 # if vds != []:
                 #     print(f"rewrote: {s} -> {vds}; {ss}")
                 varDecs.extend(vds)
                 stmts.extend(ss)
                 # print(f"varDecs: {varDecs}")
                 # print(f"stmts: {stmts}")
+            r = t.statements(stmts, context)
+            if r is not None:
+                stmts = r
             return (varDecs, stmts)
 
-        def rewrite_statement(ast: jack_ast.Statement) -> Tuple[List[jack_ast.VarDec], List[jack_ast.Statement]]:
-            r = self.statement(ast, context)
+        def rewrite_statement(t: JackTransform[Context], ast: jack_ast.Statement) -> Tuple[List[jack_ast.VarDec], List[jack_ast.Statement]]:
+            r = t.statement(ast, context)
             if r is not None:
                 vars, stmts = r
 
@@ -104,34 +122,53 @@ class JackTransform(Generic[Context]):
                 # print()
 
                 # Yikes, what about all the ways this can not terminate?
-                next_vars, next_stmts = rewrite_statements(stmts)
+                next_vars, next_stmts = rewrite_statements(t, stmts)
                 return (vars + next_vars, next_stmts)
 
             if isinstance(ast, jack_ast.LetStatement):
-                expr_vars, expr_stmts, expr_expr = rewrite_expression(ast.expr)
+                expr_vars, expr_stmts, expr_expr = rewrite_expression(t, ast.expr)
                 if ast.array_index is not None:
-                    idx_vars, idx_stmts, idx_expr = rewrite_expression(ast.array_index)
+                    idx_vars, idx_stmts, idx_expr = rewrite_expression(t, ast.array_index)
                 else:
                     idx_vars, idx_stmts, idx_expr = [], [], None
                 return (expr_vars + idx_vars,
                     expr_stmts + idx_stmts +
                         [jack_ast.LetStatement(name=ast.name, array_index=idx_expr, expr=expr_expr)])
             elif isinstance(ast, jack_ast.IfStatement):
-                cond_vars, cond_stmts, cond_expr = rewrite_expression(ast.cond)
-                true_vars, true_stmts = rewrite_statements(ast.when_true)
+                cond_vars, cond_stmts, cond_expr = rewrite_expression(t, ast.cond)
+                true_vars, true_stmts = rewrite_statements(t, ast.when_true)
                 if ast.when_false is not None:
-                    false_vars, false_stmts = rewrite_statements(ast.when_false)
+                    false_vars, false_stmts = rewrite_statements(t, ast.when_false)
                 else:
                     false_vars, false_stmts = [], None
                 return (cond_vars + true_vars + false_vars,
                         cond_stmts +
                         [jack_ast.IfStatement(cond=cond_expr, when_true=true_stmts, when_false=false_stmts)])
-            # TODO: While, Do, Return
+            elif isinstance(ast, jack_ast.WhileStatement):
+                cond_vars, cond_stmts, cond_expr = rewrite_expression(t.nested(), ast.cond)
+                if cond_stmts != []:
+                    # The condition is evaluated before every iteration, so there's nowhere to put
+                    # the statements; just leave it alone.
+                    cond_vars, cond_expr = [], ast.cond
+                body_vars, body_stmts = rewrite_statements(t.nested(), ast.body)
+                return (cond_vars + body_vars,
+                        [jack_ast.WhileStatement(cond=cond_expr, body=body_stmts)])
+            elif isinstance(ast, jack_ast.DoStatement):
+                expr_vars, expr_stmts, expr_expr = rewrite_expression(t.nested(), ast.expr)
+                return (expr_vars, expr_stmts + [jack_ast.DoStatement(expr_expr)])
+            elif isinstance(ast, jack_ast.ReturnStatement):
+                if ast.expr is None:
+                    return [], [ast]
+                expr_vars, expr_stmts, expr_expr = rewrite_expression(t.nested(), ast.expr)
+                return (expr_vars, expr_stmts + [jack_ast.ReturnStatement(expr_expr)])
             else:
                 return [], [ast]
 
-        def rewrite_expression(ast: jack_ast.Expression) -> Tuple[List[jack_ast.VarDec], List[jack_ast.Statement], jack_ast.Expression]:
-            r = self.expression(ast, context)
+        def rewrite_expression(t: Optional[JackTransform[Context]], ast: jack_ast.Expression) -> Tuple[List[jack_ast.VarDec], List[jack_ast.Statement], jack_ast.Expression]:
+            if t is None:
+                return [], [], ast
+
+            r = t.expression(ast, context)
             if r is not None:
                 vars, stmts, expr = r
 
@@ -139,20 +176,39 @@ class JackTransform(Generic[Context]):
                 # print()
 
                 # Yikes, what about all the ways this can not terminate?
-                next_vars, next_stmts, next_expr = rewrite_expression(expr)
+                next_vars, next_stmts, next_expr = rewrite_expression(t, expr)
                 return (vars + next_vars, stmts + next_stmts, next_expr)
 
             # print(f"expr: {ast}")
             if isinstance(ast, jack_ast.BinaryExpression):
-                left_vars, left_stmts, left_expr = rewrite_expression(ast.left)
-                right_vars, right_stmts, right_expr = rewrite_expression(ast.right)
+                left_vars, left_stmts, left_expr = rewrite_expression(t, ast.left)
+                right_vars, right_stmts, right_expr = rewrite_expression(t, ast.right)
 
                 return (left_vars + right_vars,
                         left_stmts + right_stmts,
                         jack_ast.BinaryExpression(left_expr, ast.op, right_expr))
 
-            # TODO: the rest
+            elif isinstance(ast, jack_ast.UnaryExpression):
+                expr_vars, expr_stmts, expr_expr = rewrite_expression(t.nested(), ast.expr)
+                return (expr_vars, expr_stmts, jack_ast.UnaryExpression(ast.op, expr_expr))
+
+            elif isinstance(ast, jack_ast.ArrayRef):
+                idx_vars, idx_stmts, idx_expr = rewrite_expression(t.nested(), ast.array_index)
+                return (idx_vars, idx_stmts, jack_ast.ArrayRef(ast.name, idx_expr))
+
+            elif isinstance(ast, jack_ast.SubroutineCall):
+                args_vars: List[jack_ast.VarDec] = []
+                args_stmts: List[jack_ast.Statement] = []
+                args = []
+                for a in ast.args:
+                    a_vars, a_stmts, a_expr = rewrite_expression(t.nested(), a)
+                    args_vars.extend(a_vars)
+                    args_stmts.extend(a_stmts)
+                    args.append(a_expr)
+                return (args_vars, args_stmts, ast._replace(args=args))
+
             else:
+                # Constants and simple variable references:
                 return [], [], ast
 
         cl = jack_ast.Class(
@@ -178,12 +234,30 @@ class Composed(JackTransform[Context]):
             r = self.t2.statement(ast, context)
         return r
 
+    def statements(self, asts: List[jack_ast.Statement], context: Context) -> Optional[List[jack_ast.Statement]]:
+        r = self.t1.statements(asts, context)
+        if r is None:
+            r = self.t2.statements(asts, context)
+        return r
+
     def expression(self, ast: jack_ast.Expression, context: Context) -> Optional[Tuple[List[jack_ast.VarDec], List[jack_ast.Statement], jack_ast.Expression]]:
         r = self.t1.expression(ast, context)
         if r is None:
             r = self.t2.expression(ast, context)
         return r
 
+    def nested(self) -> Optional[JackTransform[Context]]:
+        n1 = self.t1.nested()
+        n2 = self.t2.nested()
+        if n1 is None:
+            return n2
+        elif n2 is None:
+            return n1
+        elif n1 is self.t1 and n2 is self.t2:
+            return self
+        else:
+            return Composed(n1, n2)
+
 
 class NameGen:
     def __init__(self, prefix: str):
@@ -420,7 +494,235 @@ class InlineAbs(JackTransform[Context]):
 # TODO: inline Math.max/min()? These get embedded in expressions more often in the OS.
 
 
-all_transforms = FlattenNeg() | MultiplyByConstant() | DivideByConstant() | InlineAbs()
+class ConstantFold(JackTransform[Context]):
+    """Evaluate constant expressions, simplify trivial patterns, and remove code that can never run.
+
+    Arithmetic is done as the CPU does it, on 16-bit words, except that an expression is left alone
+    if:
+    - the result would be -32768, which can't be written as a constant
+    - it's a multiplication that would overflow, or a division involving negative values, where the
+        result depends on exactly how Math.multiply/divide handle those cases
+    - it's a division by zero, so Math.divide still gets to report the error when it's evaluated.
+
+    A sub-expression is only dropped (e.g. `f(x)*0`) if it doesn't contain any calls, because any
+    call might have side effects.
+
+    Note: `~(x = 0)` is *not* simplified to `x` as a condition, because compilers differ in how
+    they treat a condition that isn't 0 or -1 (e.g. the standard compiler tests `while` conditions
+    with a bitwise `not`.)
+
+    Note: like FlattenNeg, this can produce negative integer constants.
+    """
+
+    def nested(self) -> Optional[JackTransform[Context]]:
+        # Folding never makes code bigger, so it's applied everywhere.
+        return self
+
+    def statement(self, ast: jack_ast.Statement, context: Context) -> Optional[Tuple[List[jack_ast.VarDec], List[jack_ast.Statement]]]:
+        if isinstance(ast, jack_ast.IfStatement):
+            cond = fold(ast.cond)
+            value = constant_value(cond)
+            if value is not None:
+                # Note: no new scope here; the statements just move into the surrounding block.
+                return ([], list(ast.when_true) if value != 0 else list(ast.when_false or []))
+            elif cond is not ast.cond:
+                return ([], [ast._replace(cond=cond)])
+        elif isinstance(ast, jack_ast.WhileStatement):
+            cond = fold(ast.cond)
+            if constant_value(cond) == 0:
+                return ([], [])
+            elif cond is not ast.cond:
+                return ([], [ast._replace(cond=cond)])
+        return None
+
+    def statements(self, asts: List[jack_ast.Statement], context: Context) -> Optional[List[jack_ast.Statement]]:
+        for i, s in enumerate(asts[:-1]):
+            if always_returns(s):
+                return asts[:i+1]
+        return None
+
+    def expression(self, ast: jack_ast.Expression, context: Context) -> Optional[Tuple[List[jack_ast.VarDec], List[jack_ast.Statement], jack_ast.Expression]]:
+        folded = fold(ast)
+        if folded is not ast:
+            return ([], [], folded)
+        return None
+
+
+def fold(ast: jack_ast.Expression) -> jack_ast.Expression:
+    """Simplify an expression, from the bottom up. If nothing can be simplified, the same object
+    is returned, so the result can be checked for changes with `is`. (Note: `==` doesn't work for
+    that, because the nodes are tuples, so e.g. `IntegerConstant(0) == KeywordConstant(False)`.)
+
+    >>> fold(jack_ast.BinaryExpression(jack_ast.IntegerConstant(512), jack_ast.Op("/"), jack_ast.IntegerConstant(16)))
+    IntegerConstant(value=32)
+    >>> fold(jack_ast.BinaryExpression(jack_ast.VarRef("x"), jack_ast.Op("*"), jack_ast.IntegerConstant(1)))
+    VarRef(name='x')
+    >>> fold(jack_ast.BinaryExpression(jack_ast.IntegerConstant(32767), jack_ast.Op("+"), jack_ast.IntegerConstant(1)))
+    BinaryExpression(left=IntegerConstant(value=32767), op=Op(symbol='+'), right=IntegerConstant(value=1))
+    """
+
+    if isinstance(ast, jack_ast.BinaryExpression):
+        left = fold(ast.left)
+        right = fold(ast.right)
+        result = _fold_binary(left, ast.op.symbol, right)
+        if result is not None:
+            return result
+        elif left is ast.left and right is ast.right:
+            return ast
+        else:
+            return jack_ast.BinaryExpression(left, ast.op, right)
+
+    elif isinstance(ast, jack_ast.UnaryExpression):
+        expr = fold(ast.expr)
+        value = constant_value(expr)
+        if value is not None and not (ast.op.symbol == "-" and isinstance(expr, jack_ast.IntegerConstant)):
+            # Note: a negative constant (e.g. "-1") is left as it is; see FlattenNeg.
+            if ast.op.symbol == "-":
+                result = _constant(_word(-value), boolean=False)
+            else:
+                result = _constant(_word(~value), boolean=isinstance(expr, jack_ast.KeywordConstant))
+            if result is not None:
+                return result
+        if isinstance(expr, jack_ast.UnaryExpression) and expr.op.symbol == ast.op.symbol:
+            # -(-x) or ~(~x):
+            return expr.expr
+        if expr is ast.expr:
+            return ast
+        return jack_ast.UnaryExpression(ast.op, expr)
+
+    elif isinstance(ast, jack_ast.ArrayRef):
+        idx = fold(ast.array_index)
+        if idx is ast.array_index:
+            return ast
+        return jack_ast.ArrayRef(ast.name, idx)
+
+    elif isinstance(ast, jack_ast.SubroutineCall):
+        args = [fold(a) for a in ast.args]
+        if all(a is b for a, b in zip(args, ast.args)):
+            return ast
+        return ast._replace(args=args)
+
+    else:
+        return ast
+
+
+def _fold_binary(left: jack_ast.Expression, op: str, right: jack_ast.Expression) -> Optional[jack_ast.Expression]:
+    l = constant_value(left)
+    r = constant_value(right)
+
+    if l is not None and r is not None:
+        both_boolean = isinstance(left, jack_ast.KeywordConstant) and isinstance(right, jack_ast.KeywordConstant)
+        if op == "+":
+            return _constant(_word(l + r), boolean=False)
+        elif op == "-":
+            return _constant(_word(l - r), boolean=False)
+        elif op == "*":
+            return _constant(l*r, boolean=False) if -32767 <= l*r <= 32767 else None
+        elif op == "/":
+            return _constant(l//r, boolean=False) if l >= 0 and r > 0 else None
+        elif op == "&":
+            return _constant(l & r, boolean=both_boolean)
+        elif op == "|":
+            return _constant(l | r, boolean=both_boolean)
+        elif op in ("<", ">"):
+            # The VM compares by subtracting, so the compiled code gets the wrong answer when the
+            # difference overflows (e.g. -30000 < 30000); leave those for it to get wrong the same way.
+            if not -32768 <= l - r <= 32767:
+                return None
+            return jack_ast.KeywordConstant(l < r if op == "<" else l > r)
+        elif op == "=":
+            return jack_ast.KeywordConstant(l == r)
+        else:
+            return None
+
+    # Identities, where one side is enough:
+    if op == "+":
+        if r == 0: return left
+        if l == 0: return right
+    elif op == "-":
+        if r == 0: return left
+        if l == 0: return jack_ast.UnaryExpression(jack_ast.Op("-"), right)
+    elif op == "*":
+        if r == 1: return left
+        if l == 1: return right
+        if r == 0 and not has_calls(left): return right
+        if l == 0 and not has_calls(right): return left
+    elif op == "/":
+        if r == 1: return left
+    elif op == "&":
+        if r == -1: return left
+        if l == -1: return right
+        if r == 0 and not has_calls(left): return right
+        if l == 0 and not has_calls(right): return left
+    elif op == "|":
+        if r == 0: return left
+        if l == 0: return right
+        if r == -1 and not has_calls(left): return right
+        if l == -1 and not has_calls(right): return left
+
+    return None
+
+
+def constant_value(ast: jack_ast.Expression) -> Optional[int]:
+    """The value of an expression that's just a constant (treating true/false as the words -1/0),
+    or None.
+    """
+    if isinstance(ast, jack_ast.IntegerConstant):
+        return ast.value
+    elif isinstance(ast, jack_ast.KeywordConstant) and ast.value in (True, False):
+        return -1 if ast.value else 0
+    elif (isinstance(ast, jack_ast.UnaryExpression) and ast.op.symbol == "-"
+            and isinstance(ast.expr, jack_ast.IntegerConstant)):
+        return -ast.expr.value
+    else:
+        return None
+
+
+def _constant(value: int, boolean: bool) -> Optional[jack_ast.Expression]:
+    if boolean and value in (0, -1):
+        return jack_ast.KeywordConstant(value == -1)
+    elif value == -32768:
+        return None
+    else:
+        return jack_ast.IntegerConstant(value)
+
+
+def _word(value: int) -> int:
+    """Truncate to 16 bits, as a signed value."""
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def has_calls(ast: jack_ast.Expression) -> bool:
+    """True if evaluating the expression involves any subroutine calls (which might have side
+    effects.)
+    """
+    if isinstance(ast, jack_ast.SubroutineCall):
+        return True
+    elif isinstance(ast, jack_ast.BinaryExpression):
+        return has_calls(ast.left) or has_calls(ast.right)
+    elif isinstance(ast, jack_ast.UnaryExpression):
+        return has_calls(ast.expr)
+    elif isinstance(ast, jack_ast.ArrayRef):
+        return has_calls(ast.array_index)
+    else:
+        return False
+
+
+def always_returns(ast: jack_ast.Statement) -> bool:
+    """True if the statement always returns, so nothing following it can run."""
+    if isinstance(ast, jack_ast.ReturnStatement):
+        return True
+    elif isinstance(ast, jack_ast.IfStatement):
+        return (ast.when_false is not None
+                and any(always_returns(s) for s in ast.when_true)
+                and any(always_returns(s) for s in ast.when_false))
+    else:
+        return False
+
+
+
+all_transforms = ConstantFold() | FlattenNeg() | MultiplyByConstant() | DivideByConstant() | InlineAbs()
 
 name_gen = NameGen("rdc")
 
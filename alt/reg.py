@@ -1326,6 +1326,8 @@ RETURN_ADDRESS = "R4"  # Note: have to avoid using the "temp" registers if this
 RESULT = "R12" # for now, just use one of the registers also used for local variables.
 
 class Translator(solved_07.Translator):
+    FUSED_OPS = ()  # Not VM ops at all
+
     def __init__(self, asm=None):
         self.asm = asm if asm else AssemblySource()
         solved_07.Translator.__init__(self, self.asm)
@@ -1341,6 +1343,30 @@ class Translator(solved_07.Translator):
         """Override for compatibility: an "op" in this context is an entire Class in the IR form."""
         self.translate_class(op)
 
+    def split_functions(self, ops):
+        """Override for PruningTranslator: each "op" is a Class, so split it into a Class for each
+        subroutine.
+
+        A subroutine whose address is taken with Jack.symbol() could be invoked from anywhere, so
+        it's treated as referenced by the subroutine that takes the address.
+        """
+
+        labels = {f"{cl.name.lower()}.{s.name}": f"{cl.name}.{s.name}" for cl in ops for s in cl.subroutines}
+
+        def refs(node, acc):
+            if isinstance(node, CallSub):
+                acc.add(f"{node.class_name}.{node.sub_name}")
+            elif isinstance(node, Symbol):
+                if node.name in labels:
+                    acc.add(labels[node.name])
+            elif isinstance(node, (tuple, list)):
+                for child in node:
+                    refs(child, acc)
+            return acc
+
+        return [(f"{cl.name}.{s.name}", [cl._replace(subroutines=[s])], refs(s.body, set()))
+                for cl in ops for s in cl.subroutines]
+
     def translate_class(self, class_ast: Class):
         for s in class_ast.subroutines:
             self.translate_subroutine(s, class_ast.name)
@@ -0,0 +1,360 @@
+#! /usr/bin/env python3
+
+"""An alternative Screen class for the OS, which does as much of its work as it can a whole word
+(16 pixels) at a time, and avoids multiplying and dividing.
+
+In Pong, most of the cycles in each frame that aren't spent waiting go to Screen.drawRectangle(),
+to draw and erase the ball and the ends of the bat. The bundled implementation already fills whole
+words in the middle of each row, but it spends far more than that up front, finding the
+addresses with Math.multiply() and Math.divide() and clipping with Math.min() and Math.max(), and
+then re-computes the masks for the edges on every row.
+
+Here, with the same external API:
+- The address of a pixel is found by doubling and testing bits, which is much cheaper than a
+    call to Math.multiply() or Math.divide() (for `32*y` and `x/16`).
+- Masks for the left and right edges of a span come from tables built by init(), and are
+    computed once for each rectangle, not for every row.
+- A rectangle that fits within a single column of words (including any vertical line) is drawn
+    with one masked update per row, stepping straight down the screen.
+- Horizontal lines are just rectangles one row high, so they get the whole-word fills.
+- Other lines use the same Bresenham's algorithm as the bundled class (so they cover exactly the
+    same pixels), but step the address and mask of the current pixel along with the coordinates,
+    instead of finding them again for every pixel.
+- clearScreen() clears eight words each time around its loop.
+
+To use it with any platform, replace its Screen class with `with_screen()`.
+"""
+
+from nand.platform import BUNDLED_PLATFORM
+
+
+SCREEN_CLASS = BUNDLED_PLATFORM.parser("""
+class Screen {
+    static boolean color;
+
+    // Array of 16 masks, each with the corresponding pixel set:
+    static Array pixels;
+
+    // Array of 16 masks, each with the corresponding pixel, and its neighbors to the left, set:
+    static Array leftPixels;
+
+    // Array of 16 masks, each with the corresponding pixel, and its neighbors to the right, set:
+    static Array rightPixels;
+
+    /** Initializes the Screen. */
+    function void init() {
+        var int x, bit, leftBits;
+
+        let color = true;
+
+        let pixels = Array.new(16);
+        let leftPixels = Array.new(16);
+        let rightPixels = Array.new(16);
+        let x = 0;
+        let bit = 1;
+        let leftBits = 1;
+        while (x < 16) {
+            let pixels[x] = bit;
+            let leftPixels[x] = leftBits;
+            let rightPixels[x] = -bit;  // i.e. every bit from this one up
+            let x = x + 1;
+            let bit = bit + bit;
+            let leftBits = leftBits + leftBits + 1;
+        }
+
+        return;
+    }
+
+    /** Erases the entire screen. */
+    function void clearScreen() {
+        var Array ptr;
+
+        let ptr = 16384;
+        while (ptr < 24576) {
+            let ptr[0] = 0;
+            let ptr[1] = 0;
+            let ptr[2] = 0;
+            let ptr[3] = 0;
+            let ptr[4] = 0;
+            let ptr[5] = 0;
+            let ptr[6] = 0;
+            let ptr[7] = 0;
+            let ptr = ptr + 8;
+        }
+
+        return;
+    }
+
+    /** Sets the current color, to be used for all subsequent drawXXX commands.
+     *  Black is represented by true, white by false. */
+    function void setColor(boolean b) {
+        // Note: explicitly `true` so *all* the bits are set.
+        if (b) {
+            let color = true;
+        }
+        else {
+            let color = false;
+        }
+
+        return;
+    }
+
+    /** Address of the word in the screen buffer containing the pixel (x,y), which must be on
+     *  the screen. */
+    function int wordAt(int x, int y) {
+        var int addr;
+
+        // 32*y, by doubling:
+        let addr = y + y;
+        let addr = addr + addr;
+        let addr = addr + addr;
+        let addr = addr + addr;
+        let addr = addr + addr + 16384;
+
+        // x/16, one bit at a time:
+        if (x & 256) { let addr = addr + 16; }
+        if (x & 128) { let addr = addr + 8; }
+        if (x & 64) { let addr = addr + 4; }
+        if (x & 32) { let addr = addr + 2; }
+        if (x & 16) { let addr = addr + 1; }
+
+        return addr;
+    }
+
+    /** Draws the (x,y) pixel, using the current color. */
+    function void drawPixel(int x, int y) {
+        var int mask;
+        var Array ptr;
+
+        if ((x < 0) | (x > 511) | (y < 0) | (y > 255)) {
+            return;
+        }
+
+        let mask = pixels[x & 15];
+        let ptr = Screen.wordAt(x, y);
+
+        let ptr[0] = (ptr[0] & ~mask) | (color & mask);
+
+        return;
+    }
+
+    /** Draws a line from pixel (x1,y1) to pixel (x2,y2), using the current color. */
+    function void drawLine(int x1, int y1, int x2, int y2) {
+        var int tmp, dx, dy, diff, yStep, addrStep, mask;
+        var Array ptr;
+        var boolean clip;
+
+        if ((y1 = y2) | (x1 = x2)) {
+            // Horizontal and vertical lines are one-pixel-wide rectangles, which are drawn
+            // a word at a time, or straight down a column of words:
+            do Screen.drawRectangle(x1, y1, x2, y2);
+
+            return;
+        }
+
+        // Always draw left-to-right:
+        if (x2 < x1) {
+            let tmp = x2; let x2 = x1; let x1 = tmp;
+            let tmp = y2; let y2 = y1; let y1 = tmp;
+        }
+
+        let dx = x2 - x1;
+        if (y1 < y2) {
+            let dy = y2 - y1;
+            let yStep = 1;
+            let addrStep = 32;
+        }
+        else {
+            let dy = y1 - y2;
+            let yStep = -1;
+            let addrStep = -32;
+        }
+
+        // If both ends are on the screen, so is every pixel in between, and each one can be
+        // drawn directly. Otherwise, every pixel is drawn (or not) by drawPixel().
+        let clip = (x1 < 0) | (x2 > 511) | (y1 < 0) | (y1 > 255) | (y2 < 0) | (y2 > 255);
+        if (~clip) {
+            let ptr = Screen.wordAt(x1, y1);
+            let mask = pixels[x1 & 15];
+        }
+
+        // Bresenham's algorithm, exactly as in the bundled implementation, but moving the
+        // address and mask of the current pixel with each step.
+        if (~(dx < dy)) {  // i.e. dx >= dy
+            // x always advances; add to y as needed
+            let diff = (dy+dy) - dx;
+            let dx = dx + dx;  // From here on, only twice each distance is needed
+            let dy = dy + dy;
+            while (true) {
+                if (clip) {
+                    do Screen.drawPixel(x1, y1);
+                }
+                else {
+                    let ptr[0] = (ptr[0] & ~mask) | (color & mask);
+                }
+
+                if (x1 = x2) {
+                    return;
+                }
+
+                if (diff > 0) {
+                    let y1 = y1 + yStep;
+                    let ptr = ptr + addrStep;
+                    let diff = diff - dx;
+                }
+                let diff = diff + dy;
+
+                let x1 = x1 + 1;
+                let mask = mask + mask;
+                if (mask = 0) {
+                    let mask = 1;
+                    let ptr = ptr + 1;
+                }
+            }
+        }
+        else {
+            // y always advances; add to x as needed
+            let diff = (dx+dx) - dy;
+            let dx = dx + dx;
+            let dy = dy + dy;
+            while (true) {
+                if (clip) {
+                    do Screen.drawPixel(x1, y1);
+                }
+                else {
+                    let ptr[0] = (ptr[0] & ~mask) | (color & mask);
+                }
+
+                if (y1 = y2) {
+                    return;
+                }
+
+                if (diff > 0) {
+                    let x1 = x1 + 1;
+                    let mask = mask + mask;
+                    if (mask = 0) {
+                        let mask = 1;
+                        let ptr = ptr + 1;
+                    }
+                    let diff = diff - dy;
+                }
+                let diff = diff + dx;
+
+                let y1 = y1 + yStep;
+                let ptr = ptr + addrStep;
+            }
+        }
+
+        return;
+    }
+
+    /** Draws a filled rectangle whose top left corner is (x1, y1)
+     * and bottom right corner is (x2,y2), using the current color. */
+    function void drawRectangle(int x1, int y1, int x2, int y2) {
+        var int tmp, rows, words;
+        var int leftKeep, leftFill, rightKeep, rightFill;
+        var Array ptr, last;
+
+        if (x2 < x1) { let tmp = x2; let x2 = x1; let x1 = tmp; }
+        if (y2 < y1) { let tmp = y2; let y2 = y1; let y1 = tmp; }
+
+        // Clip to the screen:
+        if ((x2 < 0) | (x1 > 511) | (y2 < 0) | (y1 > 255)) {
+            return;
+        }
+        if (x1 < 0) { let x1 = 0; }
+        if (x2 > 511) { let x2 = 511; }
+        if (y1 < 0) { let y1 = 0; }
+        if (y2 > 255) { let y2 = 255; }
+
+        // For each word at the edges, "keep" is the bits outside the rectangle, which are
+        // left alone, and "fill" is the bits inside it, in the current color.
+        let leftFill = rightPixels[x1 & 15];
+        let rightFill = leftPixels[x2 & 15];
+
+        let ptr = Screen.wordAt(x1, y1);         // The word containing the top-left pixel
+        let words = Screen.wordAt(x2, y1) - ptr; // Words to the one containing the right edge
+        let rows = y2 - y1;
+
+        if (words = 0) {
+            // Just one word in each row, with both edges in it:
+            let leftFill = leftFill & rightFill;
+            let leftKeep = ~leftFill;
+            let leftFill = color & leftFill;
+
+            while (~(rows < 0)) {
+                let ptr[0] = (ptr[0] & leftKeep) | leftFill;
+                let ptr = ptr + 32;
+                let rows = rows - 1;
+            }
+
+            return;
+        }
+
+        let leftKeep = ~leftFill;
+        let leftFill = color & leftFill;
+        let rightKeep = ~rightFill;
+        let rightFill = color & rightFill;
+
+        while (~(rows < 0)) {
+            let last = ptr + words;
+
+            // The left edge, then any whole words, and then the right edge:
+            let ptr[0] = (ptr[0] & leftKeep) | leftFill;
+            let ptr = ptr + 1;
+            while (ptr < last) {
+                let ptr[0] = color;
+                let ptr = ptr + 1;
+            }
+            let last[0] = (last[0] & rightKeep) | rightFill;
+
+            // Back to the left edge, in the next row:
+            let ptr = (ptr + 32) - words;
+            let rows = rows - 1;
+        }
+
+        return;
+    }
+
+    /** Draws a filled circle of radius r<=181 around (x,y), using the current color. */
+    function void drawCircle(int x, int y, int r) {
+        // Drawn one row at a time, exactly as in the bundled implementation; see the notes there.
+
+        var int i, dy, dx;
+        var int rSq;
+
+        if (r > 181) {
+            return;
+        }
+
+        let rSq = (r*r) - r;  // (r - 1/2)^2 = r^2 - r (+ 1/4)
+
+        let i = -r + 1;
+        while (~(i > r)) {  // i.e. i <= r
+            if (i > 0) { let dy = i - 1; } else { let dy = i; }
+            let dx = Math.sqrt(rSq - (dy*dy));
+            do Screen.drawRectangle(x - dx, y + dy, x + dx, y + dy);
+            let i = i + 1;
+        }
+
+        return;
+    }
+}
+""")
+
+
+def with_screen(platform, screen_class=SCREEN_CLASS):
+    """The same platform, with a different implementation of the Screen class in its library."""
+
+    return platform._replace(
+        library=[screen_class if cl.name == "Screen" else cl for cl in platform.library])
+
+
+SCREEN_PLATFORM = with_screen(BUNDLED_PLATFORM)
+
+
+if __name__ == "__main__":
+    # Note: this import requires pygame; putting it here allows the tests to import the module
+    import computer
+
+    computer.main(SCREEN_PLATFORM)
@@ -224,6 +224,7 @@ class Translator(solved_07.Translator):
             if t:
                 op, args = t
                 self.__getattribute__(op)(*args)
+        solved_07.Translator.finish(self)
 
     def rewrite_ops(self, ops):
         result = []
@@ -240,7 +241,7 @@ class Translator(solved_07.Translator):
             else:
                 result.append(ops[0])
                 ops = ops[1:]
-        return result
+        return solved_07.Translator.rewrite_ops(self, result)
 
 
 SHIFT_PLATFORM = BUNDLED_PLATFORM._replace(
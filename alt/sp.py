@@ -222,6 +222,10 @@ class Translator(solved_07.Translator):
     access to SP.
     """
 
+    # Note: add_constant/sub_constant would need to be re-written to use the new instructions, and
+    # wouldn't save much.
+    FUSED_OPS = ("if_compare_goto", "if_not_goto", "add_locals")
+
     def __init__(self):
         self.asm = AssemblySource()
         solved_07.Translator.__init__(self, self.asm)
@@ -276,6 +280,14 @@ class Translator(solved_07.Translator):
         self.asm.instr("D=--SP")
         self.asm.instr(f"SP++={op.replace('M', 'D')}")
 
+    def if_compare_goto(self, condition, name):
+        self._start_fused("if_compare_goto", condition, name)
+        self.asm.instr("D=--SP")
+        self.asm.instr("A=--SP")
+        self.asm.instr("D=A-D")
+        self.asm.instr(f"@{self.function_namespace}${name}")
+        self.asm.instr(f"D;J{condition}")
+
     def function(self, class_name, function_name, num_vars):
         """Pushing zeros is a lot simpler now, saving a few instructions."""
 
@@ -285,14 +297,8 @@ class Translator(solved_07.Translator):
         self.asm.start(f"function {class_name}.{function_name} {num_vars}")
         self.asm.label(f"{self.function_namespace}")
 
-        if num_vars == 0:
-            # Tricky: this instruction has no effect; it's just here to take up space in the ROM and ensure that the
-            # "function" op has a unique address assigned to it, so that it can appear in tracing and profiling. Yes,
-            # that is dumb.
-            self.asm.instr("0")
-        else:
-            for _ in range(num_vars):
-                self.asm.instr("SP++=0")
+        for _ in range(num_vars):
+            self.asm.instr("SP++=0")
 
     def _compare(self, op):
         # Saves about 4 instuctions each time, or a few % at runtime.
@@ -397,7 +403,7 @@ class Translator(solved_07.Translator):
 
 
     def finish(self):
-        pass
+        solved_07.Translator.finish(self)
 
 
 SP_PLATFORM = BUNDLED_PLATFORM._replace(
@@ -0,0 +1,147 @@
+#! /usr/bin/env python3
+
+"""Time the tools that turn source into a program, each against the original implementation it
+replaced, and check that they still give the same result.
+
+Wall-clock times depend on the machine and whatever else it's doing, so this isn't part of the
+tests; just run it: `./alt/speed.py`.
+"""
+
+import glob
+import re
+import timeit
+
+from nand.solutions import solved_06, solved_10
+from nand.solutions.solved_06 import BUILTIN_SYMBOLS, ALU_CONTROL, JMP_CONTROL, ParseError
+
+
+def main():
+    with open("examples/Pong.asm") as f:
+        pong_asm = f.read().split("\n")
+
+    assert solved_06.assemble(pong_asm) == original_assemble(pong_asm)
+    print_comparison("Assemble Pong", best_time(solved_06.assemble, pong_asm), best_time(original_assemble, pong_asm))
+
+    # solved_10.lex_simple() is the original lexer, unchanged:
+    for name, pattern in (("OS", "nand/solutions/solved_12/*.jack"), ("Pong", "examples/project_11/Pong/*.jack")):
+        src = "\n".join(open(path).read() for path in sorted(glob.glob(pattern)))
+
+        assert solved_10.lex(src) == solved_10.lex_simple(src)
+        print_comparison(f"Lex {name}", best_time(solved_10.lex, src), best_time(solved_10.lex_simple, src))
+
+
+def best_time(fn, arg, repeat=5):
+    """Best time in seconds for a single call."""
+    return min(timeit.repeat(lambda: fn(arg), number=1, repeat=repeat))
+
+
+def print_comparison(name, new, old):
+    print(f"{name}:")
+    print(f"  {new*1000:0.1f}ms (original: {old*1000:0.1f}ms; {old/new:0.1f}x faster)")
+
+
+#
+# The assembler, exactly as it was before assemble() was re-written in a single pass:
+#
+
+def original_parse_op(string, symbols=None):
+    m = re.match(r"@((0x[0-9a-fA-F]+)|([1-9][0-9]*)|0)", string)
+    if m:
+        value = eval(m.group(1))
+        if value < 0 or value > 0x7FFF:
+            raise ParseError(f"A-command value out of range: {value}")
+        return value
+    else:
+        m = re.match(r"(?:([ADM]+)=)?([^;]+)(?:;J(..))?", string)
+        if m:
+            dest_str = m.group(1) or ""
+            dest = 0
+            if 'A' in dest_str:
+                dest |= 0b100
+            if 'D' in dest_str:
+                dest |= 0b010
+            if 'M' in dest_str:
+                dest |= 0b001
+
+            alu_str = m.group(2).replace('M', 'A')
+            if alu_str in ALU_CONTROL:
+                alu = ALU_CONTROL[alu_str]
+                m_for_a = int('M' in m.group(2))
+            else:
+                raise ParseError(f"unrecognized alu op: {m.group(2)}")
+
+            jmp_str = m.group(3)
+            if jmp_str is None:
+                jmp = 0
+            elif jmp_str in JMP_CONTROL:
+                jmp = JMP_CONTROL[jmp_str]
+            else:
+                raise ParseError(f"unrecognized jump: J{m.group(3)}")
+
+            return (0b111 << 13) | (m_for_a << 12) | (alu << 6) | (dest << 3) | jmp
+        else:
+            raise ParseError(f"unrecognized: {string}")
+
+
+def original_assemble(lines, parse_op=original_parse_op, min_static=16, max_static=255, start_addr=0, builtins=BUILTIN_SYMBOLS):
+    # First pass: strip out non-instruction lines and extraneous characters:
+    code_lines = []
+    for line in lines:
+        m = re.match(r"([^/]*)(?://.*)?", line)
+        if m:
+            string = m.group(1).strip()
+        else:
+            string = line.strip()
+
+        if string:
+            code_lines.append(string)
+
+    # Second pass: resolve labels to locations
+    symbols = {}
+    loc = start_addr
+    for line in code_lines:
+        m = re.match(r"\((.*)\)", line)
+        if m:
+            name = m.group(1)
+            if name in builtins:
+                raise ParseError(f"Attempt to redefine builtin symbol {name} at location {loc}")
+            elif name in symbols:
+                print(f"WARNING! Label {name} redefined at {loc} (previous location: {symbols[name]})")
+            symbols[name] = loc
+        else:
+            loc += 1
+
+    # Third pass: parse all other instructions, and resolve non-label symbols (i.e. "static" allocations.)
+    ops = [0]*start_addr
+    statics = {}
+    next_static = min_static
+    for line in code_lines:
+        if "(" in line:
+            pass
+        else:
+            m = re.match(r"@(\D.*)", line)
+            if m:
+                name = m.group(1)
+                if name in builtins:
+                    ops.append(builtins[name])
+                elif name in symbols:
+                    ops.append(symbols[name])
+                elif name in statics:
+                    ops.append(statics[name])
+                else:
+                    if next_static is None:
+                        raise ParseError(f"Unable to allocate static storage for symbol {name}; no static allocation space available")
+                    elif next_static > max_static:
+                        raise ParseError(f"Unable to allocate static storage for symbol {name}; already used all {max_static - min_static + 1} available locations")
+                    else:
+                        statics[name] = next_static
+                        ops.append(next_static)
+                        next_static += 1
+            else:
+                ops.append(parse_op(line, symbols))
+
+    return (ops, symbols, statics)
+
+
+if __name__ == "__main__":
+    main()
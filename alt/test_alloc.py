@@ -0,0 +1,104 @@
+#! /usr/bin/env pytest
+
+import pytest
+
+from nand import run
+from nand.translate import translate_jack
+import test_12, test_optimal_08
+
+from alt.alloc import *
+
+
+def test_memory_lib():
+    test_12.test_memory_lib(memory_class=MEMORY_CLASS, platform=ALLOC_PLATFORM)
+
+def test_string_lib():
+    test_12.test_string_lib(string_class=test_12.project_12.STRING_CLASS, platform=ALLOC_PLATFORM)
+
+def test_memory_lib_split():
+    test_12.test_memory_lib_split(memory_class=MEMORY_CLASS, platform=ALLOC_PLATFORM)
+
+def test_memory_lib_stress():
+    test_12.test_memory_lib_stress(memory_class=MEMORY_CLASS, platform=ALLOC_PLATFORM)
+
+def test_stress_cycles():
+    _, cycles = test_12.run_memory_stress(MEMORY_CLASS, ALLOC_PLATFORM)
+
+    # compare to the bundled Memory class (about 2.6M)
+    assert cycles < 1_000_000
+
+
+MERGE_TEST = """
+class Main {
+    function void main() {
+        var Array a, b, c, d, e, block, next;
+        var int i;
+
+        // Neighboring large blocks are merged as they're freed, in any order:
+        let a = Array.new(100);
+        let b = Array.new(100);
+        let c = Array.new(100);
+        let d = Array.new(20);  // so they stay on the free list
+        do a.dispose();
+        do c.dispose();
+        do b.dispose();
+        let e = Array.new(302);
+        do Memory.poke(8000, a);
+        do Memory.poke(8001, e);
+        do e.dispose();
+        do d.dispose();
+
+        // Fill most of the heap with small blocks, chained together so they can be found again:
+        let block = null;
+        let i = 0;
+        while (i < 1000) {
+            let next = block;
+            let block = Array.new(12);
+            let block[0] = next;
+            let i = i + 1;
+        }
+        while (~(block = null)) {
+            let next = block[0];
+            do block.dispose();
+            let block = next;
+        }
+
+        // This fits only if the small blocks are merged again:
+        let e = Array.new(13000);
+        do Memory.poke(8002, e);
+        return;
+    }
+}
+"""
+
+def test_merge_free_blocks():
+    translator = ALLOC_PLATFORM.translator()
+    translator.preamble()
+    translate_jack(translator, ALLOC_PLATFORM, MEMORY_CLASS)
+    test_12.translate_library(translator, ALLOC_PLATFORM, "Array")
+    translate_jack(translator, ALLOC_PLATFORM, test_12.minimal_sys_lib("Memory", ALLOC_PLATFORM))
+    translate_jack(translator, ALLOC_PLATFORM, ALLOC_PLATFORM.parser(MERGE_TEST))
+    translator.finish()
+    translator.check_references()
+
+    computer = run(ALLOC_PLATFORM.chip, simulator="codegen")
+    translator.asm.run(ALLOC_PLATFORM.assemble, computer, stop_cycles=2_000_000)
+
+    a = computer.peek(8000)
+    assert a != 0
+    assert computer.peek(8001) == a  # the space of a, b, and c
+    assert computer.peek(8002) == a  # the whole heap, back in one piece
+
+
+def test_with_memory():
+    platform = with_memory(test_12.BUNDLED_PLATFORM)
+
+    assert [cl.name for cl in platform.library] == [cl.name for cl in test_12.BUNDLED_PLATFORM.library]
+    assert MEMORY_CLASS in platform.library
+
+
+def test_cycles_to_init():
+    cycles = test_optimal_08.count_cycles_to_init(ALLOC_PLATFORM)
+
+    # compare to the bundled Memory class (about 120k)
+    assert cycles < 113_000
@@ -0,0 +1,161 @@
+#! /usr/bin/env pytest
+
+import pytest
+
+from nand import jack_ast
+from nand.solutions import solved_10
+import test_12, test_optimal_08
+
+from alt.inline import *
+
+
+POINT = """
+class Point {
+    field int x, y;
+    field Array history;
+
+    method int getX() { return x; }
+    method void setX(int newX) { let x = newX; return; }
+    method int last() { return history[0]; }
+    method int sum() { return x + y; }
+}
+"""
+
+def parse_statements(src, varDecs=""):
+    ast = solved_10.parse_class(f"class Foo {{ function int bar(int a, Point p) {{ {varDecs} {src} }} }}")
+    return ast.subroutineDecs[0].body.statements
+
+def inline(src, *others):
+    """Inline calls in a function Foo.bar, with Point available, and return its body."""
+    inliner = Inliner([solved_10.parse_class(POINT)] + [solved_10.parse_class(o) for o in others])
+    ast = solved_10.parse_class(f"class Foo {{ function int bar(int a, Point p) {{ var int r; {src} }} }}")
+    return inliner.inline_class(ast).subroutineDecs[0].body, inliner.log
+
+
+def test_function():
+    body, log = inline("let r = Math.twice(a); return r;",
+                       "class Math { function int twice(int x) { return x + x; } }")
+
+    assert body.statements == parse_statements("let r = a + a; return r;")
+    assert "inline: Math.twice into Foo.bar (4 nodes)" in log
+
+def test_argument_evaluated_once():
+    body, log = inline("let r = Math.twice(a*3); return r;",
+                       "class Math { function int twice(int x) { return x + x; } }")
+
+    (x,), = [vd.names for vd in body.varDecs[1:]]
+    a_times_3, = parse_statements("return a*3;")
+    assert body.statements == [
+        jack_ast.LetStatement(x, None, a_times_3.expr),
+        jack_ast.LetStatement("r", None, jack_ast.BinaryExpression(jack_ast.VarRef(x), jack_ast.Op("+"), jack_ast.VarRef(x))),
+        jack_ast.ReturnStatement(jack_ast.VarRef("r")),
+    ]
+
+def test_early_return():
+    body, log = inline("let r = Math.abs(a); return r;",
+                       "class Math { function int abs(int x) { if (x < 0) { return -x; } return x; } }")
+
+    assert body.statements == parse_statements("if (a < 0) { let r = -a; } else { let r = a; } return r;")
+
+def test_method_fields():
+    body, log = inline("do p.setX(p.getX()); return p.sum();")
+
+    # setX's argument is evaluated first, into a new local (after getX is inlined there):
+    x = body.statements[0].name
+    assert body.statements == [
+        jack_ast.LetStatement(x, None, jack_ast.ArrayRef("p", jack_ast.IntegerConstant(0))),
+        jack_ast.LetStatement("p", jack_ast.IntegerConstant(0), jack_ast.VarRef(x)),
+        jack_ast.ReturnStatement(jack_ast.BinaryExpression(
+            jack_ast.ArrayRef("p", jack_ast.IntegerConstant(0)),
+            jack_ast.Op("+"),
+            jack_ast.ArrayRef("p", jack_ast.IntegerConstant(1)))),
+    ]
+
+def test_field_array():
+    body, log = inline("return p.last();")
+
+    history = body.statements[0].name
+    assert body.statements == [
+        jack_ast.LetStatement(history, None, jack_ast.ArrayRef("p", jack_ast.IntegerConstant(2))),
+        jack_ast.ReturnStatement(jack_ast.ArrayRef(history, jack_ast.IntegerConstant(0))),
+    ]
+
+def test_nested():
+    """A call inside an expression is inlined only if it's safe to move it ahead of the statement."""
+
+    body, log = inline("if (p.getX() > 0) { return 1; } return 0;")
+    assert body.statements[0] == jack_ast.LetStatement(body.varDecs[1].names[0], None, jack_ast.ArrayRef("p", jack_ast.IntegerConstant(0)))
+
+    body, log = inline("let r = Output.count() + 1; return r;",
+                       "class Output { static int count; function int count() { let count = count + 1; return count; } }")
+    assert body.statements == parse_statements("let r = Output.count() + 1; return r;")
+    assert "not inlined: Output.count into Foo.bar: refers to statics" in log
+
+def test_not_candidates():
+    body, log = inline("return a;",
+                       "class Big { function int f(int x) { return x+x+x+x+x+x+x+x+x+x; } "
+                       "            function int g(int x) { return Math.abs(x); } "
+                       "            function int h(int x) { while (x) { return 1; } return 0; } }")
+
+    assert "not a candidate: Big.f: too big (20 nodes)" in log
+    assert "not a candidate: Big.g: makes calls" in log
+    assert "not a candidate: Big.h: returns from inside a loop" in log
+
+def test_budget():
+    inliner = Inliner([solved_10.parse_class(POINT)], budget=5)
+    ast = solved_10.parse_class("class Foo { function int bar(Point p) { var int r; let r = p.sum(); let r = p.sum(); return r; } }")
+    inliner.inline_class(ast)
+
+    assert inliner.log[-2:] == [
+        "inline: Point.sum into Foo.bar (4 nodes)",
+        "not inlined: Point.sum into Foo.bar: over budget",
+    ]
+
+
+# Note: the tests for project 12 are set up to test alternative Jack implementations;
+# have to pick out each inlined class here.
+def inlined(name):
+    cl, = [cl for cl in INLINE_PLATFORM.library if cl.name == name]
+    return cl
+
+def test_array_lib():
+    test_12.test_array_lib(array_class=inlined("Array"), platform=INLINE_PLATFORM)
+
+def test_string_lib():
+    test_12.test_string_lib(string_class=inlined("String"), platform=INLINE_PLATFORM)
+
+def test_memory_lib():
+    test_12.test_memory_lib(memory_class=inlined("Memory"), platform=INLINE_PLATFORM)
+
+def test_keyboard_lib():
+    test_12.test_keyboard_lib(keyboard_class=inlined("Keyboard"), platform=INLINE_PLATFORM)
+
+def test_output_lib():
+    test_12.test_output_lib(output_class=inlined("Output"), platform=INLINE_PLATFORM)
+
+def test_math_lib():
+    test_12.test_math_lib(math_class=inlined("Math"), platform=INLINE_PLATFORM)
+
+def test_screen_lib():
+    test_12.test_screen_lib(screen_class=inlined("Screen"), platform=INLINE_PLATFORM)
+
+
+def test_pong_instructions():
+    instruction_count = test_optimal_08.count_pong_instructions(INLINE_PLATFORM)
+
+    # compare to the project_08 solution (about 25.7k)
+    assert instruction_count < 27_500
+
+
+def test_pong_first_iteration():
+    cycles = test_optimal_08.count_pong_cycles_first_iteration(INLINE_PLATFORM)
+
+    # compare to the project_08 solution (about 41.5k)
+    assert cycles < 34_200
+
+
+def test_cycles_to_init():
+    cycles = test_optimal_08.count_cycles_to_init(INLINE_PLATFORM)
+
+    # compare to the project_08 solution (about 129k)
+    assert cycles < 129_000
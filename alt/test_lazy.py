@@ -2,6 +2,8 @@
 
 import pytest
 
+import nand.test_translate
+
 import test_07
 import test_08
 import test_optimal_08
@@ -32,6 +34,9 @@ def test_vm_memory_access_static():
 def test_vm_basic_loop():
     test_08.test_basic_loop(translator=Translator)
 
+def test_vm_if_not_goto():
+    nand.test_translate.test_if_not_goto(platform=LAZY_PLATFORM)
+
 def test_vm_fibonacci_series():
     test_08.test_fibonacci_series(translator=Translator)
 
@@ -0,0 +1,56 @@
+#! /usr/bin/env pytest
+
+from nand.translate import AssemblySource
+
+from alt.profile import entered_function
+
+
+def loop_program():
+    """A function with no locals whose body starts with a loop, so the "function" op and the
+    loop's label share an address."""
+
+    asm = AssemblySource()
+    asm.start("function Main.main 0")
+    asm.label("main.main")
+    asm.start("call Main.count 0")
+    asm.instr("@main.count")
+    asm.instr("0;JMP")
+    asm.start("return")
+    asm.instr("@RETURN")
+    asm.instr("0;JMP")
+    asm.start("function Main.count 0")
+    asm.label("main.count")
+    asm.start("label WHILE_EXP0")
+    asm.start("push constant 1")
+    asm.instr("D=1")
+    asm.start("if-goto WHILE_EXP0")
+    asm.instr("@main.count$WHILE_EXP0")
+    asm.instr("D;JNE")
+    asm.start("call Main.count 0")
+    asm.instr("@main.count")
+    asm.instr("0;JMP")
+    asm.start("return")
+    asm.instr("@RETURN")
+    asm.instr("0;JMP")
+    return asm
+
+
+def test_entered_by_call():
+    src_map = loop_program().src_map
+
+    assert src_map.ops_at(4) == ["function Main.count 0", "label WHILE_EXP0", "push constant 1"]
+
+    assert entered_function(src_map, 4, None)
+    assert entered_function(src_map, 4, 1)
+
+
+def test_loop_is_not_entered():
+    src_map = loop_program().src_map
+
+    assert not entered_function(src_map, 4, 6)
+
+
+def test_recursive_call():
+    src_map = loop_program().src_map
+
+    assert entered_function(src_map, 4, 8)
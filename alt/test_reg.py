@@ -182,6 +182,28 @@ class Test {
     assert sub.body[0] == Eval(Reg(0, "x"), Const(0)), "x is assigned to the first register"
 
 
+def test_split_functions():
+    """For pruning, a function whose address is taken counts as referenced."""
+
+    ast = solved_10.parse_class("""
+        class Main {
+            function void main() { var int ptr; let ptr = Jack.symbol("main.foo"); do Jack.invoke(ptr); do Main.bar(); return; }
+            function void foo() { return; }
+            function void bar() { return; }
+            function void baz() { return; }
+        }""")
+
+    functions = Translator().split_functions([compile_class(ast)])
+
+    assert [(name, refs) for name, _, refs in functions] == [
+        ("Main.main", {"Main.foo", "Main.bar"}),
+        ("Main.foo", set()),
+        ("Main.bar", set()),
+        ("Main.baz", set()),
+    ]
+    assert [[s.name for s in cl.subroutines] for _, (cl,), _ in functions] == [["main"], ["foo"], ["bar"], ["baz"]]
+
+
 def test_array_lib():
     test_12.test_array_lib(platform=REG_PLATFORM)
 
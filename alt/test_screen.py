@@ -0,0 +1,140 @@
+#! /usr/bin/env pytest
+
+import pytest
+
+import test_12, test_optimal_08
+from nand.translate import translate_jack
+
+from alt.screen import *
+
+
+def test_compile_screen_lib():
+    test_12.test_compile_screen_lib(screen_class=SCREEN_CLASS, platform=SCREEN_PLATFORM)
+
+def test_screen_lib():
+    test_12.test_screen_lib(screen_class=SCREEN_CLASS, platform=SCREEN_PLATFORM)
+
+
+def test_screen_lib_speed():
+    computer, cycles = run_screen_program(
+        SCREEN_CLASS, SCREEN_PLATFORM,
+        test_12._parse_jack_file("examples/project_12/ScreenSpeedTest.jack", SCREEN_PLATFORM))
+
+    print(f"cycles: {cycles:0,d}")
+
+    # Spot check a couple of places nothing else is drawn over:
+    assert computer.peek_screen(250*32 + 0) == -1, "rectangle partly off the left edge"
+    assert computer.peek_screen(212*32 + 31) == 0b1111110000, "ball, at its final position"
+
+    # compare to the bundled Screen class (about 18.3M)
+    assert cycles < 2_100_000
+
+
+# A little of everything in ScreenSpeedTest, small enough to draw quickly with the bundled class:
+PICTURE_TEST = BUNDLED_PLATFORM.parser("""
+class Main {
+    function void main() {
+        var int i, x;
+
+        do Screen.clearScreen();
+
+        // Rectangles of several widths, at several alignments:
+        let x = 0;
+        let i = 0;
+        while (i < 10) {
+            do Screen.drawRectangle(x, 150, x + i + i + i, 152 + i);
+            let x = x + i + i + 7;
+            let i = i + 1;
+        }
+        do Screen.drawRectangle(3, 200, 100, 203);
+        do Screen.setColor(false);
+        do Screen.drawRectangle(37, 201, 70, 202);
+        do Screen.setColor(true);
+
+        // Rectangles partly off the screen:
+        do Screen.drawRectangle(-10, 250, 20, 300);
+        do Screen.drawRectangle(500, -5, 530, 3);
+
+        // Short lines out from the middle, in every direction:
+        do Screen.drawLine(256, 128, 276, 135);
+        do Screen.drawLine(256, 128, 265, 148);
+        do Screen.drawLine(256, 128, 247, 148);
+        do Screen.drawLine(256, 128, 236, 135);
+        do Screen.drawLine(236, 121, 256, 128);
+        do Screen.drawLine(247, 108, 256, 128);
+        do Screen.drawLine(265, 108, 256, 128);
+        do Screen.drawLine(276, 121, 256, 128);
+        do Screen.drawLine(300, 100, 310, 110);
+
+        // Horizontal and vertical lines:
+        do Screen.drawLine(0, 140, 511, 140);
+        do Screen.drawLine(99, 130, 13, 130);
+        do Screen.drawLine(100, 0, 100, 40);
+        do Screen.drawLine(333, 50, 333, 5);
+
+        // Lines partly off the screen:
+        do Screen.drawLine(-5, 10, 5, 20);
+        do Screen.drawLine(505, 250, 515, 260);
+        do Screen.drawLine(480, -10, 475, 10);
+
+        // And some pixels:
+        do Screen.drawPixel(0, 0);
+        do Screen.drawPixel(511, 255);
+        do Screen.drawPixel(17, 135);
+        do Screen.drawPixel(-1, 135);
+
+        return;
+    }
+}
+""")
+
+
+def test_same_picture():
+    """Every pixel is drawn exactly as the bundled implementation draws it, including lines and
+    rectangles that are only partly on the screen."""
+
+    expected, _ = run_screen_program(test_12.project_12.SCREEN_CLASS, test_12.BUNDLED_PLATFORM, PICTURE_TEST)
+    computer, _ = run_screen_program(SCREEN_CLASS, SCREEN_PLATFORM, PICTURE_TEST)
+
+    for addr in range(8192):
+        assert computer.peek_screen(addr) == expected.peek_screen(addr), f"row {addr // 32}, word {addr % 32}"
+
+
+def run_screen_program(screen_class, platform, main_class, simulator='codegen'):
+    """Run a program that draws with the given Screen class.
+
+    :return: the computer, and the number of cycles until the program halted.
+    """
+
+    translator = platform.translator()
+
+    translator.preamble()
+
+    translate_jack(translator, platform, screen_class)
+
+    test_12.translate_library(translator, platform, "Array")
+    test_12.translate_library(translator, platform, "Memory")
+    test_12.translate_library(translator, platform, "Math")
+    translate_jack(translator, platform, test_12.minimal_sys_lib(["Memory", "Math", "Screen"], platform))
+
+    translate_jack(translator, platform, main_class)
+
+    translator.finish()
+
+    translator.check_references()
+
+    return test_12.run_to_halt(translator, platform, simulator)
+
+
+def test_with_screen():
+    platform = with_screen(test_12.BUNDLED_PLATFORM)
+
+    assert [cl.name for cl in platform.library] == [cl.name for cl in test_12.BUNDLED_PLATFORM.library]
+    assert SCREEN_CLASS in platform.library
+
+
+def test_pong_first_iteration():
+    cycles = test_optimal_08.count_pong_cycles_first_iteration(SCREEN_PLATFORM)
+
+    # compare to the bundled Screen class (about 35k)
+    assert cycles < 7_000
@@ -4,6 +4,7 @@ import pytest
 
 from nand import run, unsigned
 from nand.translate import translate_dir
+import nand.test_translate
 import test_05
 import test_06
 import test_07
@@ -185,6 +186,9 @@ def test_vm_memory_access_static():
 def test_vm_basic_loop():
     test_08.test_basic_loop(chip=SPComputer, assemble=assemble, translator=Translator)
 
+def test_vm_if_not_goto():
+    nand.test_translate.test_if_not_goto(platform=SP_PLATFORM)
+
 def test_vm_fibonacci_series():
     test_08.test_fibonacci_series(chip=SPComputer, assemble=assemble, translator=Translator)
 
@@ -8,6 +8,27 @@ The `codegen` simulator is used unless --simulator is specified.
 
 $ ./computer.py examples/Blink.asm
 
+With --headless, no window is opened (and pygame isn't needed); the keyboard is fed from stdin or
+a script of timed keystrokes, TTY output goes to stdout, and the screen can be saved to image files:
+
+$ ./computer.py examples/project_11/Pong --headless --max-cycles 10000000 --dump-screen pong.png
+
+With --record, every change to the keyboard is saved, stamped with the cycle when the CPU saw it.
+--replay then runs the same session again headless, cycle for cycle, and prints a hash of the
+final state, which makes a repeatable benchmark out of an actual game:
+
+$ ./computer.py examples/project_11/Pong --record pong.keys
+$ ./computer.py examples/project_11/Pong --replay pong.keys
+
+The complete state of the machine can be saved to a file (with Ctrl-S, at a certain cycle, or
+when a headless run ends), and then picked up from there, skipping a long initialization:
+
+$ ./computer.py examples/project_11/Pong --headless --max-cycles 5000000 --save-state pong.state
+$ ./computer.py examples/project_11/Pong --load-state pong.state
+
+With --debug, the program runs under a simple command-line debugger, which can step, continue to a
+breakpoint, and ask when a word of memory last changed, going backward as well as forward.
+
 Note: if nothing is displayed on Mac OS X Mojave, install updated pygame with a fix:
 $ pip3 install pygame==2.0.0dev6
 
@@ -16,46 +37,124 @@ https://www.quora.com/How-do-you-install-Pygame-on-a-MacBook-M1?share=1
 """
 
 import argparse
+import atexit
+import collections
+import hashlib
+import json
+import multiprocessing
 import os
-import pygame
-from pygame import Surface, Color, PixelArray
+import queue
 import re
+import statistics
+import struct
 import sys
+import threading
 import time
+import zlib
+
+try:
+    import pygame
+except ImportError:
+    pygame = None  # Only needed for the UI; see --headless
+
+try:
+    import numpy as np
+    import pygame.surfarray
+except ImportError:
+    np = None  # Optional; see KVM.update_display_buffer()
 
 import nand.component
+from nand.debugger import TimeMachine
+from nand.fastforward import FastForward
+from nand.vector import extend_sign
 import nand.syntax
-from nand.translate import override_sys_wait, translate_dir, translate_library
+from nand.link import ObjectCache, check_references, compile_dir, compile_library, link, sys_wait_override
+from nand.translate import PruningTranslator, override_sys_wait, translate_dir, translate_library
 from nand.platform import USER_PLATFORM
 
 EVENT_INTERVAL = 1/10
-DISPLAY_INTERVAL = 1/20  # Note: screen update is pretty slow at this point, so no point in trying for a higher frame rate.
+# Note: without numpy, screen update is pretty slow, so no point in trying for a higher frame rate.
+DISPLAY_INTERVAL = 1/60 if np is not None else 1/20
 CYCLE_INTERVAL = 1/1.0  # How often to update the cycle and frame counters; a bit longer so they doesn't bounce around too much
 
-CYCLES_PER_CALL = 100  # Number of cycles to run in the tight loop (when not tracing)
+CYCLES_PER_CALL = 100  # Number of cycles to run between checking the time, when tracing (or limiting FPS)
+
+SLICE = 1/100  # Target wall-clock time for each batch of cycles, which determines how responsive the UI is
+HEADLESS_SLICE = 1/10  # With no UI to keep responsive, run much longer batches
+
+KEY_HOLD_CYCLES = 50_000  # How long each key typed on stdin is held down (and then released) when headless
 
 
 parser = argparse.ArgumentParser(description="Run assembly or VM/Jack source with display and keyboard")
 parser.add_argument("path", help="Path to source, either one file with assembly (<file>.asm) or a directory containing .vm or .jack files.")
 parser.add_argument("--simulator", action="store", default="codegen", help="One of 'vector' (slower, more precise); 'codegen' (faster, default); 'compiled' (experimental)")
-parser.add_argument("--trace", action="store_true", help="(VM/Jack-only) print cycle counts during initialization. Note: runs almost 3x slower.")
+parser.add_argument("--trace", action="store_true", help="(VM/Jack-only) print the cycle count at each call, except to the low-level OS classes.")
 parser.add_argument("--print", action="store_true", help="(VM/Jack-only) print translated assembly.")
-# TODO: "--debug" showing opcode-level trace. Breakpoints, stepping, peek/poke?
+parser.add_argument("--debug", action="store_true", help="Run under an interactive debugger (no UI), which can step backward as well as forward; type 'help' for commands.")
+parser.add_argument("--cache", action="store", help="(VM/Jack-only) directory to save each compiled class in, so it doesn't have to be compiled again (until it changes.)")
+parser.add_argument("--jobs", action="store", type=int, default=1, help="(VM/Jack-only) compile classes in this many processes at once.")
+parser.add_argument("--prune", action="store_true", help="(VM/Jack-only) leave out functions that are never called (from Sys.init), to save ROM space. Ignored with --cache.")
 parser.add_argument("--no-waiting", action="store_true", help="(VM/Jack-only) substitute a no-op function for Sys.wait.")
 parser.add_argument("--max-fps", action="store", type=int, help="Experimental! (VM/Jack-only) pin the game loop to a fixed rate, approximately (in games that use Sys.wait).\nMay or may not work, depending on the translator.")
-# TODO: "--max-cps"; limit the clock speed directly. That will allow different chips to be compared (in a way).
-# TODO: "--headless" with no UI, with Keyboard and TTY connected to stdin/stdout
+parser.add_argument("--fast-forward", action="store_true", help="Skip cycles spent in idle loops (e.g. Sys.halt, waiting for a key, or Sys.wait) without simulating them. The program sees the same number of cycles, but it runs faster.")
+parser.add_argument("--max-cps", action="store", type=int, help="Limit the clock speed to this many cycles per second (on average), so different chips/translators can be compared at the same speed.")
 parser.add_argument("--scale", action="store_true", help="Scale the display by a whole number multiplier to approximately fill the screen.")
+parser.add_argument("--process", action="store_true", help="Run the simulation in a separate process, so updating the display doesn't slow it down. Requires fork (i.e. not Windows).")
+parser.add_argument("--headless", action="store_true", help="Run with no UI, as fast as possible; keyboard input from stdin (or --keys), TTY output to stdout.")
+parser.add_argument("--keys", action="store", help="(headless) file of scripted keystrokes, one '<cycle> <keycode>' per line; keycode 0 releases the key.")
+parser.add_argument("--max-cycles", action="store", type=int, help="(headless) stop after this many cycles, if the program hasn't halted.")
+parser.add_argument("--dump-screen", action="store", help="(headless) file to save the screen to (.pbm or .png) when the program halts or stops. May include '{cycle}'.")
+parser.add_argument("--dump-every", action="store", type=int, help="(headless) also save the screen every so many cycles.")
+parser.add_argument("--record", action="store", help="Save every change to the keyboard, with the cycle it happened, to this file (in the format of --keys).")
+parser.add_argument("--save-state", action="store", help="File to save the state of the machine to: on Ctrl-S, at the cycle given by --save-at, or when a headless run ends.")
+parser.add_argument("--save-at", action="store", type=int, help="Cycle at which to save the state (see --save-state).")
+parser.add_argument("--load-state", action="store", help="Start from a state saved with --save-state, by the same program on the same chip and simulator.")
+parser.add_argument("--replay", action="store", help="Run headless with the keys recorded by --record, stopping at the cycle where the recording ended, and print a hash of the final state.")
 
 def main(platform=USER_PLATFORM):
     args = parser.parse_args()
 
     print(f"\nRunning {args.path} on {platform.chip.constr().label}\n")
 
-    prg, src_map, wait_addresses, halt_addresses = load(platform, args.path, print_asm=args.print, no_waiting=args.no_waiting)
+    prg, src_map, wait_addresses, halt_addresses = load(platform, args.path, print_asm=args.print, no_waiting=args.no_waiting, cache_path=args.cache, jobs=args.jobs, prune=args.prune)
 
     print(f"Size in ROM: {len(prg):0,d}")
 
+    if args.debug:
+        debug(prg, chip=platform.chip, simulator=args.simulator, src_map=src_map)
+        return
+
+    if args.headless or args.replay:
+        run_headless(prg,
+            chip=platform.chip,
+            simulator=args.simulator,
+            is_in_halt=in_function_pred(halt_addresses),
+            is_in_wait=in_function_pred(wait_addresses) if args.fast_forward else None,
+            keys=read_keys(args.replay or args.keys) if args.replay or args.keys else None,
+            max_cycles=args.max_cycles,
+            dump_path=args.dump_screen,
+            dump_interval=args.dump_every,
+            max_cps=args.max_cps,
+            record_path=args.record,
+            checkpoint=_checkpoint(args))
+        return
+
+    if pygame is None:
+        sys.exit("pygame is required to run with a display; try --headless")
+
+    if args.process:
+        run_in_process(prg,
+            chip=platform.chip,
+            name=args.path,
+            simulator=args.simulator,
+            is_in_halt=in_function_pred(halt_addresses),
+            is_in_wait=in_function_pred(wait_addresses) if args.fast_forward else None,
+            scale=args.scale,
+            max_cps=args.max_cps,
+            record_path=args.record,
+            checkpoint=_checkpoint(args))
+        return
+
     run(prg,
         chip=platform.chip,
         name=args.path,
@@ -63,11 +162,21 @@ def main(platform=USER_PLATFORM):
         src_map=src_map if args.trace else None,
         is_in_wait=in_function_pred(None if args.no_waiting else wait_addresses),
         max_fps=args.max_fps,
+        max_cps=args.max_cps,
         is_in_halt=in_function_pred(halt_addresses),
-        scale=args.scale)
+        fast_forward=args.fast_forward,
+        scale=args.scale,
+        record_path=args.record,
+        checkpoint=_checkpoint(args))
+
+
+def _checkpoint(args):
+    if args.save_state is None and args.load_state is None:
+        return None
+    return Checkpoint(save_path=args.save_state, save_at=args.save_at, load_path=args.load_state)
 
 
-def load(platform, path, print_asm=False, no_waiting=False):
+def load(platform, path, print_asm=False, no_waiting=False, cache_path=None, jobs=1, prune=False):
     if os.path.splitext(path)[1] == '.asm':
         # The path is expected to be a single file containing the entire contents of ROM:
         print(f"Reading assembly from file: {path}")
@@ -78,32 +187,56 @@ def load(platform, path, print_asm=False, no_waiting=False):
         # The path may be a file or directory containing VM or Jack source.
         # TODO: handle combinations of the above, with or without included "OS" classes.
 
-        translator = platform.translator()
-        translator.preamble()
-        translate_dir(translator, platform, path, print_asm)
+        if cache_path is not None:
+            # Compile each class separately, re-using whatever hasn't changed since last time:
+            cache = ObjectCache(cache_path)
+            objects = compile_dir(platform, path, cache, jobs) + compile_library(platform, cache, jobs)
+            print(f"Objects from cache: {cache.hits} of {cache.hits + cache.misses}")
 
-        translate_library(translator, platform)
+            try:
+                check_references(objects)
+            except Exception as x:
+                print(f"Warning: reference consistency check failed: {x}")
 
-        translator.finish()
+            if no_waiting:
+                objects.append(sys_wait_override(platform))
 
-        try:
-            translator.check_references()
-        except Exception as x:
-            print(f"Warning: reference consistency check failed: {x}")
+            asm = link(platform, objects)
+
+        else:
+            translator = platform.translator()
+            if prune:
+                translator = PruningTranslator(translator)
+            translator.preamble()
+            translate_dir(translator, platform, path, print_asm, jobs)
+
+            translate_library(translator, platform, jobs)
+
+            translator.finish()
+
+            if prune:
+                print(f"Pruned {len(translator.dropped_functions)} unused functions, saving {translator.words_saved():0,d} words of ROM")
+
+            try:
+                translator.check_references()
+            except Exception as x:
+                print(f"Warning: reference consistency check failed: {x}")
 
-        if no_waiting:
-            # Tricky: the assembler will favor the latest occurrence of any label, so simply
-            # redefining a function at the end effectively overrides the previous definition
-            # (which is still taking up space in the ROM.)
-            override_sys_wait(translator, platform)
+            if no_waiting:
+                # Tricky: the assembler will favor the latest occurrence of any label, so simply
+                # redefining a function at the end effectively overrides the previous definition
+                # (which is still taking up space in the ROM.)
+                override_sys_wait(translator, platform)
+
+            asm = translator.asm
 
         if print_asm:
-            for instr in translator.asm:
+            for instr in asm:
                 print(instr)
             print()
 
-        wait_addresses = translator.asm.find_function("Sys", "wait")
-        halt_addresses = translator.asm.find_function("Sys", "halt")
+        wait_addresses = asm.find_function("Sys", "wait")
+        halt_addresses = asm.find_function("Sys", "halt")
 
         # TODO: when --max-fps is enabled, inject a raw assembly version of Sys.wait that
         # definitely runs long enough to be detected in the run loop. Is that feasible,
@@ -112,7 +245,7 @@ def load(platform, path, print_asm=False, no_waiting=False):
         # These are just the defaults for now, but maybe they could be overridable?
         min_static = 16
         max_static = 255
-        instrs, symbols, statics = platform.assemble(translator.asm, min_static=min_static, max_static=max_static)
+        instrs, symbols, statics = platform.assemble(asm, min_static=min_static, max_static=max_static)
 
         if print_asm:
             print(f"Statics ({len(statics)} of {max_static - min_static + 1}):")
@@ -120,52 +253,54 @@ def load(platform, path, print_asm=False, no_waiting=False):
                 print(f"  {name}: {addr}")
             print()
 
-        return instrs, translator.asm.src_map, wait_addresses, halt_addresses
+        return instrs, asm.src_map, wait_addresses, halt_addresses
 
 
 COLORS = [0xFFFFFF, 0x000000]
 """0: White, 1: Black, as it was meant to be."""
 
 
-KEY_MAP = dict([
-    (pygame.K_RETURN, 128),
-    (pygame.K_BACKSPACE, 129),
-    (pygame.K_LEFT, 130),
-    (pygame.K_UP, 131),
-    (pygame.K_RIGHT, 132),
-    (pygame.K_DOWN, 133),
-    (pygame.K_HOME, 134),
-    (pygame.K_END, 135),
-    (pygame.K_PAGEUP, 136),
-    (pygame.K_PAGEDOWN, 137),
-    (pygame.K_INSERT, 138),
-    (pygame.K_DELETE, 139),
-    (pygame.K_ESCAPE, 140),
-    (pygame.K_F1, 141),
-    (pygame.K_F2, 142),
-    (pygame.K_F3, 143),
-    (pygame.K_F4, 144),
-    (pygame.K_F5, 145),
-    (pygame.K_F6, 146),
-    (pygame.K_F7, 147),
-    (pygame.K_F8, 148),
-    (pygame.K_F9, 149),
-    (pygame.K_F10, 150),
-    (pygame.K_F11, 151),
-    (pygame.K_F12, 152),
-] +
-[ (c, c) for c in range(32, 127) ])   # Printable characters, plus a few odd-balls
-
-SHIFTED_KEY_MAP = {
-    **KEY_MAP,
-    **dict((ord(x), ord(y)) for x, y in
-           zip("abcdefghijklmnopqrstuvwxyz`1234567890-=[]\\;',./",
-               "ABCDEFGHIJKLMNOPQRSTUVWXYZ~!@#$%^&*()_+{}|:\"<>?"))
-}
-"""Map from raw key code to the code produced when (any) shift modifier is down.
-Note: this is definitely not correct if your keyboard layout isn't a typical US layout.
-Not sure
-"""
+if pygame is not None:
+    KEY_MAP = dict([
+        (pygame.K_RETURN, 128),
+        (pygame.K_BACKSPACE, 129),
+        (pygame.K_LEFT, 130),
+        (pygame.K_UP, 131),
+        (pygame.K_RIGHT, 132),
+        (pygame.K_DOWN, 133),
+        (pygame.K_HOME, 134),
+        (pygame.K_END, 135),
+        (pygame.K_PAGEUP, 136),
+        (pygame.K_PAGEDOWN, 137),
+        (pygame.K_INSERT, 138),
+        (pygame.K_DELETE, 139),
+        (pygame.K_ESCAPE, 140),
+        (pygame.K_F1, 141),
+        (pygame.K_F2, 142),
+        (pygame.K_F3, 143),
+        (pygame.K_F4, 144),
+        (pygame.K_F5, 145),
+        (pygame.K_F6, 146),
+        (pygame.K_F7, 147),
+        (pygame.K_F8, 148),
+        (pygame.K_F9, 149),
+        (pygame.K_F10, 150),
+        (pygame.K_F11, 151),
+        (pygame.K_F12, 152),
+    ] +
+    [ (c, c) for c in range(32, 127) ])   # Printable characters, plus a few odd-balls
+
+    SHIFTED_KEY_MAP = {
+        **KEY_MAP,
+        **dict((ord(x), ord(y)) for x, y in
+               zip("abcdefghijklmnopqrstuvwxyz`1234567890-=[]\\;',./",
+                   "ABCDEFGHIJKLMNOPQRSTUVWXYZ~!@#$%^&*()_+{}|:\"<>?"))
+    }
+    """Map from raw key code to the code produced when (any) shift modifier is down.
+    Note: this is definitely not correct if your keyboard layout isn't a typical US layout.
+    Not sure
+    """
+
 
 class KVM:
     def __init__(self, title, width, height, scale=False):
@@ -182,13 +317,25 @@ class KVM:
         self.screen = pygame.display.set_mode((width, height), flags=flags)
         pygame.display.set_caption(title)
 
+        if np is not None:
+            self._palette = np.array(COLORS, dtype=np.uint32)
+
+        self.save_requested = False
+        """Set when Ctrl-S is pressed; the caller is expected to save the state and reset it."""
+
     def process_events(self):
         """Drain pygame's event loop, returning the pressed key, if any.
+
+        Keys pressed with Ctrl aren't passed along (the Hack keyboard has no Ctrl key), and Ctrl-S
+        sets `save_requested`.
         """
         typed_keys = []
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT: sys.exit()
+            elif event.type == pygame.KEYDOWN and event.mod & pygame.KMOD_CTRL:
+                if event.key == pygame.K_s:
+                    self.save_requested = True
             elif event.type == pygame.KEYDOWN:
                 if event.unicode != "" and ord(event.unicode) in KEY_MAP:
                     typed_keys.append(KEY_MAP[ord(event.unicode)])
@@ -203,6 +350,8 @@ class KVM:
 
         keys = pygame.key.get_pressed()
         mods = pygame.key.get_mods()
+        if mods & pygame.KMOD_CTRL:
+            return None
         shifted = mods & pygame.KMOD_SHIFT or mods & pygame.KMOD_LSHIFT or mods & pygame.KMOD_RSHIFT
         for idx, key in (KEY_MAP if not shifted else SHIFTED_KEY_MAP).items():
             if keys[idx]:
@@ -210,11 +359,26 @@ class KVM:
 
         return None
 
-    def update_display(self, get_pixel):
-        self.screen.fill(COLORS[0])
+    def update_display(self, get_pixel, dirty=None):
+        """Draw the contents of the screen buffer, one word at a time.
+
+        If `dirty` is provided, it's a collection of the addresses of words that have been written
+        since the last update (see take_screen_dirty()), and only the rows containing those words
+        are redrawn. When nothing has changed, the display isn't touched at all.
+        """
 
         row_words = self.width//16
-        for y in range(self.height):
+        if dirty is None:
+            self.screen.fill(COLORS[0])
+            rows = range(self.height)
+        elif dirty:
+            rows = sorted(set(addr // row_words for addr in dirty))
+        else:
+            return
+
+        for y in rows:
+            if dirty is not None:
+                self.screen.fill(COLORS[0], (0, y, self.width, 1))
             for w in range(row_words):
                 word = get_pixel(y*row_words + w)
                 if word != 0:
@@ -226,18 +390,143 @@ class KVM:
 
         pygame.display.flip()
 
+    def update_display_buffer(self, words, dirty=None):
+        """Draw the contents of the screen buffer, given as a sequence of words (a list, array,
+        or memoryview; see screen_buffer().)
+
+        If numpy is available, the words are unpacked to pixels all at once and blitted in a single
+        call, which takes well under a millisecond for the whole screen. Otherwise, this falls back
+        to update_display(), which only redraws the dirty rows, but a word at a time.
+        """
+
+        if np is None:
+            return self.update_display(words.__getitem__, dirty)
+
+        if dirty is not None and not dirty:
+            return
+
+        # Tricky: pixel 0 is the low bit of each word, so view the (little-endian) words as bytes
+        # and unpack them low bit first, which puts every pixel in order along each row.
+        raw = np.asarray(words, dtype="<i2").view(np.uint8)
+        pixels = np.unpackbits(raw, bitorder="little").reshape(self.height, self.width)
+        pygame.surfarray.blit_array(self.screen, self._palette[pixels.T])
+
+        pygame.display.flip()
+
+
+class Pacer:
+    """Decides how many cycles to run in each batch, so that each batch takes about `slice` seconds,
+    and optionally holds the clock to an average of `max_cps` cycles per second.
+
+    The simulators are fastest when they're asked to run many cycles per call, but the longer
+    each batch runs, the less responsive the UI. And the right size varies by orders of magnitude
+    depending on the simulator, the chip, and the program, so it's re-estimated after every batch,
+    from the rate actually achieved.
+
+    When the clock is limited, the pacer sleeps after each batch until the moment when the total
+    number of cycles so far *should* have been reached. Individual sleeps are not very accurate, but
+    errors don't accumulate, so the average rate is. If the simulator can't keep up, the schedule
+    is reset rather than trying to catch up later.
 
-def run(program, chip, name="Nand!", simulator="codegen", src_map=None, is_in_wait=(lambda _: False), max_fps=None, is_in_halt=(lambda _: False), scale=False):
+    Usage: run `pacer.batch` cycles, then call `pacer.ran()` with the number actually run, and repeat.
+    Any time spent between calls (e.g. updating the display) counts as part of the slice.
+    """
+
+    SMOOTHING = 0.25  # Weight of each new measurement in the estimated rate
+    MAX_LAG = 0.5     # Seconds behind schedule before giving up on catching up
+    WINDOW = 100      # Number of recent slices used to measure jitter
+
+    def __init__(self, slice=SLICE, max_cps=None, min_batch=1, max_batch=1_000_000, clock=time.monotonic, sleep=time.sleep):
+        self.slice = slice
+        self.max_cps = max_cps
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.clock = clock
+        self.sleep = sleep
+
+        self.batch = self._clamp(CYCLES_PER_CALL if max_cps is None else min(CYCLES_PER_CALL, max_cps*slice))
+        self.rate = None
+        """Estimated cycles per second when running flat out (not counting any sleeping)."""
+
+        self.cycles = 0
+        self.start_time = self.last_time = clock()
+        self.slices = collections.deque(maxlen=self.WINDOW)
+
+    def _clamp(self, batch):
+        return max(self.min_batch, min(self.max_batch, int(batch)))
+
+    def ran(self, cycles):
+        """Record that `cycles` were run since the last call; adjust the batch size and sleep if
+        the clock is limited and the simulation is ahead of schedule.
+        """
+
+        now = self.clock()
+        elapsed = now - self.last_time
+        # The first batch is just a guess, so its length doesn't count towards jitter:
+        steady = self.rate is not None
+        if elapsed > 0 and cycles > 0:
+            sample = cycles/elapsed
+            self.rate = sample if self.rate is None else self.rate + self.SMOOTHING*(sample - self.rate)
+        self.cycles += cycles
+
+        target = self.rate*self.slice if self.rate is not None else self.batch
+        if self.max_cps is not None:
+            target = min(target, self.max_cps*self.slice)
+
+            delay = self.start_time + self.cycles/self.max_cps - now
+            if delay > 0:
+                self.sleep(delay)
+                now = self.clock()
+            elif delay < -self.MAX_LAG:
+                self.start_time = now - self.cycles/self.max_cps
+
+        self.batch = self._clamp(target)
+        if steady:
+            self.slices.append(now - self.last_time)
+        self.last_time = now
+
+    @property
+    def jitter(self):
+        """Standard deviation of the length of recent slices, in seconds."""
+        return statistics.pstdev(self.slices) if len(self.slices) > 1 else 0.0
+
+    @property
+    def cps(self):
+        """Average cycles per second since the pacer was created (including any sleeping.)"""
+        elapsed = self.last_time - self.start_time
+        return self.cycles/elapsed if elapsed > 0 else 0.0
+
+
+def run(program, chip, name="Nand!", simulator="codegen", src_map=None, is_in_wait=(lambda _: False), max_fps=None, max_cps=None, is_in_halt=(lambda _: False), fast_forward=False, scale=False, record_path=None, checkpoint=None):
     computer = nand.syntax.run(chip, simulator=simulator)
     computer.init_rom(program)
 
+    checkpoint = checkpoint or Checkpoint()
+    start_cycles = checkpoint.start(computer, program, chip, simulator)
+
+    recorder = KeyRecorder(record_path) if record_path is not None else None
+    if recorder is not None:
+        # The loop only ends when the window is closed, via sys.exit():
+        atexit.register(recorder.close)
+
+    # Note: the counting loop in Sys.wait is only skipped if it's identified (i.e. not --no-waiting.)
+    ff = FastForward(computer, in_wait_region=is_in_wait) if fast_forward else None
+
+    if src_map:
+        call_sites = trace_call_sites(src_map)
+        call_addresses = set(call_sites)
+
     kvm = KVM(name, 512, 256, scale=scale)
 
+    # Note: the frame rate limit only works if the loop samples the PC often enough to catch the
+    # program in Sys.wait, so keep the batches small in that case.
+    pacer = Pacer(max_cps=max_cps, max_batch=CYCLES_PER_CALL if max_fps is not None else 1_000_000)
+
     last_cycle_time = last_event_time = last_display_time = last_frame_time = now = time.monotonic()
     was_in_sys_wait = False
     halted = False
 
-    last_cycle_count = cycles = 0
+    last_cycle_count = cycles = start_cycles
     last_frame_count = frames = 0
     while True:
         if halted:
@@ -246,107 +535,750 @@ def run(program, chip, name="Nand!", simulator="codegen", src_map=None, is_in_wa
             time.sleep(EVENT_INTERVAL)
 
         elif not src_map:
-            computer.ticktock(CYCLES_PER_CALL)
-            cycles += CYCLES_PER_CALL
+            batch = checkpoint.until_save(cycles, pacer.batch)
+            if ff is not None:
+                ff.ticktock(batch)
+            else:
+                computer.ticktock(batch)
+            cycles += batch
+            pacer.ran(batch)
 
         else:
-            computer.ticktock(); cycles += 1
-
-            op = src_map.get(computer.pc) if src_map else None
-            if op and op.startswith("call"):
-                # if 'Main' in op or 'init' in op or "Sys.halt" in op:
-                #     print(f"{cycles:10,d}; {op}     @{computer.pc}")
-                m = re.match(r'call (.*)\.(.*) (\d)', op)
-                if m:
-                    class_name = m.group(1)
-                    sub_name = m.group(2)
-                    tracable = False
-                    if class_name == 'Main': tracable = True
-                    elif sub_name == 'init': tracable = True
-                    elif class_name == "Sys" and sub_name == "halt": tracable = True
-                    elif class_name not in ("Keyboard", "Math", "Memory", "Array", "String", "Screen"): tracable = True
-                    # tracable = True
-                    if tracable:
-                        print(f"{cycles:10,d}; {class_name}.{sub_name}     @{computer.pc}")
-            # if op:
-            #     print(f"{computer.pc:5d}: {op}; cycle: {cycles:0,d}")
-
-        # Note: check the time only every few frames to reduce the overhead of timing
-        if cycles % CYCLES_PER_CALL == 0:
+            # Run until the next call worth tracing (or the end of the batch):
+            batch = computer.ticktock_until(checkpoint.until_save(cycles, pacer.batch), call_addresses)
+            cycles += batch
+            pacer.ran(batch)
+
+            site = call_sites.get(computer.pc)
+            if site is not None:
+                print(f"{cycles:10,d}; {site.class_name}.{site.function_name}     @{computer.pc}")
+
+        now = time.monotonic()
+
+        if checkpoint.due(cycles) or kvm.save_requested:
+            checkpoint.save(cycles)
+            kvm.save_requested = False
+
+        # Detect when the program is complete:
+        if not halted and is_in_halt(computer.pc):
+            print(f"Halted after {cycles:,d} cycles (@{computer.pc})")
+            halted = True
+
+        # Detect the end of the game loop:
+        in_sys_wait = is_in_wait(computer.pc)
+
+        # BUG: this isn't reliable; it works only if the program doesn't jump to any
+        # instructions outside the boundaries of the Sys.wait function body itself.
+        # But a lot of translators are going to do that, even if it's written as a flat
+        # loop at the Jack level. To make this work, probably going to have to inject a
+        # raw assembly version of Sys.wait that has predictable behavior.
+        if max_fps is not None and in_sys_wait and not was_in_sys_wait:
+            frames += 1
+
+            actual_delay = now - last_frame_time
+            last_frame_time = now
+            target_delay = 1.0/max_fps
+            remaining_delay = target_delay - actual_delay
+            if remaining_delay > 0:
+                # print(f"frame delay: {remaining_delay:.3f} ({100*remaining_delay/target_delay:.1f}%)")
+                time.sleep(remaining_delay)
+
+        # A few times per second, process events and update the display:
+        if now >= last_event_time + EVENT_INTERVAL:
+            last_event_time = now
+            key = kvm.process_events()
+            computer.set_keydown(key or 0)
+            if recorder is not None:
+                recorder.record(cycles, key or 0)
+
+        # Update the display a little sooner if we're in Sys.wait at the moment. The effect
+        # is to update after drawing is complete for a frame, more often than not, which reduces
+        # tearing. But we always maintain a minimum refresh rate, so you can see what the
+        # program is doing. Makes the most noticable difference when the FPS limit is high and the
+        # CPU is slow (not "compiled".)
+        if in_sys_wait:
+            display_interval = DISPLAY_INTERVAL/2
+        else:
+            display_interval = DISPLAY_INTERVAL
+        if now >= last_display_time + display_interval:
+            last_display_time = now
+            kvm.update_display_buffer(computer.screen_buffer(), computer.take_screen_dirty())
+
+        if not halted and now >= last_cycle_time + CYCLE_INTERVAL:
+            msgs = []
+
+            msgs.append(f"{cycles//1000:0,d}k cycles")
+            if ff is not None:
+                msgs.append(f"{ff.skipped//1000:0,d}k skipped")
+
+            cps = (cycles - last_cycle_count)/(now - last_cycle_time)
+            msgs.append(f"{cps/1000:0,.1f}k/s")
+
+            if frames > 0:
+                fps = (frames - last_frame_count)/(now - last_cycle_time)
+                msgs.append(f"{fps:0.0f}fps")
+
+            msgs.append(f"jitter {pacer.jitter*1000:0.1f}ms")
+
+            # This is sometimes helpful to show when your program jumps to some random address,
+            # or runs off the end of the ROM.
+            msgs.append(f"@{computer.pc}")
+
+            pygame.display.set_caption(f"{name}: {'; '.join(msgs)}")
+
+            last_cycle_time = now
+            last_cycle_count = cycles
+            last_frame_count = frames
+
+        # Note: you might want to check the frame delay and sleep *here*, after updating the
+        # display, so that the limit logic could account for the time is takes to process
+        # events and update the display. But somehow when it happens in that sequence, the
+        # loop gets very unresponsive and the FPS limit is effectively useless. Something
+        # in pygame doesn't like that sequence, somehow?
+
+        was_in_sys_wait = in_sys_wait
+
+
+# Layout of the shared memory block used by run_in_process(): a few 64-bit control words,
+# followed by the screen buffer.
+_CYCLES, _PC, _KEYBOARD, _SCREEN_DIRTY, _HALTED, _STOP, _SKIPPED, _SAVE = range(8)
+_CONTROL_BYTES = 64
+_SCREEN_WORDS = 8192
+
+
+def run_in_process(program, chip, name="Nand!", simulator="codegen", is_in_halt=(lambda _: False), is_in_wait=None, scale=False, max_cps=None, record_path=None, checkpoint=None):
+    """Run the simulation in a worker process, while this process handles the display and keyboard.
+
+    The worker copies each screen word into a block of shared memory as it's written, and reads the
+    current key from a shared word, so it never waits for the UI; the simulation proceeds at the
+    same rate as with --headless, no matter how often the display is refreshed.
+
+    If `is_in_wait` is provided, idle loops are skipped (see FastForward), with that as the wait region.
+
+    If `record_path` is provided, the keys are recorded there (see KeyRecorder), by the worker,
+    which knows the exact cycle when each one reached the CPU. Likewise, the state is saved and
+    loaded by the worker (see Checkpoint.)
+
+    Note: the worker is forked, because chips (and the predicates here) can't be pickled.
+    """
+
+    # Note: imported here because shared_memory is new in Python 3.8.
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(create=True, size=_CONTROL_BYTES + 2*_SCREEN_WORDS)
+    control = shm.buf[:_CONTROL_BYTES].cast("q")
+    screen = shm.buf[_CONTROL_BYTES:].cast("h")
+    for i in range(len(control)): control[i] = 0
+    for i in range(len(screen)): screen[i] = 0
+
+    worker = multiprocessing.get_context("fork").Process(
+        target=_simulate,
+        args=(shm, program, chip, simulator, is_in_halt, is_in_wait, max_cps, record_path, checkpoint or Checkpoint()),
+        daemon=True)
+    worker.start()
+
+    try:
+        kvm = KVM(name, 512, 256, scale=scale)
+        kvm.update_display_buffer(screen)
+
+        last_cycle_time = last_event_time = last_display_time = time.monotonic()
+        last_cycle_count = 0
+        halted = False
+        while True:
             now = time.monotonic()
 
-            # Detect when the program is complete:
-            if not halted and is_in_halt(computer.pc):
-                print(f"Halted after {cycles:,d} cycles (@{computer.pc})")
-                halted = True
-
-            # Detect the end of the game loop:
-            in_sys_wait = is_in_wait(computer.pc)
-
-            # BUG: this isn't reliable; it works only if the program doesn't jump to any
-            # instructions outside the boundaries of the Sys.wait function body itself.
-            # But a lot of translators are going to do that, even if it's written as a flat
-            # loop at the Jack level. To make this work, probably going to have to inject a
-            # raw assembly version of Sys.wait that has predictable behavior.
-            if max_fps is not None and in_sys_wait and not was_in_sys_wait:
-                frames += 1
-
-                actual_delay = now - last_frame_time
-                last_frame_time = now
-                target_delay = 1.0/max_fps
-                remaining_delay = target_delay - actual_delay
-                if remaining_delay > 0:
-                    # print(f"frame delay: {remaining_delay:.3f} ({100*remaining_delay/target_delay:.1f}%)")
-                    time.sleep(remaining_delay)
-
-            # A few times per second, process events and update the display:
             if now >= last_event_time + EVENT_INTERVAL:
                 last_event_time = now
                 key = kvm.process_events()
-                computer.set_keydown(key or 0)
-
-            # Update the display a little sooner if we're in Sys.wait at the moment. The effect
-            # is to update after drawing is complete for a frame, more often than not, which reduces
-            # tearing. But we always maintain a minimum refresh rate, so you can see what the
-            # program is doing. Makes the most noticable difference when the FPS limit is high and the
-            # CPU is slow (not "compiled".)
-            if in_sys_wait:
-                display_interval = DISPLAY_INTERVAL/2
-            else:
-                display_interval = DISPLAY_INTERVAL
-            if now >= last_display_time + display_interval:
+                control[_KEYBOARD] = key or 0
+                if kvm.save_requested:
+                    control[_SAVE] = 1
+                    kvm.save_requested = False
+
+            if now >= last_display_time + DISPLAY_INTERVAL:
                 last_display_time = now
-                kvm.update_display(computer.peek_screen)
+                # Tricky: reset the flag *before* reading the screen, so a write that happens
+                # while drawing is picked up next time.
+                dirty = control[_SCREEN_DIRTY]
+                control[_SCREEN_DIRTY] = 0
+                kvm.update_display_buffer(screen, None if dirty else set())
 
             if not halted and now >= last_cycle_time + CYCLE_INTERVAL:
-                msgs = []
+                cycles = control[_CYCLES]
+                cps = (cycles - last_cycle_count)/(now - last_cycle_time)
+                skipped = f"{control[_SKIPPED]//1000:0,d}k skipped; " if is_in_wait is not None else ""
+                pygame.display.set_caption(f"{name}: {cycles//1000:0,d}k cycles; {skipped}{cps/1000:0,.1f}k/s; @{control[_PC]}")
+                last_cycle_time = now
+                last_cycle_count = cycles
 
-                msgs.append(f"{cycles//1000:0,d}k cycles")
+                if control[_HALTED]:
+                    halted = True
+                    print(f"Halted after {cycles:,d} cycles (@{control[_PC]})")
+                elif not worker.is_alive():
+                    sys.exit(f"Simulation process exited unexpectedly (code {worker.exitcode})")
 
-                cps = (cycles - last_cycle_count)/(now - last_cycle_time)
-                msgs.append(f"{cps/1000:0,.1f}k/s")
+            time.sleep(min(EVENT_INTERVAL, DISPLAY_INTERVAL)/2)
 
-                if frames > 0:
-                    fps = (frames - last_frame_count)/(now - last_cycle_time)
-                    msgs.append(f"{fps:0.0f}fps")
+    finally:
+        control[_STOP] = 1
+        worker.join(timeout=1.0)
+        del control, screen
+        shm.close()
+        shm.unlink()
 
-                # This is sometimes helpful to show when your program jumps to some random address,
-                # or runs off the end of the ROM.
-                msgs.append(f"@{computer.pc}")
 
-                pygame.display.set_caption(f"{name}: {'; '.join(msgs)}")
+def _simulate(shm, program, chip, simulator, is_in_halt, is_in_wait, max_cps, record_path, checkpoint):
+    """Worker process for run_in_process()."""
 
-                last_cycle_time = now
-                last_cycle_count = cycles
-                last_frame_count = frames
+    control = shm.buf[:_CONTROL_BYTES].cast("q")
+    screen = shm.buf[_CONTROL_BYTES:].cast("h")
 
-            # Note: you might want to check the frame delay and sleep *here*, after updating the
-            # display, so that the limit logic could account for the time is takes to process
-            # events and update the display. But somehow when it happens in that sequence, the
-            # loop gets very unresponsive and the FPS limit is effectively useless. Something
-            # in pygame doesn't like that sequence, somehow?
+    computer = nand.syntax.run(chip, simulator=simulator)
+    computer.init_rom(program)
+    computer.take_tty_log()  # start logging
+
+    ff = FastForward(computer, in_wait_region=is_in_wait) if is_in_wait is not None else None
+
+    recorder = KeyRecorder(record_path) if record_path is not None else None
+
+    cycles = checkpoint.start(computer, program, chip, simulator)
+
+    pacer = Pacer(max_cps=max_cps)
+    while not control[_STOP]:
+        batch = checkpoint.until_save(cycles, pacer.batch)
+        if ff is not None:
+            ff.ticktock(batch)
+            control[_SKIPPED] = ff.skipped
+        else:
+            computer.ticktock(batch)
+        cycles += batch
+        pacer.ran(batch)
+
+        dirty = computer.take_screen_dirty()
+        if dirty:
+            buffer = computer.screen_buffer()
+            for addr in dirty:
+                screen[addr] = buffer[addr]
+            control[_SCREEN_DIRTY] = 1
+
+        if checkpoint.due(cycles) or control[_SAVE]:
+            checkpoint.save(cycles)
+            control[_SAVE] = 0
+
+        computer.set_keydown(control[_KEYBOARD])
+        if recorder is not None:
+            recorder.record(cycles, control[_KEYBOARD])
+
+        tty_chars = computer.take_tty_log()
+        if tty_chars:
+            computer.get_tty()
+            print("".join("\n" if c == 128 else chr(c) for c in tty_chars), end="", flush=True)
+
+        pc = computer.pc
+        control[_PC] = pc
+        control[_CYCLES] = cycles
+
+        if is_in_halt(pc):
+            control[_HALTED] = 1
+            break
+
+    if recorder is not None:
+        recorder.close()
+    del control, screen
+
+
+def run_headless(program, chip, simulator="codegen", is_in_halt=(lambda _: False), is_in_wait=None, keys=None, max_cycles=None, dump_path=None, dump_interval=None, max_cps=None, record_path=None, checkpoint=None):
+    """Run a program with no UI at all, in large batches of cycles.
+
+    If `keys` is provided, it's a sequence of (cycle, keycode) pairs (see read_keys()), and each
+    keycode is presented to the CPU starting at exactly that cycle. A keycode of None marks the end
+    of a recording, and the run stops there. Otherwise, characters are read from stdin, and each
+    one is pressed and released in turn. Either way, if `record_path` is provided, the keys are
+    recorded there (see KeyRecorder.)
+
+    Anything written to the TTY port is echoed to stdout.
+
+    If `dump_path` is provided, the screen is saved there when the program halts (or reaches
+    `max_cycles`), and every `dump_interval` cycles, if that's provided.
+
+    If `is_in_wait` is provided, idle loops are skipped (see FastForward), with that as the wait
+    region. The program's behavior is exactly the same, cycle for cycle.
+
+    If `max_cps` is provided, the clock is limited to that rate (see Pacer), which makes it
+    possible to compare programs or chips in "real" time.
+
+    At the end, a hash of the final state is printed (see state_hash()); two runs of the same
+    program with the same keys should always agree, whatever the simulator.
+
+    If `checkpoint` is provided, the run may start from a saved state, and the state is saved at
+    the requested cycle, or else at the end (see Checkpoint.)
+
+    Returns the number of cycles executed.
+    """
+
+    computer = nand.syntax.run(chip, simulator=simulator)
+    computer.init_rom(program)
+    computer.take_tty_log()  # start logging
+
+    checkpoint = checkpoint or Checkpoint()
+    cycles = checkpoint.start(computer, program, chip, simulator)
+
+    if keys is None:
+        keys = StdinKeys(KEY_HOLD_CYCLES)
+    else:
+        keys = iter(keys)
+    next_key = next(keys, None)
+
+    def dump_screen():
+        path = dump_path.format(cycle=cycles)
+        write_screen_image(path, computer.screen_buffer())
+        print(f"Saved screen to {path}", file=sys.stderr)
+
+    ff = FastForward(computer, in_wait_region=is_in_wait) if is_in_wait is not None else None
+
+    recorder = KeyRecorder(record_path) if record_path is not None else None
+
+    pacer = Pacer(slice=HEADLESS_SLICE, max_cps=max_cps)
+    start_time = time.monotonic()
+    start_cycles = cycles
+    while True:
+        batch = checkpoint.until_save(cycles, pacer.batch)
+        if next_key is not None:
+            batch = min(batch, next_key[0] - cycles)
+        if dump_path is not None and dump_interval is not None:
+            batch = min(batch, dump_interval - cycles % dump_interval)
+        if max_cycles is not None:
+            batch = min(batch, max_cycles - cycles)
+
+        if batch > 0:
+            if ff is not None:
+                ff.ticktock(batch)
+            else:
+                computer.ticktock(batch)
+            cycles += batch
+            pacer.ran(batch)
+
+        end_of_keys = False
+        if checkpoint.due(cycles):
+            checkpoint.save(cycles)
+
+        while next_key is not None and next_key[0] <= cycles:
+            if next_key[1] is None:
+                end_of_keys = True
+                break
+            computer.set_keydown(next_key[1])
+            if recorder is not None:
+                recorder.record(cycles, next_key[1])
+            next_key = next(keys, None)
+
+        tty_chars = computer.take_tty_log()
+        if tty_chars:
+            computer.get_tty()  # Reset the port, in case the program is waiting for it to be ready
+            for c in tty_chars:
+                sys.stdout.write("\n" if c == 128 else chr(c))
+            sys.stdout.flush()
+
+        if is_in_halt(computer.pc) or computer.pc >= len(program):
+            print(f"Halted after {cycles:,d} cycles (@{computer.pc})", file=sys.stderr)
+            break
+        elif max_cycles is not None and cycles >= max_cycles:
+            print(f"Stopped after {cycles:,d} cycles (@{computer.pc})", file=sys.stderr)
+            break
+        elif end_of_keys:
+            print(f"Replayed {cycles:,d} cycles (@{computer.pc})", file=sys.stderr)
+            break
+
+        if dump_path is not None and dump_interval is not None and cycles % dump_interval == 0:
+            dump_screen()
+
+    elapsed = time.monotonic() - start_time
+    run_cycles = cycles - start_cycles
+    print(f"{run_cycles/1000:0,.1f}k cycles in {elapsed:0.2f}s ({run_cycles/elapsed/1000:0,.1f}k/s; jitter {pacer.jitter*1000:0.1f}ms)", file=sys.stderr)
+    if ff is not None:
+        print(f"{ff.skipped/1000:0,.1f}k cycles skipped ({100*ff.skipped/max(run_cycles, 1):0.1f}%)", file=sys.stderr)
+    print(f"Final state: {state_hash(computer)}", file=sys.stderr)
+
+    if recorder is not None:
+        recorder.close(cycles)
+
+    if checkpoint.save_path is not None and checkpoint.save_at is None:
+        checkpoint.save(cycles)
+
+    if dump_path is not None:
+        dump_screen()
+
+    return cycles
+
+
+def read_keys(path):
+    """Read a script of keystrokes: each line is the cycle number at which a key goes down and its
+    keycode, or 0 when the key is released. A cycle number alone marks the end of a recording (see
+    KeyRecorder), and becomes a keycode of None. Blank lines and comments (starting with '#') are
+    ignored.
+
+    Returns a list of (cycle, keycode) pairs, in order.
+    """
+
+    keys = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#")[0].strip()
+            if line:
+                cycle, *key = line.split()
+                keys.append((int(cycle), int(key[0]) if key else None))
+    return sorted(keys, key=lambda t: t[0])
+
+
+class KeyRecorder:
+    """Writes each change to the keyboard to a file, in the format of read_keys(), stamped with
+    the cycle when the CPU started seeing it. The UI samples the keyboard at wall-clock intervals,
+    so the cycles vary from one run to the next, but feeding the file back to run_headless()
+    presents the same keys at the same cycles, reproducing the session exactly.
+
+    The last cycle seen is written at the end, so the replay stops at the same point.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "w")
+        self.file.write("# <cycle> <keycode>; recorded by computer.py\n")
+        self.key = 0
+        self.cycle = 0
+
+    def record(self, cycle, key):
+        """Note the key that's down as of `cycle`; only changes are written."""
+        if key != self.key:
+            self.file.write(f"{cycle} {key}\n")
+            self.key = key
+        self.cycle = cycle
+
+    def close(self, cycle=None):
+        if self.file.closed:
+            return
+        self.file.write(f"{cycle if cycle is not None else self.cycle}\n")
+        self.file.close()
+
+
+def state_hash(computer):
+    """A short hash of the state that's visible to the program: the PC, and the contents of RAM
+    and the screen. It's the same for any simulator, so it identifies the result of a run.
+    """
+
+    h = hashlib.sha256()
+    h.update(struct.pack("<H", computer.pc))
+    h.update(struct.pack("<16384H", *(computer.peek(i) & 0xFFFF for i in range(16384))))
+    h.update(struct.pack("<8192H", *(w & 0xFFFF for w in computer.screen_buffer())))
+    return h.hexdigest()[:16]
+
+
+class StdinKeys:
+    """Iterator producing (cycle, keycode) pairs for characters as they are read from stdin. Each
+    character is held down for `hold_cycles` and then released for the same period, so that even
+    a program that waits for each key to be released (e.g. Keyboard.readChar) sees them all.
+
+    Stdin is read on a background thread, so the simulation never waits for input. Until a character
+    is available, the next event is a (harmless) release, `hold_cycles` later.
+    """
+
+    def __init__(self, hold_cycles):
+        self.hold_cycles = hold_cycles
+        self.cycle = 0
+        self.chars = queue.Queue()
+        self.pending = []
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        while True:
+            c = sys.stdin.read(1)
+            if c == "":
+                break
+            self.chars.put(c)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.cycle += self.hold_cycles
+        if not self.pending:
+            try:
+                c = self.chars.get_nowait()
+                self.pending = [128 if c == "\n" else ord(c), 0]
+            except queue.Empty:
+                return (self.cycle, 0)
+        return (self.cycle, self.pending.pop(0))
+
+
+DEBUG_HELP = """Commands (addresses may be hex, e.g. 0x4000; a breakpoint can also be Class.function):
+  s [n]          step forward 1 (or n) cycles
+  b [n]          step backward 1 (or n) cycles
+  c              continue to the next breakpoint
+  rc             reverse-continue to the previous breakpoint
+  goto <cycle>   go to any cycle, earlier or later
+  break <addr>   set a breakpoint; with no address, list them
+  delete <addr>  remove a breakpoint
+  p <addr>       print a word of memory (0x4000 and up is the screen)
+  w <addr>       when did a word of memory last change?
+  key <code>     press a key (0 to release), as of the current cycle
+  q              quit"""
+
+DEBUG_MAX_CYCLES = 100_000_000  # How far "c" goes looking for a breakpoint
+
+
+def debug(program, chip, simulator="codegen", src_map=None):
+    """Read commands from stdin to run the program forward and backward, a la gdb (see DEBUG_HELP.)
+
+    The machine is wrapped in a TimeMachine, so going backward is just as quick as going forward.
+    """
+
+    computer = nand.syntax.run(chip, simulator=simulator)
+    computer.init_rom(program)
+    tm = TimeMachine(computer)
+
+    breakpoints = set()
+
+    def address(arg):
+        if "." in arg and src_map:
+            fn = src_map.find_function(*arg.split(".", 1))
+            if fn is None:
+                raise ValueError(f"No such function: {arg}")
+            return fn.start
+        return int(arg, 0)
+
+    def show():
+        # The op containing the current instruction, if there's a source map:
+        found = src_map.op_containing(computer.pc) if src_map else None
+        op = f"; {found[1]}" if found is not None else ""
+        print(f"{tm.cycle:,d}: @{computer.pc}{op}")
+
+    print(DEBUG_HELP)
+    show()
+    for line in sys.stdin:
+        cmd, *args = line.split() or [""]
+        try:
+            if cmd == "s":
+                tm.run(int(args[0]) if args else 1)
+            elif cmd == "b":
+                tm.step_back(int(args[0]) if args else 1)
+            elif cmd == "c":
+                if not tm.run_until(breakpoints, DEBUG_MAX_CYCLES):
+                    print("No breakpoint reached")
+            elif cmd == "rc":
+                if not tm.reverse_continue(breakpoints):
+                    print("No earlier breakpoint")
+            elif cmd == "goto":
+                tm.goto(int(args[0]))
+            elif cmd == "break" and args:
+                breakpoints.add(address(args[0]))
+            elif cmd == "break":
+                print(f"Breakpoints: {sorted(breakpoints)}")
+            elif cmd == "delete":
+                breakpoints.discard(address(args[0]))
+            elif cmd == "p":
+                addr = address(args[0])
+                print(computer.peek(addr) if addr < 0x4000 else computer.peek_screen(addr - 0x4000))
+            elif cmd == "w":
+                cycle = tm.last_change(address(args[0]))
+                print(f"Last changed at cycle {cycle:,d}" if cycle is not None else "Never changed")
+            elif cmd == "key":
+                tm.set_keydown(int(args[0]))
+            elif cmd == "q":
+                break
+            elif cmd != "":
+                print(DEBUG_HELP)
+        except (ValueError, IndexError) as x:
+            print(f"Error: {x}")
+        show()
+
+
+def write_screen_image(path, words, width=512, height=256):
+    """Save the contents of the screen buffer to an image file: PBM (a simple, uncompressed format
+    that most tools can read) if the path ends with ".pbm", otherwise PNG (black and white,
+    1 bit per pixel.)
+
+    No libraries are needed, so this works when pygame isn't available.
+    """
+
+    # Each word holds 16 pixels, with the leftmost in the low bit. These formats want 8 pixels
+    # per byte, with the leftmost in the high bit.
+    rows = []
+    row_words = width//16
+    for y in range(height):
+        row = bytearray()
+        for w in words[y*row_words:(y+1)*row_words]:
+            row.append(_REVERSED_BITS[w & 0xFF])
+            row.append(_REVERSED_BITS[(w >> 8) & 0xFF])
+        rows.append(bytes(row))
+
+    with open(path, "wb") as f:
+        if path.endswith(".pbm"):
+            # In PBM, 1 is black:
+            f.write(f"P4\n{width} {height}\n".encode())
+            for row in rows:
+                f.write(row)
+        else:
+            # In a grayscale PNG, 1 is white:
+            def chunk(kind, data):
+                return (struct.pack(">I", len(data)) + kind + data
+                        + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+            raw = b"".join(b"\x00" + bytes(b ^ 0xFF for b in row) for row in rows)
+            f.write(b"\x89PNG\r\n\x1a\n")
+            f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0)))
+            f.write(chunk(b"IDAT", zlib.compress(raw)))
+            f.write(chunk(b"IEND", b""))
+
+_REVERSED_BITS = [int(f"{b:08b}"[::-1], 2) for b in range(256)]
+
+
+class CallSite:
+    """A call to be traced: the class and function being called."""
+
+    def __init__(self, class_name, function_name):
+        self.class_name = class_name
+        self.function_name = function_name
+
+
+def trace_call_sites(src_map):
+    """Find the calls worth tracing, once, up front, as a dict from the address where each call
+    happens (according to the source map; see AssemblySource) to a CallSite.
+
+    Calls to the OS classes that do the low-level work are left out, because there are so many of
+    them, except for their init functions and Sys.halt.
+    """
+
+    call_sites = {}
+    for addr, op in src_map.items():
+        m = re.match(r'call (.*)\.(.*) (\d)', op)
+        if m:
+            class_name = m.group(1)
+            sub_name = m.group(2)
+            tracable = False
+            if class_name == 'Main': tracable = True
+            elif sub_name == 'init': tracable = True
+            elif class_name == "Sys" and sub_name == "halt": tracable = True
+            elif class_name not in ("Keyboard", "Math", "Memory", "Array", "String", "Screen"): tracable = True
+            if tracable:
+                call_sites[addr] = CallSite(class_name, sub_name)
+    return call_sites
+
+
+STATE_MAGIC = b"NANDSTATE1\n"
+
+
+def write_state(path, computer, program, chip_name, simulator, cycles):
+    """Save the complete state of the computer (see save_state()), along with enough to identify
+    the program, chip, and simulator it belongs to, and the number of cycles it took to get there.
+
+    The format is a JSON header, holding the registers and other small values, followed by the
+    contents of the RAMs as 16-bit words, compressed. Pong's state takes about 2KB.
+    """
+
+    state = computer.save_state()
+    values = {k: v for k, v in state.items() if not isinstance(v, list)}
+    lists = [(k, len(v)) for k, v in state.items() if isinstance(v, list)]
+    header = {
+        "rom": _rom_hash(program),
+        "chip": chip_name,
+        "simulator": simulator,
+        "shape": _state_shape(state),
+        "cycles": cycles,
+        "values": values,
+        "lists": lists,
+    }
+    words = b"".join(struct.pack(f"<{n}H", *(w & 0xFFFF for w in state[k])) for k, n in lists)
+
+    header_bytes = json.dumps(header).encode()
+    with open(path, "wb") as f:
+        f.write(STATE_MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(zlib.compress(words))
+
+
+def read_state(path, computer, program, chip_name, simulator):
+    """Load a state saved by write_state() into the computer, after checking that it was saved by
+    the same program running on the same chip and simulator.
+
+    Returns the number of cycles that had been run when the state was saved.
+    """
+
+    with open(path, "rb") as f:
+        if f.read(len(STATE_MAGIC)) != STATE_MAGIC:
+            raise Exception(f"Not a saved state: {path}")
+        size, = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(size))
+        words = zlib.decompress(f.read())
+
+    if header["rom"] != _rom_hash(program):
+        raise Exception(f"Saved state is for a different program (ROM hash {header['rom']}): {path}")
+    current_shape = _state_shape(computer.save_state())
+    if header["chip"] != chip_name or header["simulator"] != simulator or header["shape"] != current_shape:
+        raise Exception(f"Saved state is for a different chip or simulator ({header['chip']}, {header['simulator']}): {path}")
+
+    state = dict(header["values"])
+    offset = 0
+    for k, n in header["lists"]:
+        state[k] = [extend_sign(w) for w in struct.unpack_from(f"<{n}H", words, offset)]
+        offset += 2*n
+    computer.load_state(state)
+    return header["cycles"]
+
+
+def _rom_hash(program):
+    return hashlib.sha256(struct.pack(f"<{len(program)}H", *(w & 0xFFFF for w in program))).hexdigest()
+
+
+def _state_shape(state):
+    """Enough about a state to tell if it came from a different chip or simulator: the names of
+    the registers, the sizes of the RAMs, and so on.
+    """
+    return {k: len(v) if isinstance(v, list) else sorted(v) if isinstance(v, dict) else type(v).__name__
+            for k, v in state.items()}
+
+
+class Checkpoint:
+    """Options for saving and loading the state of the machine (see --save-state and --load-state.)
+
+    Usage: call start() with the newly-constructed computer, which loads the state if there's one to
+    load, and then save() whenever it's time; `save_at` is the cycle when that should happen, if
+    one was given.
+    """
 
-            was_in_sys_wait = in_sys_wait
+    def __init__(self, save_path=None, save_at=None, load_path=None):
+        self.save_path = save_path
+        self.save_at = save_at
+        self.load_path = load_path
+        self.saved_at = None
+
+    def start(self, computer, program, chip, simulator):
+        """Returns the cycle count to start from: the one that was saved, or 0."""
+
+        self.computer = computer
+        self.program = program
+        self.chip_name = chip.constr().label
+        self.simulator = simulator
+
+        if self.load_path is None:
+            return 0
+        cycles = read_state(self.load_path, computer, program, self.chip_name, simulator)
+        print(f"Loaded state at {cycles:,d} cycles from {self.load_path}", file=sys.stderr)
+        return cycles
+
+    def save(self, cycles):
+        if self.save_path is None:
+            print("No file to save the state to; see --save-state", file=sys.stderr)
+            return
+        write_state(self.save_path, self.computer, self.program, self.chip_name, self.simulator, cycles)
+        self.saved_at = cycles
+        print(f"Saved state at {cycles:,d} cycles to {self.save_path}", file=sys.stderr)
+
+    def until_save(self, cycles, batch):
+        """Shorten a batch, if necessary, so it ends at the cycle where the state is to be saved."""
+        if self.save_path is not None and self.save_at is not None and cycles < self.save_at:
+            return min(batch, self.save_at - cycles)
+        return batch
+
+    def due(self, cycles):
+        """True when `save_at` has been reached (and the state hasn't been saved yet.)"""
+        return self.save_path is not None and self.save_at == cycles and self.saved_at != cycles
 
 
 def in_function_pred(function_addresses):
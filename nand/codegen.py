@@ -313,7 +313,7 @@ def generate_python(ic, inline=True, prefix_super=False, cython=False):
             # Note: the source of address better not be a big computation. At the moment it's always
             # register A (so, saved in self). But is that true for chips that add more ways to access
             # the RAM?
-            address = src_many(comp, 'address', 14)
+            address = src_many(comp, 'address', 15)
             return f"self._ram[{address}] if 0 <= {address} < 0x4000 else (self._screen[{address} & 0x1fff] if 0x4000 <= {address} < 0x6000 else (self._keyboard if {address} == 0x6000 else 0))"
         elif isinstance(comp, RAM):
             address = src_many(comp, 'address', comp.address_bits)
@@ -332,6 +332,9 @@ def generate_python(ic, inline=True, prefix_super=False, cython=False):
         l(0, "")
 
     l(0, f"class {class_name}({supr}):")
+    registers = [output_name(comp) for comp in all_comps if isinstance(comp, DFF) or (isinstance(comp, IC) and comp.label == "Register")]
+    l(1,   f"_register_names = {tuple(registers)!r}")
+    l(0, "")
     l(1,   f"def __init__(self):")
     l(2,     f"{supr}.__init__({','.join(['self'] + supr_args)})")
     for name in ic.inputs():
@@ -356,6 +359,7 @@ def generate_python(ic, inline=True, prefix_super=False, cython=False):
                     l(2, f"{comp_name}: cython.{cython_type}")
         l(2, "")
 
+    loop_start = len(lines)
     l(2,   f"for _ in range(cycles):")
     for comp in all_comps:
         if comp.label in ("DFF", "Register"):
@@ -453,7 +457,7 @@ def generate_python(ic, inline=True, prefix_super=False, cython=False):
         elif comp.label == "MemorySystem":
             # Note: the source of address better not be a big computation. At the moment it's always
             # register A (so, saved in self)
-            address_expr = src_many(comp, 'address', 14)
+            address_expr = src_many(comp, 'address', 15)
             in_name = f"_{all_comps.index(comp)}_in"
             l(4, f"if {src_one(comp, 'load')}:")
             l(5,   f"{in_name} = {src_many(comp, 'in_')}")
@@ -461,14 +465,16 @@ def generate_python(ic, inline=True, prefix_super=False, cython=False):
             l(6,     f"self._ram[{address_expr}] = {in_name}")
             l(5,   f"elif 0x4000 <= {address_expr} < 0x6000:")
             l(6,     f"self._screen[{address_expr} & 0x1fff] = {in_name}")
+            l(6,     f"self._screen_dirty.add({address_expr} & 0x1fff)")
             l(5,   f"elif {address_expr} == 0x6000:")
             l(6,     f"self._tty = {in_name}")
             l(6,     f"self._tty_ready = {in_name} != 0")
+            l(6,     f"if self._tty_log is not None: self._tty_log.append({in_name})")
             any_state = True
         elif isinstance(comp, (Const, ROM, Input)):
             pass
         elif isinstance(comp, RAM):
-            address_expr = src_many(comp, 'address', 14)
+            address_expr = src_many(comp, 'address', comp.address_bits)
             in_name = f"_{all_comps.index(comp)}_in"
             l(4, f"if {src_one(comp, 'load')}:")
             l(5,   f"{in_name} = {src_many(comp, 'in_')}")
@@ -480,6 +486,7 @@ def generate_python(ic, inline=True, prefix_super=False, cython=False):
             l(5,   f"{in_name} = {src_many(comp, 'in_')}")
             l(5,   f"self._tty = {in_name}")
             l(5,   f"self._tty_ready = {in_name} != 0")
+            l(5,   f"if self._tty_log is not None: self._tty_log.append({in_name})")
             any_state = True
         elif comp.label in PRIMITIVES:
             # All combinational components: nothing to do here
@@ -489,6 +496,32 @@ def generate_python(ic, inline=True, prefix_super=False, cython=False):
             raise Exception(f"Unrecognized primitive: {comp}")
     if not any_state:
         l(4,   "pass")
+    loop_lines = lines[loop_start+1:]
+    l(0, "")
+
+    # When the PC is just a register, the same loop can check it after each cycle, to stop
+    # at any of a set of addresses (see SOC.ticktock_until()):
+    pc_src = src_many(root, "pc") if "pc" in ic.outputs() else None
+    if pc_src in registers:
+        l(1, f"def _eval_until(self, cycles, stop):")
+        l(2,   f"update_state = True")
+        l(2,   f"for _n in range(cycles):")
+        lines.extend(loop_lines)
+        l(3,     f"if self.{pc_src} in stop:")
+        l(4,       f"return _n + 1")
+        l(2,   f"return cycles")
+        l(0, "")
+
+    # Similarly, to stop as soon as a single word of memory changes (see
+    # SOC.ticktock_until_changed()):
+    l(1, f"def _eval_until_changed(self, cycles, buffer, index):")
+    l(2,   f"update_state = True")
+    l(2,   f"prev = buffer[index]")
+    l(2,   f"for _n in range(cycles):")
+    lines.extend(loop_lines)
+    l(3,     f"if buffer[index] != prev:")
+    l(4,       f"return _n + 1")
+    l(2,   f"return cycles")
     l(0, "")
 
     for name in ic.inputs():
@@ -497,11 +530,16 @@ def generate_python(ic, inline=True, prefix_super=False, cython=False):
         l(2,   f"self.__dirty = True")
         l(1, f"{name} = property(fset=_set_{name})")
         l(0, "")
-    for name in ic.outputs():
+    for name, bits in ic.outputs().items():
         l(1, f"@property")
         l(1, f"def {name}(self):")
-        l(2,   f"self._eval(False)")
-        l(2,   f"return self._{name}")
+        src = src_one(root, name) if bits == 1 else src_many(root, name, bits)
+        if src in registers:
+            # Straight from a register (e.g. pc), so no need to evaluate anything:
+            l(2,   f"return {'bool' if bits == 1 else ''}(self.{src})")
+        else:
+            l(2,   f"self._eval(False)")
+            l(2,   f"return self._{name}")
         l(0, "")
 
     return class_name, lines
@@ -546,8 +584,11 @@ class SOC(Chip):
         self._ram = [0]*(1 << ram_address_bits)
         if screen_address_bits is not None:
             self._screen = [0]*(1 << screen_address_bits)
+            # Every word is initially dirty, so the first update draws everything:
+            self._screen_dirty = set(range(1 << screen_address_bits))
         self._keyboard = 0
         self._tty = 0
+        self._tty_log = None
 
         self.__dirty = True
 
@@ -573,6 +614,37 @@ class SOC(Chip):
         # TODO: surprisingly, this is not faster (no apparent effect):
         # self._rom = array.array('H', contents)
 
+    def ticktock_until(self, cycles, stop):
+        """Run up to `cycles` cycles, stopping early as soon as the PC is one of the addresses in
+        `stop` (a set), after at least one cycle. Returns the number of cycles actually run.
+
+        The check happens inside the generated loop, so it costs very little per cycle.
+        """
+        if hasattr(self, "_eval_until"):
+            return self._eval_until(cycles, stop)
+
+        for n in range(1, cycles + 1):
+            self.ticktock()
+            if self.pc in stop:
+                return n
+        return cycles
+
+    def ticktock_until_changed(self, cycles, address):
+        """Run up to `cycles` cycles, stopping early as soon as the word at `address` (in RAM, or
+        the screen, at 0x4000 and up) has a different value than it had at the start. Returns the
+        number of cycles actually run.
+        """
+        buffer, index = (self._ram, address) if address < 0x4000 else (self._screen, address - 0x4000)
+        if hasattr(self, "_eval_until_changed"):
+            return self._eval_until_changed(cycles, buffer, index)
+
+        prev = buffer[index]
+        for n in range(1, cycles + 1):
+            self.ticktock()
+            if buffer[index] != prev:
+                return n
+        return cycles
+
     def reset_program(self):
         """Reset the PC to 0, so that the program will continue execution as if from startup.
 
@@ -606,10 +678,55 @@ class SOC(Chip):
     def poke_screen(self, address, value):
         """Write a value to the display RAM. Address must be between 0x000 and 0x1FFF."""
         self._screen[address] = extend_sign(value)
+        self._screen_dirty.add(address)
+
+    def screen_buffer(self):
+        """The entire contents of the display RAM, as a list of words.
+
+        Note: this is the actual storage, not a copy, so it reflects any later writes.
+        """
+        return self._screen
+
+    def take_screen_dirty(self):
+        """Return the set of addresses in the display RAM that have been written since the
+        last call, and start tracking again from scratch.
+
+        On the first call, every address is included, since nothing has been drawn yet.
+        """
+        dirty = self._screen_dirty
+        self._screen_dirty = set()
+        return dirty
 
     def peek_rom(self, address):
         return self._rom[address]
 
+    def save_state(self):
+        """Capture the complete state of the computer (registers, RAM, screen, and the TTY port),
+        as a dict of plain values that can be compared, or handed back to load_state() later.
+
+        The ROM and the keyboard (which is an input) are not included.
+        """
+        state = {
+            "registers": {name: getattr(self, name) for name in self._register_names},
+            "ram": list(self._ram),
+            "tty": (self._tty, getattr(self, "_tty_ready", None)),
+        }
+        if hasattr(self, "_screen"):
+            state["screen"] = list(self._screen)
+        return state
+
+    def load_state(self, state):
+        """Restore the state captured by save_state(). If the screen is different, it's all marked dirty."""
+        for name, value in state["registers"].items():
+            setattr(self, name, value)
+        self._ram[:] = state["ram"]
+        self._tty, tty_ready = state["tty"]
+        if tty_ready is not None:
+            self._tty_ready = tty_ready
+        if "screen" in state and state["screen"] != self._screen:
+            self._screen[:] = state["screen"]
+            self._screen_dirty = set(range(len(self._screen)))
+
     def set_keydown(self, keycode):
         """Provide the code which identifies a single key which is currently pressed."""
         self._keyboard = keycode
@@ -620,6 +737,16 @@ class SOC(Chip):
         self._tty = 0
         return val
 
+    def take_tty_log(self):
+        """Read every word that has been written to the tty port since the last call.
+
+        get_tty() sees only the most recent value, so when running many cycles at a time, any
+        earlier values are lost. The first call starts the log, so it always returns [].
+        """
+        log = self._tty_log or []
+        self._tty_log = []
+        return log
+
     # Tricky: SP might get special treatment in some implementations, so provide a named property
     # That subclasses can override.
     @property
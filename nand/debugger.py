@@ -0,0 +1,239 @@
+"""Time-travel debugging: run a program forward, and then go back to any earlier cycle.
+
+The state of the computer is saved every so often (see save_state()), so getting back to a
+particular cycle means restoring the nearest earlier snapshot and running forward from there, at
+full speed. To keep the snapshots small, most of them only record the chunks of memory that changed
+since the one before; every so often a complete copy is kept, so that any snapshot can be rebuilt
+quickly.
+
+The only input is the keyboard, and every change to it is recorded, stamped with the cycle when it
+happened, so that replaying from a snapshot is exact. Setting a key when the machine has been taken
+back in time changes the future, so anything recorded beyond that point is forgotten.
+
+Works with either simulator; the codegen simulator is much faster, of course.
+"""
+
+import bisect
+
+CHUNK = 256
+"""Memory is compared, and changes recorded, in chunks of this many words."""
+
+
+class TimeMachine:
+    """Wraps a computer, which should have been freshly initialized (i.e. at cycle 0), keeping track
+    of the current `cycle`, and allowing it to be moved backward as well as forward.
+
+    A snapshot is taken every `interval` cycles, and every `keyframe_every`-th snapshot is a complete
+    copy of the state. The interval determines how long it takes to go back: up to `interval`
+    cycles have to be simulated, plus, for reverse_continue(), the same again for each interval
+    that's searched (all of them, when looking for a breakpoint that was never hit.) last_change()
+    runs everything since the keyframe before the latest change (all of it, for a word that never
+    changed.)
+    """
+
+    def __init__(self, computer, interval=10_000, keyframe_every=64):
+        self.computer = computer
+        self.interval = interval
+        self.keyframe_every = keyframe_every
+
+        self.cycle = 0
+
+        self._snapshots = []
+        self._last_state = None  # The complete state of the last snapshot, if it's handy
+        self._keys = []  # (cycle, keycode), in order
+
+        self._snapshot()
+
+    def set_keydown(self, keycode):
+        """Press a key (or release, with 0), as of the current cycle."""
+
+        # Whatever was recorded from here on is no longer going to happen:
+        i = bisect.bisect_left(self._keys, (self.cycle,))
+        del self._keys[i:]
+        del self._snapshots[self.cycle//self.interval + 1:]
+        self._last_state = None
+
+        self._keys.append((self.cycle, keycode))
+        self.computer.set_keydown(keycode)
+
+    def run(self, cycles):
+        """Run forward exactly `cycles` cycles."""
+        self._advance(self.cycle + cycles)
+
+    def run_until(self, stop, max_cycles):
+        """Run forward until the PC is at one of the addresses in `stop` (a set), or for
+        `max_cycles`, whichever comes first. Returns True if an address was reached.
+        """
+        return self._advance(self.cycle + max_cycles, stop)
+
+    def goto(self, cycle):
+        """Move to any cycle, earlier or later."""
+
+        if cycle < 0:
+            raise ValueError(f"No such cycle: {cycle}")
+
+        # Start from the nearest snapshot, unless it's quicker to keep going from here:
+        index = min(cycle//self.interval, len(self._snapshots) - 1)
+        if cycle < self.cycle or self._snapshots[index].cycle > self.cycle:
+            self._restore(index)
+        self._advance(cycle)
+
+    def step_back(self, cycles=1):
+        """Go back `cycles` cycles (but not before the start.)"""
+        self.goto(max(0, self.cycle - cycles))
+
+    def reverse_continue(self, stop):
+        """Go back to the latest earlier cycle when the PC was at one of the addresses in `stop`
+        (a set). Returns True if there was one; otherwise, nothing changes.
+        """
+
+        original = self.cycle
+        for index in reversed(range(min((original - 1)//self.interval + 1, len(self._snapshots)))):
+            end = min((index + 1)*self.interval, original)
+            self._restore(index)
+            hits = [self.cycle] if self.computer.pc in stop else []
+            while self.cycle < end - 1:
+                if self._advance(end - 1, stop):
+                    hits.append(self.cycle)
+            if hits:
+                self.goto(hits[-1])
+                return True
+
+        self.goto(original)
+        return False
+
+    def last_change(self, address):
+        """The latest cycle (up to the current one) at which the word at `address` (in RAM, or the
+        screen, at 0x4000 and up) took on a new value, or None if it hasn't changed since the start.
+
+        The snapshots can't be used to skip ahead, because a change that was undone before the
+        next snapshot doesn't show up in them. Instead, the simulator runs until the word changes
+        (see ticktock_until_changed()), starting from each keyframe in turn, working back from the
+        current cycle until a change is found.
+        """
+
+        original = self.cycle
+
+        found = None
+        last = min(original//self.interval, len(self._snapshots) - 1)
+        for index in reversed(range(0, last + 1, self.keyframe_every)):
+            end = min((index + self.keyframe_every)*self.interval, original)
+            found = self._search_changes(self._snapshots[index].cycle, end, address)
+            if found is not None:
+                break
+
+        self.goto(original)
+        return found
+
+    def _advance(self, target, stop=None, watch=None):
+        """Run forward to `target`, taking snapshots and pressing keys along the way. If `stop` is
+        provided, stop early (after at least one cycle) when the PC reaches one of those addresses,
+        and return True. Similarly, if `watch` is provided, stop when the word at that address
+        changes.
+        """
+
+        computer = self.computer
+        while self.cycle < target:
+            end = min(target, (self.cycle//self.interval + 1)*self.interval)
+            i = bisect.bisect_right(self._keys, (self.cycle, float("inf")))
+            if i < len(self._keys):
+                end = min(end, self._keys[i][0])
+
+            if stop is not None:
+                n = computer.ticktock_until(end - self.cycle, stop)
+            elif watch is not None:
+                prev = self._peek(watch)
+                n = computer.ticktock_until_changed(end - self.cycle, watch)
+            else:
+                n = end - self.cycle
+                computer.ticktock(n)
+            self.cycle += n
+
+            while i < len(self._keys) and self._keys[i][0] == self.cycle:
+                computer.set_keydown(self._keys[i][1])
+                i += 1
+            if self.cycle == len(self._snapshots)*self.interval:
+                self._snapshot()
+
+            if stop is not None and computer.pc in stop:
+                return True
+            if watch is not None and self._peek(watch) != prev:
+                return True
+        return False
+
+    def _snapshot(self):
+        state = self.computer.save_state()
+        if len(self._snapshots) % self.keyframe_every == 0:
+            snapshot = _Snapshot(self.cycle, state, None)
+        else:
+            if self._last_state is None:
+                self._last_state = self._rebuild(len(self._snapshots) - 1)
+            snapshot = _Snapshot(self.cycle, None, _changes(self._last_state, state))
+        self._snapshots.append(snapshot)
+        self._last_state = state
+
+    def _rebuild(self, index):
+        """The complete state as of a snapshot, starting from the nearest keyframe and applying
+        the changes from each snapshot after it.
+        """
+
+        first = index - index % self.keyframe_every
+        state = {k: list(v) if isinstance(v, list) else v for k, v in self._snapshots[first].state.items()}
+        for snapshot in self._snapshots[first + 1:index + 1]:
+            for k, v in snapshot.changes.items():
+                if isinstance(v, list):
+                    for base, words in v:
+                        state[k][base:base + len(words)] = words
+                else:
+                    state[k] = v
+        return state
+
+    def _restore(self, index):
+        snapshot = self._snapshots[index]
+        self.computer.load_state(self._rebuild(index))
+        self.cycle = snapshot.cycle
+
+        i = bisect.bisect_right(self._keys, (self.cycle, float("inf")))
+        self.computer.set_keydown(self._keys[i - 1][1] if i > 0 else 0)
+
+    def _search_changes(self, start, end, address):
+        """Run from `start` to `end`, returning the last cycle when the word changed, if any."""
+
+        self.goto(start)
+        found = None
+        while self.cycle < end:
+            if self._advance(end, watch=address):
+                found = self.cycle
+        return found
+
+    def _peek(self, address):
+        if address < 0x4000:
+            return self.computer.peek(address)
+        else:
+            return self.computer.peek_screen(address - 0x4000)
+
+
+class _Snapshot:
+    """The state as of some cycle: either the complete state, or the changes since the previous
+    snapshot (for lists, as (base, words) for each chunk that changed.)
+    """
+
+    def __init__(self, cycle, state, changes):
+        self.cycle = cycle
+        self.state = state
+        self.changes = changes
+
+
+def _changes(s0, s1):
+    changes = {}
+    for k, v1 in s1.items():
+        v0 = s0[k]
+        if isinstance(v1, list):
+            chunks = [(base, v1[base:base + CHUNK])
+                      for base in range(0, len(v1), CHUNK)
+                      if v0[base:base + CHUNK] != v1[base:base + CHUNK]]
+            if chunks:
+                changes[k] = chunks
+        elif v0 != v1:
+            changes[k] = v1
+    return changes
@@ -0,0 +1,298 @@
+"""Skip over cycles that the program spends spinning in idle loops, without simulating each one.
+
+Works with either simulator, via save_state() and load_state(). The state of the computer after
+`FastForward.ticktock(n)` is the same as after `ticktock(n)`, so the cycle count seen by the
+program (and the timing of any input) is unaffected; only the host's time is saved.
+
+Two kinds of loop are recognized:
+
+- An exact repeat: after some number of cycles, the PC is back where it started and every
+register and word of memory holds the same value as before (possibly having been overwritten with
+the same value.) Until some input changes, the loop will never end, so all the remaining cycles
+can be skipped. This is Sys.halt, or a loop polling the keyboard while no key is pressed.
+
+- A counting loop, within a registered "wait region" (e.g. Sys.wait): each iteration takes the
+same number of cycles and adds the same amount to each of a few words (the loop counters, and
+whatever temporaries were computed from them.) The counters are advanced to where they would be
+after many iterations, stopping short of where any of them would cross zero or overflow. That's
+only safe if the loop's exit condition is a comparison of a counter with zero, which is how
+Sys.wait is written, so it's only attempted in a region the caller vouches for.
+
+With the vector simulator, the registers aren't words (they're buried in the traces), so only
+exact repeats are recognized.
+"""
+
+CHUNK = 256
+"""Lists are compared in chunks of this many words, to find changes quickly."""
+
+
+class FastForward:
+    """Wraps a computer, providing a ticktock() that skips idle loops.
+
+    `in_wait_region` is a predicate on the PC, identifying code where counting loops can be
+    extrapolated (see in_function_pred() in computer.py.) Loops there can be longer (up to
+    `max_wait_period` cycles per iteration, vs. `max_period`), and after an inner loop is skipped,
+    the loop that encloses it is tried right away; for Sys.wait, that's the one that counts down
+    the milliseconds, and skipping it saves nearly all of the cycles.
+
+    To find a loop, the computer is stepped one cycle at a time until it jumps backward, which is
+    probably to the top of a loop, and then until it gets back there. That costs about two
+    iterations, one of them simulated a cycle at a time. Once found, a loop is followed from one
+    call to the next: each time, one iteration is simulated normally and checked against the
+    prediction before skipping any more. Input can change between calls, so a loop found by an
+    earlier call isn't trusted until a whole iteration has been simulated in this one.
+
+    When there's no loop to be found, the probe is wasted, so after each miss the next probe is put
+    off for a while, starting with `min_interval` cycles and doubling after each miss (up to
+    `max_interval`.) Meanwhile, the PC is checked every `min_interval` cycles, and as soon as it's
+    in the wait region, the next probe happens right away (unless the last probe was a miss
+    there, too.)
+    """
+
+    def __init__(self, computer, in_wait_region=(lambda _: False), max_period=500, max_wait_period=10_000, min_interval=1000, max_interval=256_000):
+        self.computer = computer
+        self.in_wait_region = in_wait_region
+        self.max_period = max_period
+        self.max_wait_period = max_wait_period
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+        self.skipped = 0
+        """Total cycles skipped (not simulated.)"""
+
+        self._loop = None
+        self._interval = min_interval
+        self._countdown = 0
+        self._eager = True
+
+    def ticktock(self, cycles=1):
+        """Advance the computer by exactly `cycles` cycles, skipping as many as possible.
+
+        Returns the number of cycles that were skipped.
+        """
+
+        # Any input may have changed since the last call, so the loop has to be checked again:
+        if self._loop is not None:
+            self._loop.checked = False
+
+        skipped = 0
+        while cycles > 0:
+            if self._loop is not None:
+                s, used = self._follow(cycles)
+            elif self._countdown > 0:
+                s = 0
+                used = min(cycles, self._countdown, self.min_interval)
+                self.computer.ticktock(used)
+                self._countdown -= used
+                if self._eager and self.in_wait_region(self.computer.pc):
+                    self._countdown = 0
+            else:
+                in_wait_region = self.in_wait_region(self.computer.pc)
+                s, used = self._probe(cycles)
+                self._eager = self._loop is not None or not in_wait_region
+                if self._loop is not None:
+                    self._interval = self.min_interval
+                else:
+                    self._countdown = self._interval
+                    self._interval = min(2*self._interval, self.max_interval)
+            skipped += s
+            cycles -= used
+
+        self.skipped += skipped
+        return skipped
+
+    def _probe(self, budget):
+        """Look for a loop starting at the current PC. If one is found, it becomes the loop to
+        follow, with the computer at the top of it.
+
+        Returns the number of cycles skipped (always 0) and the number simulated.
+        """
+
+        computer = self.computer
+
+        # The top of a loop is (usually) the target of a backward jump, so start there:
+        used = 0
+        prev = computer.pc
+        while used < min(self.max_period, budget):
+            computer.ticktock()
+            used += 1
+            start = computer.pc
+            if start < prev:
+                break
+            prev = start
+        else:
+            return 0, used
+        in_wait_region = self.in_wait_region(start)
+        s0 = computer.save_state()
+
+        # Look for the PC to return to where it started, noting the range of addresses visited.
+        # Outside the wait region, only an exact repeat is any use, and the start may be visited
+        # more than once per iteration (e.g. a routine shared by every call), so keep going
+        # until the state matches:
+        lo = hi = start
+        period = 0
+        while period < min(self.max_wait_period if in_wait_region else self.max_period, budget - used):
+            computer.ticktock()
+            period += 1
+            pc = computer.pc
+            if pc == start:
+                s1 = computer.save_state()
+                if s1 == s0:
+                    # Nothing changed, and nothing will (until some input does):
+                    self._loop = _Loop(start, period, lo, hi, [], s1)
+                    return 0, used + period
+                elif in_wait_region:
+                    break
+            lo, hi = min(lo, pc), max(hi, pc)
+        else:
+            return 0, used + period
+        used += period
+
+        if not in_wait_region or budget - used < period:
+            return 0, used
+
+        computer.ticktock(period)
+        used += period
+        if computer.pc != start:
+            return 0, used
+        s2 = computer.save_state()
+
+        deltas = _deltas(s0, s1, s2)
+        if deltas is not None:
+            self._loop = _Loop(start, period, lo, hi, deltas, s2)
+        return 0, used
+
+    def _follow(self, budget):
+        """Simulate up to the top of the current loop, and if the state is as predicted, skip as
+        many iterations as possible.
+
+        Returns the number of cycles skipped, and the total number used (skipped, plus simulated.)
+        """
+
+        computer = self.computer
+        loop = self._loop
+
+        # A whole iteration, simulated since any input last changed, proves that the loop doesn't
+        # depend on it. A partial one doesn't, because the input might have been read already.
+        whole = loop.to_top == loop.period
+
+        used = min(budget, loop.to_top)
+        if used > 0:
+            computer.ticktock(used)
+            loop.to_top -= used
+            if loop.to_top > 0:
+                return 0, used
+
+        state = computer.save_state()
+        if computer.pc != loop.start or state != loop.expected:
+            self._loop = None
+            return 0, used
+        loop.checked = loop.checked or whole
+
+        # Stop one iteration short of the limit, so the last iteration is always simulated:
+        limit = min((_iterations(state[key][index], delta) for key, index, delta in loop.deltas), default=None)
+        iterations = (budget - used)//loop.period if loop.checked else 0
+        if limit is not None:
+            iterations = min(iterations, limit - 1)
+
+        skipped = 0
+        if iterations > 0:
+            for key, index, delta in loop.deltas:
+                state[key][index] += iterations*delta
+            computer.load_state(state)
+            skipped = iterations*loop.period
+            used += skipped
+
+        if limit is not None and iterations >= limit - 1:
+            # This loop is about to end. If it's a short one, finish it, so the next probe
+            # starts in whatever loop encloses it. Otherwise, just let it run out before
+            # probing again.
+            self._loop = None
+            if loop.period <= self.max_period:
+                while used < budget and loop.lo <= computer.pc <= loop.hi:
+                    computer.ticktock()
+                    used += 1
+            else:
+                self._countdown = 2*loop.period
+                self._eager = False
+        else:
+            for key, index, delta in loop.deltas:
+                state[key][index] += delta
+            loop.expected = state
+            loop.to_top = loop.period
+
+        return skipped, used
+
+
+class _Loop:
+    """A loop that has been recognized: where it starts, how many cycles each iteration takes, the
+    range of addresses it covers, how each iteration changes the state, and the state expected
+    the next time the PC is at the top, which is `to_top` cycles from now. `checked` means a
+    whole iteration has been simulated during the current call.
+    """
+
+    def __init__(self, start, period, lo, hi, deltas, expected):
+        self.start = start
+        self.period = period
+        self.lo = lo
+        self.hi = hi
+        self.deltas = deltas
+        self.expected = expected
+        self.to_top = 0
+        self.checked = True
+
+
+def _deltas(s0, s1, s2):
+    """If the differences between the states are consistent, a list of (key, index, delta) for
+    each word that changes, where `key` identifies a list (of memory) or dict (of registers) in
+    the state, and `index` the word within it. Otherwise, None.
+
+    Any other value which differs (e.g. the vector simulator's traces) means no extrapolation
+    is possible.
+    """
+
+    deltas = []
+
+    def check(key, index):
+        w0, w1, w2 = s0[key][index], s1[key][index], s2[key][index]
+        if not isinstance(w2, int) or w1 - w0 != w2 - w1:
+            return False
+        if w2 != w1:
+            deltas.append((key, index, w2 - w1))
+        return True
+
+    for key, v2 in s2.items():
+        v0, v1 = s0[key], s1[key]
+        if isinstance(v2, list):
+            for base in range(0, len(v2), CHUNK):
+                if v0[base:base+CHUNK] == v1[base:base+CHUNK] == v2[base:base+CHUNK]:
+                    continue
+                for i in range(base, min(base + CHUNK, len(v2))):
+                    if not check(key, i):
+                        return None
+        elif isinstance(v2, dict):
+            for name in v2:
+                if not check(key, name):
+                    return None
+        elif not v0 == v1 == v2:
+            return None
+
+    return deltas
+
+
+def _iterations(value, delta):
+    """How many times delta can be added to a (signed, 16-bit) value before it becomes zero, or
+    changes sign by overflowing.
+    """
+
+    if value > 0:
+        lo, hi = 1, 32767
+    elif value < 0:
+        lo, hi = -32768, -1
+    else:
+        return 0
+
+    if delta > 0:
+        return (hi - value)//delta
+    else:
+        return (value - lo)//-delta
@@ -0,0 +1,359 @@
+"""Separate compilation: each class is compiled and translated on its own, to an "object", and
+the objects are linked together into a single program.
+
+An object holds the translated code for one class, as recorded by AssemblySource (i.e. before
+assembly), along with its part of the source map. Any labels generated for it are scoped to the
+class (see AssemblySource.label_scope), so objects translated separately never collide, and an
+object doesn't depend on what else is in the program. That means it can be saved and used again,
+as long as the source and the platform are unchanged; see ObjectCache.
+
+Linking is then just a matter of putting the objects together, in order, with the code that the
+translator always emits at the start and end of the program (the "runtime"), and adjusting the
+source map. The platform's assembler resolves the labels and allocates the statics, when the
+result is assembled, as usual. The code isn't assembled any earlier because, for some platforms,
+an instruction can't be encoded until the address of every label is known (see alt/threaded.py.)
+
+Note: this assumes that the translator treats each class independently, apart from the code it
+emits when it's first created (and in preamble() and finish()), which is true of all the
+translators here.
+
+For a program with the OS, the result is the same as translating everything together (see
+translate_dir() and translate_library()), apart from the names of the generated labels.
+"""
+
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+
+from nand import peephole
+from nand.translate import AssemblySource, parallel_map, translate_ops
+
+
+class ObjectCode:
+    """The translated code for a single class (or VM file), ready to be linked.
+
+    `stream` is the code, in the form recorded by AssemblySource, and `src_map` is a list of
+    (address, op), with addresses counted from the start of the object. The functions it defines
+    and refers to are recorded, if the translator keeps track of them, to check for missing
+    functions when the objects are linked.
+    """
+
+    def __init__(self, name, stream, src_map, instruction_count, defined_functions=(), referenced_functions=()):
+        self.name = name
+        self.stream = stream
+        self.src_map = src_map
+        self.instruction_count = instruction_count
+        self.defined_functions = list(defined_functions)
+        self.referenced_functions = list(referenced_functions)
+
+    @property
+    def labels(self):
+        """Each label defined in the object."""
+        return [item[1] for item in self.stream if item[0] == "label"]
+
+    @property
+    def references(self):
+        """Each symbol that's referred to, in order of first reference: labels, defined here or in
+        another object, and static variables.
+        """
+        return list(dict.fromkeys(item[2] for item in self.stream if item[0] == "a" and isinstance(item[2], str)))
+
+    def __repr__(self):
+        return f"ObjectCode({self.name!r}, {self.instruction_count} instructions)"
+
+
+def compile_ops(platform, ops, name):
+    """Translate VM ops to an object, using a new translator.
+
+    `name` identifies the object, and scopes any labels generated for it, so it has to be
+    different for each object in a program.
+    """
+
+    translator = platform.translator()
+    asm = translator.asm
+
+    # Drop whatever the translator emitted up front; that's part of the runtime (see link()):
+    start = len(asm.stream)
+    base = asm.instruction_count
+    asm.label_scope = name
+
+    translate_ops(translator, ops)
+
+    return _object(name, asm, start, base, translator)
+
+
+def compile_jack(platform, src, cache=None):
+    """Compile a Jack class, either source code or an AST, and translate it to an object, named
+    for the class.
+    """
+
+    def make():
+        ast = platform.parser(src) if isinstance(src, str) else src
+        asm = AssemblySource()
+        platform.compiler(ast, asm)
+        ops = [platform.parse_line(l) for l in asm.lines if platform.parse_line(l) is not None]
+        return compile_ops(platform, ops, ast.name)
+
+    if cache is None:
+        return make()
+    return cache.get_or_compile(platform, *_jack_key(src), make)
+
+
+def compile_vm(platform, src, name, cache=None):
+    """Translate VM source code to an object."""
+
+    def make():
+        ops = [platform.parse_line(l) for l in src.split("\n") if platform.parse_line(l) is not None]
+        return compile_ops(platform, ops, name)
+
+    if cache is None:
+        return make()
+    return cache.get_or_compile(platform, *_vm_key(src, name), make)
+
+
+def compile_dir(platform, path, cache=None, jobs=1):
+    """Compile/translate Jack/VM programs from a directory or file, in the same order as
+    translate_dir(). With `jobs` > 1, that many processes are used (see parallel_map()), for
+    whatever isn't found in the cache.
+
+    :return: a list of objects.
+    """
+
+    if os.path.isdir(path):
+        sources = [("file", os.path.join(path, fn)) for fn in os.listdir(path)]
+    else:
+        sources = [("file", path)]
+    return _compile_all(platform, sources, cache, jobs)
+
+
+def compile_library(platform, cache=None, jobs=1):
+    """Compile/translate the OS classes, in the same order as translate_library()."""
+    return _compile_all(platform, [("library", i) for i in range(len(platform.library))], cache, jobs)
+
+
+def _compile_all(platform, sources, cache, jobs):
+    """Objects for a list of ("file", path) or ("library", index). Anything that's in the cache is
+    loaded here, and the rest are compiled in parallel, then saved.
+    """
+
+    objects = [None]*len(sources)
+    keys = [None]*len(sources)
+    if cache is not None:
+        for i, source in enumerate(sources):
+            keys[i] = cache.key(platform, *_source_key(platform, source))
+            objects[i] = cache.load(keys[i])
+
+    todo = [i for i, obj in enumerate(objects) if obj is None]
+    for i, obj in zip(todo, parallel_map(platform, _compile_source, [sources[i] for i in todo], jobs)):
+        objects[i] = obj
+        if cache is not None:
+            cache.save(keys[i], obj)
+
+    return objects
+
+
+def _compile_source(platform, source):
+    kind, x = source
+    if kind == "library":
+        return compile_jack(platform, platform.library[x])
+    elif x.endswith(".vm"):
+        with open(x, mode='r') as f:
+            return compile_vm(platform, f.read(), _vm_name(x))
+    elif x.endswith(".jack"):
+        with open(x, mode='r') as f:
+            return compile_jack(platform, f.read())
+    else:
+        raise Exception(f"Don't know what to do with file: {x}")
+
+
+def _source_key(platform, source):
+    kind, x = source
+    if kind == "library":
+        return _jack_key(platform.library[x])
+    with open(x, mode='r') as f:
+        src = f.read()
+    if x.endswith(".vm"):
+        return _vm_key(src, _vm_name(x))
+    else:
+        return _jack_key(src)
+
+
+def _jack_key(src):
+    return "jack", src if isinstance(src, str) else repr(src)
+
+
+def _vm_key(src, name):
+    return f"vm {name}", src
+
+
+def _vm_name(file_path):
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
+def sys_wait_override(platform):
+    """An object defining a version of Sys.wait() that returns immediately (see override_sys_wait().)
+    Linked after the library, its label takes precedence.
+    """
+
+    asm = AssemblySource()
+    platform.compiler(platform.parser("class Sys { function void wait() { return; } }"), asm)
+    ops = [platform.parse_line(l) for l in asm.lines if platform.parse_line(l) is not None]
+    return compile_ops(platform, ops, "Sys.wait")
+
+
+def link(platform, objects):
+    """Put the objects together, in order, with the runtime code, which is emitted by a new
+    translator (when it's created, and in preamble() and finish().)
+
+    :return: an AssemblySource with the code for the entire program, and a source map covering
+    all of it, ready to be assembled.
+    """
+
+    names = [obj.name for obj in objects]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise Exception(f"More than one object with the same name: {', '.join(duplicates)}")
+
+    translator = platform.translator()
+    translator.preamble()
+    asm = translator.asm
+    start = len(asm.stream)
+    base = asm.instruction_count
+    # The peephole rules are applied to the whole program at the end, as if it was all translated
+    # at once, not just to the runtime code:
+    rules = getattr(translator, "PEEPHOLE_RULES", ())
+    translator.PEEPHOLE_RULES = ()
+    translator.finish()
+    finish = _object("finish", asm, start, base, translator)
+
+    result = AssemblySource()
+    result.stream = asm.stream[:start]
+    for addr, op in asm.src_map.items():
+        if addr < base:
+            result.src_map.add(addr, op)
+    result.instruction_count = base
+    result.seq = asm.seq
+
+    for obj in objects + [finish]:
+        for addr, op in obj.src_map:
+            result.src_map.add(result.instruction_count + addr, op)
+        result.stream.extend(obj.stream)
+        result.instruction_count += obj.instruction_count
+
+    peephole.optimize(result, rules)
+
+    return result
+
+
+def check_references(objects):
+    """Check for obvious "linkage" errors, as the translator does (see check_references() in
+    solved_07.Translator): functions that are referenced but never defined, or defined twice.
+    """
+
+    defined = [f for obj in objects for f in obj.defined_functions]
+    referenced = {f for obj in objects for f in obj.referenced_functions}
+
+    assert len(defined) == len(set(defined)), "Each function is defined only once"
+
+    unresolved = referenced - set(defined)
+    assert unresolved == set(), f"Unresolved references: {unresolved}"
+
+
+def _object(name, asm, start, base, translator):
+    """The code (and source map) that was added to an AssemblySource after some point."""
+
+    return ObjectCode(
+        name,
+        asm.stream[start:],
+        [(addr - base, op) for addr, op in asm.src_map.items() if addr >= base],
+        asm.instruction_count - base,
+        getattr(translator, "defined_functions", ()),
+        getattr(translator, "referenced_functions", ()))
+
+
+class ObjectCache:
+    """Objects saved in a directory, one file each, named for a hash of the source and the
+    platform (see platform_key().)
+
+    Nothing is ever removed; delete the directory to start over.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._platform_keys = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compile(self, platform, kind, src, make):
+        """Load the object for some source, if it's been saved, or else call `make` to make it
+        and save it.
+        """
+
+        key = self.key(platform, kind, src)
+        obj = self.load(key)
+        if obj is None:
+            obj = make()
+            self.save(key, obj)
+        return obj
+
+    def key(self, platform, kind, src):
+        platform_key = self._platform_keys.get(id(platform))
+        if platform_key is None:
+            platform_key = self._platform_keys[id(platform)] = platform_key_for(platform)
+
+        return hashlib.sha256(f"{platform_key}\n{kind}\n{src}".encode()).hexdigest()
+
+    def load(self, key):
+        """The saved object, or None."""
+
+        try:
+            with open(self._file_path(key), "rb") as f:
+                obj = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        self.hits += 1
+        return obj
+
+    def save(self, key, obj):
+        self.misses += 1
+
+        os.makedirs(self.path, exist_ok=True)
+        file_path = self._file_path(key)
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(obj, f)
+        os.replace(temp_path, file_path)
+
+    def _file_path(self, key):
+        return os.path.join(self.path, f"{key}.obj")
+
+
+def platform_key_for(platform):
+    """A hash identifying the parts of a platform that go into making an object: the parser,
+    compiler, and translator, by name and by the contents of the modules that define them (for the
+    translator, including any classes it inherits from.)
+
+    Note: a change to some other module they use isn't noticed.
+    """
+
+    components = [platform.parser, platform.compiler, platform.parse_line]
+    components.extend(c for c in inspect.getmro(platform.translator) if c is not object)
+
+    h = hashlib.sha256()
+    module_names = {__name__, AssemblySource.__module__}
+    for component in components:
+        module_name = getattr(component, "__module__", None) or type(component).__module__
+        qualname = getattr(component, "__qualname__", None) or type(component).__qualname__
+        h.update(f"{module_name}.{qualname}\n".encode())
+        module_names.add(module_name)
+
+    for module_name in sorted(module_names):
+        module_path = getattr(sys.modules.get(module_name), "__file__", None)
+        if module_path is not None:
+            with open(module_path, "rb") as f:
+                h.update(f.read())
+
+    return h.hexdigest()
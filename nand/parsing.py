@@ -115,6 +115,26 @@ to do arbitrary computation:
 ...         .const(0))
 >>> depthP.parse("[[a]]")
 2
+
+
+Performance:
+
+OrP doesn't blindly try every alternative. Before it's first used, it works out which tokens
+each alternative could possibly start with (its "FIRST set"), and after that it only tries the
+alternatives that could match the current token. That's only an optimization; the result, and
+any failure, are the same.
+
+A grammar that tries the same rule more than once at the same location (say, an expression that
+might or might not be followed by an operator) can also be sped up by "packrat" parsing: the
+result of each DeferP (or any parser wrapped with `.memo()`) is saved by location, so it's only
+parsed once. That takes some memory, so it's only done if you provide a Memo, which also keeps
+track of how often it helped:
+
+>>> memo = Memo()
+>>> depthP.parse("[[a]]", memo=memo)
+2
+>>> memo.hits, memo.misses
+(0, 3)
 """
 
 from typing import Callable, Generic, Sequence, Optional, Tuple, Type, TypeVar
@@ -145,14 +165,19 @@ class Parser(Generic[T, V]):
     # if you want to. But then you need this function to be defined separately. And since it's
     # final there's no real reason for it to be in this class.
     @final
-    def parse(self, tokens: Sequence[T]) -> V:
+    def parse(self, tokens: Sequence[T], memo: Optional["Memo"] = None) -> V:
         """Apply this parser to a list of tokens. If it matches the entire stream, a result is returned.
         If it doesn't match, or matches only a prefix, a ParseFailure is raised.
 
+        If a Memo is provided, it's used to save the results of some parsers (see `memo()`), so they
+        aren't repeated.
+
         This method can be used on any parser to parse a fragment of code. It never needs to be overridden.
         """
 
-        val, loc = self.__call__(ParseLocation(tokens, pos=0))
+        if memo is not None:
+            memo.results.clear()  # Saved for some other tokens
+        val, loc = self.__call__(ParseLocation(tokens, pos=0, memo=memo))
         if loc.at_eof():
             return val
         else:
@@ -168,6 +193,21 @@ class Parser(Generic[T, V]):
 
         raise NotImplementedError()
 
+    def first_set(self, visiting: frozenset = frozenset()) -> "First":
+        """The tokens this parser might start with (see First.) Overridden in each Parser subclass
+        that can say; otherwise, it might start with anything.
+
+        `visiting` holds the DeferPs that are already being analyzed, so recursive grammars don't
+        recurse forever.
+        """
+
+        return First.ANYTHING
+
+    @final
+    def memo(self) -> "Parser[T, V]":
+        """Save the result of this parser at each location, if there's a Memo (see `parse()`)."""
+        return MemoP(self)
+
     @final
     def describe(self, label: str) -> "Parser[T, V]":
         """Supply a human-readable description of what the parser is trying to match, to be
@@ -195,6 +235,8 @@ class Parser(Generic[T, V]):
                     return self.parser(loc)
                 except ParseFailure:
                     raise ParseFailure(label, loc)
+            def first_set(self, visiting=frozenset()):
+                return self.parser.first_set(visiting)
             def __str__(self):
                 return self.label
         return LabeledP(self, label)
@@ -296,9 +338,10 @@ class ParseLocation(Generic[T]):
     advances, referring to the same underlying list.)
     """
 
-    def __init__(self, tokens: Sequence[T], pos):
+    def __init__(self, tokens: Sequence[T], pos, memo: Optional["Memo"] = None):
         self.tokens = tokens
         self.pos = pos
+        self.memo = memo
 
     def current_token(self) -> T:
         if self.at_eof():
@@ -309,7 +352,7 @@ class ParseLocation(Generic[T]):
         return self.pos == len(self.tokens)
 
     def advance(self) -> "ParseLocation":
-        return ParseLocation(self.tokens, self.pos+1)
+        return ParseLocation(self.tokens, self.pos+1, self.memo)
 
     def __str__(self):
         return f"ParseLocation(pos: {self.pos}; next token: {'<eof>' if self.at_eof() else repr(self.current_token())})"
@@ -321,7 +364,118 @@ class ParseFailure(Exception, Generic[T]):
         self.loc = loc
 
     def __str__(self):
-        return f"Expected {self.expected} at location {self.loc.pos}; next token: {'<eof>' if self.loc.at_eof() else repr(self.loc.current_token())}"
+        if self.loc.at_eof():
+            return f"Expected {self.expected} at location {self.loc.pos}; next token: <eof>"
+        token = self.loc.current_token()
+        # Tokens may carry their position in the source (e.g. solved_10.Token):
+        line = getattr(token, "line", None)
+        where = f" (line {line}, column {token.column})" if line is not None else ""
+        return f"Expected {self.expected} at location {self.loc.pos}{where}; next token: {repr(token)}"
+
+
+class First:
+    """What a parser can start with: any of a set of specific `tokens`, or any token accepted by
+    one of the `predicates`, or if `anything`, any token at all. If `nullable`, it can also succeed
+    without consuming any token, so the next parser's FIRST set matters too.
+    """
+
+    ANYTHING: "First"
+    NOTHING: "First"
+
+    def __init__(self, tokens=frozenset(), predicates=(), anything=False, nullable=False):
+        self.tokens = frozenset(tokens)
+        self.predicates = tuple(predicates)
+        self.anything = anything
+        self.nullable = nullable
+
+    def union(self, other: "First", nullable: bool) -> "First":
+        return First(self.tokens | other.tokens, self.predicates + other.predicates,
+                     self.anything or other.anything, nullable)
+
+    def then(self, other: "First") -> "First":
+        """What a sequence of two parsers can start with."""
+        if self.nullable:
+            return self.union(other, other.nullable)
+        else:
+            return self
+
+    def optional(self) -> "First":
+        return First(self.tokens, self.predicates, self.anything, True)
+
+    def accepts(self, token) -> bool:
+        """True if a parser with this FIRST set might succeed when the next token is `token`."""
+
+        if self.anything or self.nullable or token in self.tokens:
+            return True
+        for predicate in self.predicates:
+            try:
+                if predicate(token):
+                    return True
+            except Exception:
+                # Let the parser itself deal with it
+                return True
+        return False
+
+First.ANYTHING = First(anything=True)
+First.NOTHING = First()
+
+
+def _first_of_sequence(parsers, visiting) -> First:
+    """What a sequence of parsers can start with, looking only as far as the first one that
+    has to consume a token.
+    """
+
+    first = First.NOTHING.optional()
+    for p in parsers:
+        if not first.nullable:
+            break
+        first = first.then(p.first_set(visiting))
+    return first
+
+
+class Memo:
+    """Packrat parsing: the result (or failure) of each memoized parser, at each location
+    where it's been applied, with counts of how many times a result was re-used (`hits`) or had to
+    be parsed (`misses`.)
+
+    The results are only good for one list of tokens, but the same Memo can be used for more than one
+    call to `parse()`, to add up the counts.
+    """
+
+    def __init__(self):
+        self.results: dict = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits/total if total > 0 else 0.0
+
+    def __str__(self):
+        return f"{self.hits:,d} hits; {self.misses:,d} misses ({100*self.hit_rate:0.1f}% hit rate)"
+
+
+def _memoized(parser: Parser[T, V], loc: ParseLocation[T], parse: Callable) -> Tuple[V, ParseLocation[T]]:
+    memo = loc.memo
+    if memo is None:
+        return parse(loc)
+
+    key = (parser, loc.pos)
+    result = memo.results.get(key)
+    if result is None:
+        memo.misses += 1
+        try:
+            result = parse(loc)
+        except ParseFailure as x:
+            result = x
+        memo.results[key] = result
+    else:
+        memo.hits += 1
+
+    if isinstance(result, ParseFailure):
+        raise result.with_traceback(None)
+    return result
 
 
 #
@@ -337,6 +491,9 @@ class AnyP(Parser[T, T]):
     def __call__(self, loc) -> Tuple[T, ParseLocation[T]]:
         return loc.current_token(), loc.advance()
 
+    def first_set(self, visiting=frozenset()):
+        return First.ANYTHING
+
 
 class TokenP(Parser[T, V]):
     """Match a specific token, returning a constant value.
@@ -373,6 +530,9 @@ class TokenP(Parser[T, V]):
         else:
             raise ParseFailure(str(self), loc)
 
+    def first_set(self, visiting=frozenset()):
+        return First(tokens=[self.token])
+
     def __str__(self):
         return f"token {repr(self.token)}"
 
@@ -390,6 +550,9 @@ class OptionalP(Parser[T, Optional[V]]):
         except ParseFailure:
             return None, loc
 
+    def first_set(self, visiting=frozenset()):
+        return self.parser.first_set(visiting).optional()
+
 
 class ManyP(Parser[T, Sequence[V]]):
     """Apply a parser repeatedly until it fails, producing a list of values."""
@@ -406,11 +569,14 @@ class ManyP(Parser[T, Sequence[V]]):
             except ParseFailure as x:
                 # If the parser consumed any input and *then* failed, report that failure.
                 # If not, then we're at the end of the list and just return it.
-                if x.loc == loc:
+                if x.loc.pos == loc.pos:
                     return vals, loc
                 else:
                     raise x
 
+    def first_set(self, visiting=frozenset()):
+        return self.parser.first_set(visiting).optional()
+
 
 class SepByP(Parser[T, Sequence[V]]):
     """Apply a parser repeatedly until it fails, matching (and discarding) a separator between each, and
@@ -445,6 +611,10 @@ class SepByP(Parser[T, Sequence[V]]):
             val, loc = self.parser(loc)
             vals.append(val)
 
+    def first_set(self, visiting=frozenset()):
+        first = self.parser.first_set(visiting)
+        return first if self.one_or_more else first.optional()
+
 
 class OrP(Parser[T, V]):
     """Try a series of parsers until one matches, and return its result.
@@ -475,24 +645,54 @@ class OrP(Parser[T, V]):
 
     def __init__(self, *parsers: Parser[T, V]):
         self.parsers = parsers
+        self._firsts: Optional[Sequence[First]] = None
+        self._candidates: dict = {}  # token -> the parsers that might match it
 
     def __call__(self, loc) -> Tuple[V, ParseLocation[T]]:
         failures = []
-        for p in self.parsers:
+        for p in self._candidates_at(loc):
             try:
                 return p(loc)
             except ParseFailure as x:
                 failures.append(x)
         # Tricky: choose the "most interesting" failure to report — the one that
         # got the farthest and therefore has the most specific problem to report,
-        # most of the time.
-        furthest = sorted(failures, key=lambda pf: -pf.loc.pos)[0]
-        if furthest.loc.pos > loc.pos:
+        # most of the time. The alternatives that weren't tried would all have failed
+        # right away.
+        furthest = max(failures, key=lambda pf: pf.loc.pos, default=None)
+        if furthest is not None and furthest.loc.pos > loc.pos:
             raise furthest
         else:
             # No parser made any progress, so summarize them all
             raise ParseFailure(f"one of {', '.join(str(p) for p in self.parsers)}", loc)
 
+    def _candidates_at(self, loc) -> Sequence[Parser[T, V]]:
+        """The alternatives that might match, given the current token, in order."""
+
+        if loc.at_eof():
+            return self.parsers
+
+        if self._firsts is None:
+            # Note: not done until the first use, when any DeferPs have been set.
+            self._firsts = [p.first_set() for p in self.parsers]
+
+        token = loc.tokens[loc.pos]
+        try:
+            candidates = self._candidates.get(token)
+        except TypeError:
+            # Not hashable, so can't be cached
+            return [p for p, f in zip(self.parsers, self._firsts) if f.accepts(token)]
+        if candidates is None:
+            candidates = self._candidates[token] = [p for p, f in zip(self.parsers, self._firsts) if f.accepts(token)]
+        return candidates
+
+    def first_set(self, visiting=frozenset()):
+        first = First.NOTHING
+        for p in self.parsers:
+            f = p.first_set(visiting)
+            first = first.union(f, first.nullable or f.nullable)
+        return first
+
 
 V1 = TypeVar("V1", covariant=True)
 V2 = TypeVar("V2", covariant=True)
@@ -524,6 +724,9 @@ class Seq2P(Parser[T, Tuple[V1, V2]]):
         v2, loc = self.second(loc)
         return (v1, v2), loc
 
+    def first_set(self, visiting=frozenset()):
+        return _first_of_sequence([self.first, self.second], visiting)
+
 
 class BracketP(Parser[T, V]):
     """Apply a parser, ignoring matching tokens to the left and right.
@@ -547,6 +750,9 @@ class BracketP(Parser[T, V]):
         _, loc = self.right(loc)
         return val, loc
 
+    def first_set(self, visiting=frozenset()):
+        return _first_of_sequence([self.left, self.parser, self.right], visiting)
+
 
 class MapP(Parser[T, V]):
     """Apply a parser, then transform the value it produced.
@@ -563,6 +769,9 @@ class MapP(Parser[T, V]):
         val, loc = self.parser(loc)
         return self.transform(val), loc
 
+    def first_set(self, visiting=frozenset()):
+        return self.parser.first_set(visiting)
+
 
 class FilterP(Parser[T, V]):
     """Apply a parser, then check the value it produced against a predicate and fail if it's not accepted.
@@ -584,6 +793,13 @@ class FilterP(Parser[T, V]):
             # after consuming some tokens
             raise ParseFailure("predicate not satisfied", loc)
 
+    def first_set(self, visiting=frozenset()):
+        if isinstance(self.parser, AnyP):
+            # The predicate applies to the token itself:
+            return First(predicates=[self.predicate])
+        else:
+            return self.parser.first_set(visiting)
+
 
 class DeferP(Parser[T, V]):
     """A placeholder for a parser which will be constructed later, to resolve circular dependencies
@@ -605,10 +821,29 @@ class DeferP(Parser[T, V]):
 
     def __call__(self, loc) -> Tuple[V, ParseLocation[T]]:
         if self.parser is not None:
-            return self.parser(loc)
+            return _memoized(self, loc, self.parser)
         else:
             raise UnresolvedCircularityError(self.name)
 
+    def first_set(self, visiting=frozenset()):
+        if self.parser is None or self in visiting:
+            # Left-recursive (or not defined yet), so no telling:
+            return First.ANYTHING
+        return self.parser.first_set(visiting | {self})
+
+
+class MemoP(Parser[T, V]):
+    """Apply a parser, saving the result for the location, if there's a Memo (see Parser.memo().)"""
+
+    def __init__(self, parser: Parser[T, V]):
+        self.parser = parser
+
+    def __call__(self, loc) -> Tuple[V, ParseLocation[T]]:
+        return _memoized(self, loc, self.parser)
+
+    def first_set(self, visiting=frozenset()):
+        return self.parser.first_set(visiting)
+
 class UnresolvedCircularityError(Exception):
     def __init__(self, name):
         Exception.__init__(self, f"Parser {repr(name)} was never defined")
@@ -0,0 +1,207 @@
+"""Peephole optimization of translated assembly: remove instructions that can't make a difference,
+by looking at a few neighboring instructions at a time.
+
+Each translator emits code one op at a time, so where one op's code meets the next there's often
+something redundant, which no single op could avoid:
+
+- `drop_repeated_loads`: an A-instruction that loads the value A already holds (e.g. `@SP` just
+    after `@SP; M=M+1`.)
+- `drop_dead_d_writes`: a write to D that's overwritten before it's ever read (e.g. `D=M` followed
+    by `@5; D=A`.)
+- `drop_jumps_to_next`: a jump to the label that immediately follows it.
+
+The rules only ever remove instructions, and only within a straight run of code: a label might be
+the target of a jump from anywhere, so nothing is assumed about the state of the machine after
+one. Only the standard forms of instructions are understood; any other instruction (e.g. `SP++=D`
+in alt/sp.py) is assumed to do anything at all, so nothing is removed around it.
+
+optimize() applies the rules to an AssemblySource in place, and moves each op in the source map
+to the new location of its first instruction (or of the instruction that follows, if all of its
+instructions were removed.)
+
+Each translator chooses which rules to use, with its PEEPHOLE_RULES (see solved_07.Translator.)
+"""
+
+import re
+
+from nand.translate import SourceMap
+
+
+C_INSTR_PATTERN = re.compile(r"(?:([ADM]{1,3})=)?([01ADM!&|+\-]+)(?:;(J(?:GT|EQ|GE|LT|NE|LE|MP)))?")
+"""A C-instruction, in any of the standard forms; anything else is a mystery."""
+
+
+class CInstr:
+    def __init__(self, dest, comp, jump):
+        self.dest = dest
+        self.comp = comp
+        self.jump = jump
+
+    def reads(self, reg):
+        return reg in self.comp
+
+    def writes(self, reg):
+        return reg in self.dest
+
+
+def parse_c_instr(text):
+    """A CInstr, or None if the instruction isn't one of the standard forms."""
+
+    m = C_INSTR_PATTERN.fullmatch(text.replace(" ", ""))
+    if m is None:
+        return None
+    return CInstr(m.group(1) or "", m.group(2), m.group(3))
+
+
+def drop_repeated_loads(stream):
+    """Indexes of A-instructions that load the value A already holds."""
+
+    result = set()
+    known = None
+    for i, item in enumerate(stream):
+        kind = item[0]
+        if kind == "a":
+            if item[2] == known:
+                result.add(i)
+            known = item[2]
+        elif kind == "instr":
+            c = parse_c_instr(item[1])
+            if c is None or c.writes("A"):
+                known = None
+        elif kind in ("label", "raw"):
+            known = None
+    return result
+
+
+def drop_dead_d_writes(stream):
+    """Indexes of instructions that only write D, when the next instruction to touch D overwrites it
+    without reading it first.
+    """
+
+    result = set()
+    for i, item in enumerate(stream):
+        if item[0] != "instr":
+            continue
+        c = parse_c_instr(item[1])
+        if c is None or c.dest != "D" or c.jump is not None:
+            continue
+        for next_item in stream[i+1:]:
+            kind = next_item[0]
+            if kind in ("comment", "blank", "a"):
+                continue
+            elif kind == "instr":
+                n = parse_c_instr(next_item[1])
+                if n is not None and n.writes("D") and not n.reads("D"):
+                    result.add(i)
+            break
+    return result
+
+
+def drop_jumps_to_next(stream):
+    """Indexes of `@L; <jump>` pairs, where the label L immediately follows the jump."""
+
+    result = set()
+    items = [(i, item) for i, item in enumerate(stream) if item[0] not in ("comment", "blank")]
+    for n in range(len(items) - 1):
+        (i, load), (j, jump) = items[n], items[n+1]
+        if load[0] != "a" or jump[0] != "instr":
+            continue
+        c = parse_c_instr(jump[1])
+        if c is None or c.dest or c.jump is None:
+            continue
+        labels = set()
+        for _, item in items[n+2:]:
+            if item[0] != "label":
+                break
+            labels.add(item[1])
+        if load[2] in labels:
+            result.update((i, j))
+    return result
+
+
+PUSH_D = ("@SP", "M=M+1", "A=M-1", "M=D")
+POP_D = ("@SP", "AM=M-1", "D=M")
+
+def drop_push_pop(stream):
+    """Indexes of instructions that push D onto the stack and then pop it right back into D, when
+    the next instruction loads A (so the address of the top of the stack isn't needed.)
+
+    The value is left behind in memory, just above the stack, but nothing can be expecting to
+    find it there.
+    """
+
+    pattern = PUSH_D + POP_D
+    result = set()
+    items = [(i, item) for i, item in enumerate(stream) if item[0] not in ("comment", "blank")]
+    n = 0
+    while n + len(pattern) < len(items):
+        window = items[n:n+len(pattern)]
+        following = items[n+len(pattern)][1]
+        if (all(item[0] in ("a", "instr") and item[1] == text for (_, item), text in zip(window, pattern))
+                and following[0] == "a"):
+            result.update(i for i, _ in window)
+            n += len(pattern)
+        else:
+            n += 1
+    return result
+
+
+RULES = (drop_repeated_loads, drop_dead_d_writes, drop_jumps_to_next, drop_push_pop)
+
+
+def optimize(asm, rules=RULES):
+    """Apply the rules to an AssemblySource, repeatedly until none of them finds anything more to
+    remove, updating its stream, source map, and instruction count.
+
+    Only one rule's removals are made at a time, since each rule assumes the others' instructions
+    are still there (e.g. the load that a dead write's successor needs.)
+
+    :return: the number of instructions removed.
+    """
+
+    removed = 0
+    while rules:
+        drop = set()
+        for rule in rules:
+            drop.update(rule(asm.stream))
+            if drop:
+                break
+        if not drop:
+            break
+        removed += _remove(asm, drop)
+    return removed
+
+
+START_COMMENT_PATTERN = re.compile(r"(\d+): (.*)")
+"""The comment AssemblySource.start() adds, with the address where an op starts."""
+
+
+def _remove(asm, drop):
+    stream = []
+    new_addrs = []  # for each old address
+    new_addr = 0
+    for i, item in enumerate(asm.stream):
+        kind = item[0]
+        if kind in ("a", "instr"):
+            new_addrs.append(new_addr)
+            if i not in drop:
+                stream.append(item)
+                new_addr += 1
+        elif kind == "comment":
+            m = START_COMMENT_PATTERN.fullmatch(item[1])
+            if m and int(m.group(1)) == len(new_addrs):
+                item = ("comment", f"{new_addr}: {m.group(2)}")
+            stream.append(item)
+        else:
+            stream.append(item)
+    new_addrs.append(new_addr)
+
+    src_map = SourceMap()
+    for addr, op in asm.src_map.items():
+        src_map.add(new_addrs[min(addr, len(new_addrs)-1)], op)
+
+    removed = asm.instruction_count - new_addr
+    asm.stream = stream
+    asm.src_map = src_map
+    asm.instruction_count = new_addr
+    return removed
@@ -23,13 +23,14 @@ that are put together in any Platform instance should work together to run progr
 programs they run might be slightly different from the standard ones. For example, an alternate
 platform might add new machine instructions, VM opcodes, or Jack syntax, or it might *remove*
 some instructions; as long as the components work together to do something useful.
+
+Each platform is put together the first time it's used (see __getattr__()), so importing this
+module doesn't import all the solution and project modules (and parse the OS classes), until they're
+actually needed.
 """
 
 import collections
 
-from nand.solutions import solved_05, solved_06, solved_07, solved_10, solved_11, solved_12
-import project_05, project_06, project_07, project_08, project_10, project_11, project_12
-
 
 Platform = collections.namedtuple("Platform", [
     "chip", "assemble", "parse_line", "translator", "parser", "compiler", "library"
@@ -41,23 +42,47 @@ Platform = collections.namedtuple("Platform", [
 
 # def standard_compile(ast)
 
-USER_PLATFORM = Platform(
-    chip=project_05.Computer,
-    assemble=project_06.assemble,
-    parse_line=project_07.parse_line,
-    translator=project_08.Translator,
-    parser=project_10.parse_class,
-    compiler=project_11.compile_class,
-    library=project_12.OS_CLASSES)
-"""The default chip and associated tools, defined in the project_0x.py modules."""
-
-
-BUNDLED_PLATFORM = Platform(
-    chip=solved_05.Computer,
-    assemble=solved_06.assemble,
-    parse_line=solved_07.parse_line,
-    translator=solved_07.Translator,
-    parser=solved_10.parse_class,
-    compiler=solved_11.compile_class,
-    library=solved_12._OS_CLASSES)
-"""The included chip and tools; for comparison with the user's solution."""
+def _user_platform():
+    """The default chip and associated tools, defined in the project_0x.py modules."""
+
+    import project_05, project_06, project_07, project_08, project_10, project_11, project_12
+
+    return Platform(
+        chip=project_05.Computer,
+        assemble=project_06.assemble,
+        parse_line=project_07.parse_line,
+        translator=project_08.Translator,
+        parser=project_10.parse_class,
+        compiler=project_11.compile_class,
+        library=project_12.OS_CLASSES)
+
+
+def _bundled_platform():
+    """The included chip and tools; for comparison with the user's solution."""
+
+    from nand.solutions import solved_05, solved_06, solved_07, solved_10, solved_11, solved_12
+
+    return Platform(
+        chip=solved_05.Computer,
+        assemble=solved_06.assemble,
+        parse_line=solved_07.parse_line,
+        translator=solved_07.Translator,
+        parser=solved_10.parse_class,
+        compiler=solved_11.compile_class,
+        library=solved_12._OS_CLASSES)
+
+
+_PLATFORMS = {
+    "USER_PLATFORM": _user_platform,
+    "BUNDLED_PLATFORM": _bundled_platform,
+}
+
+
+def __getattr__(name):
+    """USER_PLATFORM and BUNDLED_PLATFORM, each made when it's first used."""
+
+    make = _PLATFORMS.get(name)
+    if make is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    platform = globals()[name] = make()
+    return platform
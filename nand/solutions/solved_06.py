@@ -64,6 +64,10 @@ BUILTIN_SYMBOLS = {
 }
 
 
+A_PATTERN = re.compile(r"@((0x[0-9a-fA-F]+)|([1-9][0-9]*)|0)")
+C_PATTERN = re.compile(r"(?:([ADM]+)=)?([^;]+)(?:;J(..))?")
+
+
 def parse_op(string, symbols=None):
     """Parse a single assembly op directly to the corresponding Hack instruction word.
 
@@ -78,14 +82,14 @@ def parse_op(string, symbols=None):
     - Constant values may be specified in hex, e.g. @0x5555
     """
 
-    m = re.match(r"@((0x[0-9a-fA-F]+)|([1-9][0-9]*)|0)", string)
+    m = A_PATTERN.match(string)
     if m:
-        value = eval(m.group(1))
+        value = int(m.group(1), 0)
         if value < 0 or value > 0x7FFF:
             raise ParseError(f"A-command value out of range: {value}")
         return value
     else:
-        m = re.match(r"(?:([ADM]+)=)?([^;]+)(?:;J(..))?", string)
+        m = C_PATTERN.match(string)
         if m:
             dest_str = m.group(1) or ""
             dest = 0
@@ -124,30 +128,110 @@ def assemble(lines, parse_op=parse_op, min_static=16, max_static=255, start_addr
     Leading and trailing white space on each line is ignored.
     After comments and white space are stripped, blank lines are ignored.
 
+    `lines` can also be an AssemblySource, in which case the lines it has already parsed (its
+    `stream`) are used directly, without formatting and re-parsing the text.
+
+    The lines are read just once. Each reference to a symbol that isn't builtin is left as a
+    "fixup" to be filled in at the end, when all the labels are known (a label can be redefined,
+    and the last definition wins; see alt/shift.py.) Any symbol that isn't a label is then
+    allocated as a static, in order of first reference. Other instructions are encoded at the end
+    too, because parse_op may refer to labels (see alt/threaded.py), and each distinct instruction
+    is only parsed once. The result is the same as assemble_simple().
+
     :return: A tuple containing (list of instruction words,
                 dictionary mapping labels to locations in ROM,
                 dictionary mapping non-label symbols to addresses in RAM).
     """
 
-    # First pass: strip out non-instruction lines and extraneous characters:
-    code_lines = []
-    for line in lines:
-        m = re.match(r"([^/]*)(?://.*)?", line)
-        if m:
-            string = m.group(1).strip()
+    ops = [0]*start_addr
+    symbols = {}
+    refs = []    # (index, symbol)
+    instrs = []  # (index, text)
+    for kind, value in _code_lines(lines):
+        if kind == "a":
+            if value in builtins:
+                ops.append(builtins[value])
+            else:
+                refs.append((len(ops), value))
+                ops.append(None)
+        elif kind == "instr":
+            instrs.append((len(ops), value))
+            ops.append(None)
         else:
-            string = line.strip()
+            loc = len(ops)
+            if value in builtins:
+                raise ParseError(f"Attempt to redefine builtin symbol {value} at location {loc}")
+            elif value in symbols:
+                # This isn't an error because allowing re-definition makes it easy to hackishly
+                # override something (see alt/shift.py). Sorry, world.
+                print(f"WARNING! Label {value} redefined at {loc} (previous location: {symbols[value]})")
+            symbols[value] = loc
+
+    statics = {}
+    next_static = min_static
+    for i, name in refs:
+        if name in symbols:
+            ops[i] = symbols[name]
+        elif name in statics:
+            ops[i] = statics[name]
+        elif next_static is None:
+            raise ParseError(f"Unable to allocate static storage for symbol {name}; no static allocation space available")
+        elif next_static > max_static:
+            raise ParseError(f"Unable to allocate static storage for symbol {name}; already used all {max_static - min_static + 1} available locations")
+        else:
+            statics[name] = next_static
+            ops[i] = next_static
+            next_static += 1
 
-        if string:
-            code_lines.append(string)
+    encoded = {}
+    for i, text in instrs:
+        word = encoded.get(text)
+        if word is None:
+            word = encoded[text] = parse_op(text, symbols)
+        ops[i] = word
+
+    return (ops, symbols, statics)
+
+
+def _code_lines(lines):
+    """Each label, symbol reference, and other instruction, as a tuple: ("label", name),
+    ("a", symbol), or ("instr", text).
+    """
+
+    stream = getattr(lines, "stream", None)
+    if stream is None:
+        for line in lines:
+            c = parse_line(line)
+            if c is not None:
+                yield c
+    else:
+        for item in stream:
+            kind = item[0]
+            if kind == "label" or kind == "instr":
+                yield item
+            elif kind == "a":
+                # Numeric values are handled by parse_op, same as instructions:
+                yield ("a", item[2]) if isinstance(item[2], str) else ("instr", item[1])
+            elif kind == "raw":
+                c = parse_line(item[1])
+                if c is not None:
+                    yield c
+
+
+def assemble_simple(lines, parse_op=parse_op, min_static=16, max_static=255, start_addr=0, builtins=BUILTIN_SYMBOLS):
+    """The straightforward way to write assemble(), in three passes, which is easier to follow,
+    but about three times slower. Produces exactly the same result.
+    """
+
+    # First pass: strip out non-instruction lines and extraneous characters, and classify each line
+    # as a label, a reference to a symbol, or some other instruction:
+    code_lines = list(_code_lines(lines))
 
     # Second pass: resolve labels to locations
     symbols = {}
     loc = start_addr
-    for line in code_lines:
-        m = re.match(r"\((.*)\)", line)
-        if m:
-            name = m.group(1)
+    for kind, name in code_lines:
+        if kind == "label":
             if name in builtins:
                 raise ParseError(f"Attempt to redefine builtin symbol {name} at location {loc}")
             elif name in symbols:
@@ -162,13 +246,12 @@ def assemble(lines, parse_op=parse_op, min_static=16, max_static=255, start_addr
     ops = [0]*start_addr
     statics = {}
     next_static = min_static
-    for line in code_lines:
-        if "(" in line:
+    for kind, line in code_lines:
+        if kind == "label":
             pass
         else:
-            m = re.match(r"@(\D.*)", line)
-            if m:
-                name = m.group(1)
+            if kind == "a":
+                name = line
                 if name in builtins:
                     ops.append(builtins[name])
                 elif name in symbols:
@@ -190,6 +273,25 @@ def assemble(lines, parse_op=parse_op, min_static=16, max_static=255, start_addr
     return (ops, symbols, statics)
 
 
+def parse_line(line):
+    """Classify a line of assembly text: ("label", name), ("a", symbol), or ("instr", text), or
+    None for a line with nothing but white space and/or a comment.
+    """
+
+    # Anything after a "/" is a comment:
+    string = line.partition("/")[0].strip()
+
+    if not string:
+        return None
+    elif string[0] == "(":
+        end = string.rfind(")")
+        if end > 0:
+            return ("label", string[1:end])
+    elif string[0] == "@" and len(string) > 1 and not string[1].isdigit():
+        return ("a", string[1:])
+    return ("instr", string)
+
+
 class ParseError(Exception):
     def __init__(self, msg):
         Exception.__init__(self, msg)
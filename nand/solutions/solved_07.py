@@ -6,7 +6,8 @@ If you want to write this on your own, stop reading now!
 
 import re
 
-from nand.translate import AssemblySource
+from nand import peephole
+from nand.translate import AssemblySource, expand_op, format_op, fuse_ops
 
 INITIALIZE_LOCALS = True
 """If true, additional instructions are generated to initialize each local variable to 0 each time
@@ -26,6 +27,16 @@ class Translator:
     Note: this implementation is not broken out into separate classes for projects 07 and 08.
     """
 
+    FUSED_OPS = ("if_compare_goto", "if_not_goto", "add_locals", "add_constant", "sub_constant")
+    """The fused ops (see nand.translate.FUSIONS) that rewrite_ops() generates. A subclass that
+    changes how any of the underlying ops work needs to implement the fused ops too, or leave them
+    out."""
+
+    PEEPHOLE_RULES = peephole.RULES
+    """The rules (see nand.peephole) that finish() applies to all the code. A subclass that emits
+    instructions the rules could misread, or that depends on the exact address of any instruction,
+    needs to leave some or all of them out."""
+
     def __init__(self, asm=None):
         self.asm = asm if asm else AssemblySource()
         self.class_namespace = "static"
@@ -263,6 +274,87 @@ class Translator:
         self.asm.instr("0;JMP")
 
 
+    def if_compare_goto(self, condition, name):
+        """A comparison and a branch, without ever pushing the result. That's as many instructions
+        as the two ops separately, but about 20 fewer cycles, since the comparison's common sequence
+        isn't needed."""
+        self._start_fused("if_compare_goto", condition, name)
+        self.asm.instr("@SP")
+        self.asm.instr("AM=M-1")
+        self.asm.instr("D=M")
+        self.asm.instr("A=A-1")
+        self.asm.instr("D=M-D")
+        self.asm.instr("@SP")
+        self.asm.instr("M=M-1")
+        self.asm.instr(f"@{self.function_namespace}${name}")
+        self.asm.instr(f"D;J{condition}")
+
+    def if_not_goto(self, name):
+        self._start_fused("if_not_goto", name)
+        self._pop_d()
+        self.asm.instr("D=D+1")  # i.e. jump unless the value is -1 (true)
+        self.asm.instr(f"@{self.function_namespace}${name}")
+        self.asm.instr("D;JNE")
+
+    def add_locals(self, i, j):
+        self._start_fused("add_locals", i, j)
+        self._local_to_d(i)
+        if j <= 6:
+            self.asm.instr("@LCL")
+            self.asm.instr("A=M" if j == 0 else "A=M+1")
+            for _ in range(j-1):
+                self.asm.instr("A=A+1")
+            self.asm.instr("D=D+M")
+        else:
+            self.asm.instr("@R13")
+            self.asm.instr("M=D")
+            self._local_to_d(j)
+            self.asm.instr("@R13")
+            self.asm.instr("D=D+M")
+        self._push_d()
+
+    def _local_to_d(self, index):
+        if index <= 2:
+            self.asm.instr("@LCL")
+            self.asm.instr("A=M" if index == 0 else "A=M+1")
+            if index == 2:
+                self.asm.instr("A=A+1")
+            self.asm.instr("D=M")
+        else:
+            self.asm.instr(f"@{index}")
+            self.asm.instr("D=A")
+            self.asm.instr("@LCL")
+            self.asm.instr("A=D+M")
+            self.asm.instr("D=M")
+
+    def add_constant(self, value):
+        """Add to the top of the stack in place, without pushing the constant."""
+        self._start_fused("add_constant", value)
+        self._modify_top_by_constant(value, "+")
+
+    def sub_constant(self, value):
+        self._start_fused("sub_constant", value)
+        self._modify_top_by_constant(value, "-")
+
+    def _modify_top_by_constant(self, value, op):
+        if value <= 2:
+            if value > 0:
+                self.asm.instr("@SP")
+                self.asm.instr("A=M-1")
+                for _ in range(value):
+                    self.asm.instr(f"M=M{op}1")
+        else:
+            self.asm.instr(f"@{value}")
+            self.asm.instr("D=A")
+            self.asm.instr("@SP")
+            self.asm.instr("A=M-1")
+            self.asm.instr("M=D+M" if op == "+" else "M=M-D")
+
+    def _start_fused(self, op_name, *args):
+        """Record the ops a fused op stands for, for debugging."""
+        self.asm.start("; ".join(format_op(op) for op in expand_op((op_name, args))))
+
+
     def function(self, class_name, function_name, num_vars):
         # if self.last_function_start is not None:
         #     instrs = self.asm.instruction_count - self.last_function_start
@@ -286,10 +378,8 @@ class Translator:
 
         if num_vars == 0:
             # Note: a lot of functions have no locals, so skipping this has some impact.
-            # Tricky: this instruction has no effect; it's just here to take up space in the ROM and ensure that the
-            # "function" op has a unique address assigned to it, so that it can appear in tracing and profiling. Yes,
-            # that is dumb.
-            self.asm.instr("0")
+            # The "function" op then shares its address with the first op of the body (see SourceMap.)
+            pass
         elif num_vars == 1:
             # 2 instr. (or 4, if locals are initialized)
             if INITIALIZE_LOCALS:
@@ -565,8 +655,12 @@ class Translator:
 
 
     def finish(self):
-        """Called after all opcodes are processed, in case the translator needs to say any last words."""
-        pass
+        """Called after all opcodes are processed, in case the translator needs to say any last words.
+
+        Here, that means cleaning up the seams between ops' instructions, with PEEPHOLE_RULES.
+        """
+
+        peephole.optimize(self.asm, self.PEEPHOLE_RULES)
 
 
     def rewrite_ops(self, ops):
@@ -575,9 +669,11 @@ class Translator:
 
         Expected to be called with large, coherent chunks of ops; at least an entire function
         at a time, or maybe a file at a time.
+
+        Here, that means fusing sequences of ops into the FUSED_OPS.
         """
 
-        return ops
+        return fuse_ops(ops, self.FUSED_OPS)
 
 
     def check_references(self):
@@ -8,7 +8,90 @@ from nand.parsing import *
 # stringConstant: '"', a sequence of Unicode characters, not including double quote or newline, '"'
 # identifier: a sequence of letters, digits, and underscore ( '_' ) not starting with a digit.
 
+KEYWORDS = frozenset([
+    "class", "constructor", "function",
+    "method", "field", "static", "var", "int",
+    "char", "boolean", "void", "true", "false",
+    "null", "this", "let", "do", "if", "else",
+    "while", "return",
+])
+
+TOKEN_PATTERN = re.compile(r"""
+      (?P<space>[ \t\n]+)
+    | (?P<comment>//[^\n]*|/\*(?s:.*?)\*/)
+    | (?P<integerConstant>[0-9]+)
+    | "(?P<stringConstant>(?:\\.|[^"\n])*)"
+    | (?P<word>[a-zA-Z_][a-zA-Z_0-9]*)
+    | (?P<symbol>['{}()\[\].,;+\-*/&|<>=~])
+    | (?P<error>.)
+""", re.VERBOSE)
+"""Every kind of token (and the white space and comments in between), as alternatives in one pattern,
+in the order they're tried. Anything else is an error."""
+
+
+class Token(tuple):
+    """A token is a type (which is "keyword", etc.) and the string that was matched, as a tuple, plus
+    the line and column where it was found (both starting from 1), for error messages.
+    """
+
+    def __new__(cls, token_type, value, line, column):
+        token = tuple.__new__(cls, (token_type, value))
+        token.line = line
+        token.column = column
+        return token
+
+    def __getnewargs__(self):
+        return (self[0], self[1], self.line, self.column)
+
+
+def tokenize(string):
+    """Generate the tokens in some Jack source, one at a time, as Tokens.
+
+    The source is scanned just once, with a single pattern that matches any token.
+    """
+
+    line = 1
+    line_start = 0
+    for m in TOKEN_PATTERN.finditer(string):
+        kind = m.lastgroup
+        if kind == "space" or kind == "comment":
+            start, end = m.span()
+            newlines = string.count("\n", start, end)
+            if newlines:
+                line += newlines
+                line_start = string.rindex("\n", start, end) + 1
+            continue
+
+        column = m.start() - line_start + 1
+        token_str = m.group(kind)
+        if kind == "word":
+            yield Token("keyword" if token_str in KEYWORDS else "identifier", token_str, line, column)
+        elif kind == "symbol":
+            yield Token("symbol", token_str, line, column)
+        elif kind == "integerConstant":
+            int_val = int(token_str)
+            if not (0 <= int_val <= 32767):
+                raise Exception(f"Integer constant out of range: {int_val} (line {line}, column {column})")
+            yield Token(kind, token_str, line, column)
+        elif kind == "stringConstant":
+            yield Token(kind, token_str.replace('\\"', '"').replace('\\\\', '\\'), line, column)
+        else:
+            raise Exception(f"Unexpected input at line {line}, column {column}: {repr(string[m.start():m.start() + 20])}")
+
+
 def lex(string):
+    """All the tokens in some Jack source, as a list of tuples (type, string), which are actually Tokens,
+    each with its location.
+    """
+    return list(tokenize(string))
+
+
+def lex_simple(string):
+    """The straightforward way to write lex(), matching one token at a time at the start of the
+    remaining string, which is easier to follow, but slow for a large file. Produces the same tokens,
+    but without locations.
+    """
+
     # This is simple and requires no additional packages, but there are more elegant ways to get
     # this job done.
 
@@ -342,5 +425,8 @@ ClassP = (
 
 
 # Used by BUNDLED_PLATFORM:
-def parse_class(string):
-    return ClassP.parse(lex(string))
+def parse_class(string, memo=None):
+    """Parse the source for a Jack class. Expressions are parsed with a Memo (see nand.parsing),
+    which saves about a third of the time; provide one to see how much it helped.
+    """
+    return ClassP.parse(lex(string), memo=memo if memo is not None else Memo())
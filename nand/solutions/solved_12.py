@@ -1,9 +1,67 @@
-from nand.solutions import solved_10
+"""The OS classes, written in Jack, and parsed on first use.
+
+Each class is parsed by the Jack parser from project 10 (solved_10.parse_class), which takes a
+noticeable fraction of a second for all of them, so the ASTs are saved on disk (in __pycache__,
+like Python's own compiled modules), and loaded from there the next time. A saved AST is used only
+if both the source and the parser are unchanged (see _ast_key().)
+
+Nothing is parsed or loaded until one of the names defined below is actually used (see
+__getattr__()), so importing this module costs next to nothing.
+"""
+
+import hashlib
+import os
+import pickle
+
+
+_SRC_DIR = os.path.join(os.path.dirname(__file__), "solved_12")
+_CACHE_DIR = os.path.join(_SRC_DIR, "__pycache__")
+
+_PARSER_MODULES = [
+    os.path.join(os.path.dirname(__file__), "solved_10.py"),
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "parsing.py"),
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "jack_ast.py"),
+]
+
 
 def _parse_jack_file(class_name):
-    with open(f"nand/solutions/solved_12/{class_name}.jack") as f:
-        src = "\n".join(f.readlines())
-        return solved_10.parse_class(src)
+    with open(os.path.join(_SRC_DIR, f"{class_name}.jack")) as f:
+        src = f.read()
+
+    key = _ast_key(src)
+    cache_path = os.path.join(_CACHE_DIR, f"{class_name}.{key[:16]}.ast")
+    try:
+        with open(cache_path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+
+    # Note: imported here so the parser isn't loaded at all when the ASTs are found in the cache.
+    from nand.solutions import solved_10
+    ast = solved_10.parse_class(src)
+
+    try:
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(ast, f)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # Can't write the cache (e.g. a read-only install); parse it again next time.
+        pass
+
+    return ast
+
+
+def _ast_key(src):
+    """A hash of the source and the contents of the modules that make up the parser."""
+
+    h = hashlib.sha256(src.encode())
+    for path in _PARSER_MODULES:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
 
 def _find_subroutine(class_ast, sub_name):
     for sd in class_ast.subroutineDecs:
@@ -12,138 +70,152 @@ def _find_subroutine(class_ast, sub_name):
     raise Exception("Not found: {class_ast.name}.{sub_name}")
 
 
+_CLASSES = {}
+"""ASTs that have been parsed/loaded, by class name."""
+
+_LAZY = {}
+"""The function to compute each name that's defined on first use, from one of the ASTs."""
+
+
+def _load_class(class_name):
+    ast = _CLASSES.get(class_name)
+    if ast is None:
+        ast = _CLASSES[class_name] = _parse_jack_file(class_name)
+    return ast
+
+
+def _define(class_name, class_var, var_decs_var=None, **subroutine_vars):
+    """Define the names for a class's AST, its varDecs, and each of its subroutines."""
+
+    _LAZY[class_var] = lambda: _load_class(class_name)
+    if var_decs_var is not None:
+        _LAZY[var_decs_var] = lambda: _load_class(class_name).varDecs
+    for var, sub_name in subroutine_vars.items():
+        _LAZY[var] = lambda sub_name=sub_name: _find_subroutine(_load_class(class_name), sub_name)
+
+
+def __getattr__(name):
+    thunk = _LAZY.get(name)
+    if thunk is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = thunk()
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
+
+
 ####################
 ## Array.jack
 ####################
 
-_ARRAY_CLASS = _parse_jack_file("Array")
-
-ARRAY_NEW     = _find_subroutine(_ARRAY_CLASS, "new")
-ARRAY_DISPOSE = _find_subroutine(_ARRAY_CLASS, "dispose")
+_define("Array", "_ARRAY_CLASS",
+    ARRAY_NEW     = "new",
+    ARRAY_DISPOSE = "dispose")
 
 
 ####################
 ## String.jack
 ####################
 
-_STRING_CLASS = _parse_jack_file("String")
-
-STRING_VAR_DECS = _STRING_CLASS.varDecs
-
-STRING_NEW             = _find_subroutine(_STRING_CLASS, "new")
-STRING_DISPOSE         = _find_subroutine(_STRING_CLASS, "dispose")
-STRING_LENGTH          = _find_subroutine(_STRING_CLASS, "length")
-STRING_CHAR_AT         = _find_subroutine(_STRING_CLASS, "charAt")
-STRING_SET_CHAR_AT     = _find_subroutine(_STRING_CLASS, "setCharAt")
-STRING_APPEND_CHAR     = _find_subroutine(_STRING_CLASS, "appendChar")
-STRING_ERASE_LAST_CHAR = _find_subroutine(_STRING_CLASS, "eraseLastChar")
-STRING_INT_VALUE       = _find_subroutine(_STRING_CLASS, "intValue")
-STRING_SET_INT         = _find_subroutine(_STRING_CLASS, "setInt")
-STRING_NEW_LINE        = _find_subroutine(_STRING_CLASS, "newLine")
-STRING_BACK_SPACE      = _find_subroutine(_STRING_CLASS, "backSpace")
-STRING_DOUBLE_QUOTE    = _find_subroutine(_STRING_CLASS, "doubleQuote")
+_define("String", "_STRING_CLASS", "STRING_VAR_DECS",
+    STRING_NEW             = "new",
+    STRING_DISPOSE         = "dispose",
+    STRING_LENGTH          = "length",
+    STRING_CHAR_AT         = "charAt",
+    STRING_SET_CHAR_AT     = "setCharAt",
+    STRING_APPEND_CHAR     = "appendChar",
+    STRING_ERASE_LAST_CHAR = "eraseLastChar",
+    STRING_INT_VALUE       = "intValue",
+    STRING_SET_INT         = "setInt",
+    STRING_NEW_LINE        = "newLine",
+    STRING_BACK_SPACE      = "backSpace",
+    STRING_DOUBLE_QUOTE    = "doubleQuote")
 
 
 ####################
 ## Memory.jack
 ####################
 
-_MEMORY_CLASS = _parse_jack_file("Memory")
-
-MEMORY_VAR_DECS = _MEMORY_CLASS.varDecs
-
-MEMORY_INIT     = _find_subroutine(_MEMORY_CLASS, "init")
-MEMORY_PEEK     = _find_subroutine(_MEMORY_CLASS, "peek")
-MEMORY_POKE     = _find_subroutine(_MEMORY_CLASS, "poke")
-MEMORY_ALLOC    = _find_subroutine(_MEMORY_CLASS, "alloc")
-MEMORY_DE_ALLOC = _find_subroutine(_MEMORY_CLASS, "deAlloc")
+_define("Memory", "_MEMORY_CLASS", "MEMORY_VAR_DECS",
+    MEMORY_INIT     = "init",
+    MEMORY_PEEK     = "peek",
+    MEMORY_POKE     = "poke",
+    MEMORY_ALLOC    = "alloc",
+    MEMORY_DE_ALLOC = "deAlloc")
 
 
 ####################
 ## Keyboard.jack
 ####################
 
-_KEYBOARD_CLASS = _parse_jack_file("Keyboard")
-
-KEYBOARD_VAR_DECS = _KEYBOARD_CLASS.varDecs
-
-KEYBOARD_INIT        = _find_subroutine(_KEYBOARD_CLASS, "init")
-KEYBOARD_KEY_PRESSED = _find_subroutine(_KEYBOARD_CLASS, "keyPressed")
-KEYBOARD_READ_CHAR   = _find_subroutine(_KEYBOARD_CLASS, "readChar")
-KEYBOARD_READ_LINE   = _find_subroutine(_KEYBOARD_CLASS, "readLine")
-KEYBOARD_READ_INT    = _find_subroutine(_KEYBOARD_CLASS, "readInt")
+_define("Keyboard", "_KEYBOARD_CLASS", "KEYBOARD_VAR_DECS",
+    KEYBOARD_INIT        = "init",
+    KEYBOARD_KEY_PRESSED = "keyPressed",
+    KEYBOARD_READ_CHAR   = "readChar",
+    KEYBOARD_READ_LINE   = "readLine",
+    KEYBOARD_READ_INT    = "readInt")
 
 
 ####################
 ## Output.jack
 ####################
 
-_OUTPUT_CLASS = _parse_jack_file("Output")
-
-OUTPUT_INIT         = _find_subroutine(_OUTPUT_CLASS, "init")
-OUTPUT_INIT_MAP     = _find_subroutine(_OUTPUT_CLASS, "initMap")
-OUTPUT_MOVE_CURSOR  = _find_subroutine(_OUTPUT_CLASS, "moveCursor")
-OUTPUT_PRINT_CHAR   = _find_subroutine(_OUTPUT_CLASS, "printChar")
-OUTPUT_PRINT_STRING = _find_subroutine(_OUTPUT_CLASS, "printString")
-OUTPUT_PRINT_INT    = _find_subroutine(_OUTPUT_CLASS, "printInt")
-OUTPUT_PRINTLN      = _find_subroutine(_OUTPUT_CLASS, "println")
-OUTPUT_BACK_SPACE   = _find_subroutine(_OUTPUT_CLASS, "backSpace")
+_define("Output", "_OUTPUT_CLASS",
+    OUTPUT_INIT         = "init",
+    OUTPUT_INIT_MAP     = "initMap",
+    OUTPUT_MOVE_CURSOR  = "moveCursor",
+    OUTPUT_PRINT_CHAR   = "printChar",
+    OUTPUT_PRINT_STRING = "printString",
+    OUTPUT_PRINT_INT    = "printInt",
+    OUTPUT_PRINTLN      = "println",
+    OUTPUT_BACK_SPACE   = "backSpace")
 
 
 ####################
 ## Math.jack
 ####################
 
-_MATH_CLASS = _parse_jack_file("Math")
-
-MATH_INIT     = _find_subroutine(_MATH_CLASS, "init")
-MATH_ABS      = _find_subroutine(_MATH_CLASS, "abs")
-MATH_MULTIPLY = _find_subroutine(_MATH_CLASS, "multiply")
-MATH_DIVIDE   = _find_subroutine(_MATH_CLASS, "divide")
-MATH_SQRT     = _find_subroutine(_MATH_CLASS, "sqrt")
-MATH_MAX      = _find_subroutine(_MATH_CLASS, "max")
-MATH_MIN      = _find_subroutine(_MATH_CLASS, "min")
+_define("Math", "_MATH_CLASS",
+    MATH_INIT     = "init",
+    MATH_ABS      = "abs",
+    MATH_MULTIPLY = "multiply",
+    MATH_DIVIDE   = "divide",
+    MATH_SQRT     = "sqrt",
+    MATH_MAX      = "max",
+    MATH_MIN      = "min")
 
 
 ####################
 ## Screen.jack
 ####################
 
-_SCREEN_CLASS = _parse_jack_file("Screen")
-
-SCREEN_INIT           = _find_subroutine(_SCREEN_CLASS, "init")
-SCREEN_CLEAR_SCREEN   = _find_subroutine(_SCREEN_CLASS, "clearScreen")
-SCREEN_SET_COLOR      = _find_subroutine(_SCREEN_CLASS, "setColor")
-SCREEN_DRAW_PIXEL     = _find_subroutine(_SCREEN_CLASS, "drawPixel")
-SCREEN_DRAW_LINE      = _find_subroutine(_SCREEN_CLASS, "drawLine")
-SCREEN_DRAW_RECTANGLE = _find_subroutine(_SCREEN_CLASS, "drawRectangle")
-SCREEN_DRAW_CIRCLE    = _find_subroutine(_SCREEN_CLASS, "drawCircle")
+_define("Screen", "_SCREEN_CLASS",
+    SCREEN_INIT           = "init",
+    SCREEN_CLEAR_SCREEN   = "clearScreen",
+    SCREEN_SET_COLOR      = "setColor",
+    SCREEN_DRAW_PIXEL     = "drawPixel",
+    SCREEN_DRAW_LINE      = "drawLine",
+    SCREEN_DRAW_RECTANGLE = "drawRectangle",
+    SCREEN_DRAW_CIRCLE    = "drawCircle")
 
 
 ####################
 ## Sys.jack
 ####################
 
-_SYS_CLASS = _parse_jack_file("Sys")
+_define("Sys", "_SYS_CLASS",
+    SYS_INIT  = "init",
+    SYS_HALT  = "halt",
+    SYS_WAIT  = "wait",
+    SYS_ERROR = "error")
 
-SYS_INIT  = _find_subroutine(_SYS_CLASS, "init")
-SYS_HALT  = _find_subroutine(_SYS_CLASS, "halt")
-SYS_WAIT  = _find_subroutine(_SYS_CLASS, "wait")
-SYS_ERROR = _find_subroutine(_SYS_CLASS, "error")
 
+_OS_CLASS_NAMES = ["Array", "String", "Memory", "Keyboard", "Output", "Math", "Screen", "Sys"]
 
 # Used by BUNDLED_PLATFORM
-_OS_CLASSES = [
-    _ARRAY_CLASS,
-    _STRING_CLASS,
-    _MEMORY_CLASS,
-    _KEYBOARD_CLASS,
-    _OUTPUT_CLASS,
-    _MATH_CLASS,
-    _SCREEN_CLASS,
-    _SYS_CLASS,
-]
-
+_LAZY["_OS_CLASSES"] = lambda: [_load_class(n) for n in _OS_CLASS_NAMES]
 
 
 # A bunch of code follows which is all related to generating an implementation of Output.printChar.
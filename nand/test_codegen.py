@@ -520,3 +520,156 @@ def test_speed():
     cps = cycles_per_second()
     print(f"Measured speed: {cps:0,.1f} cycles/s")
     assert cps > 100_000
+
+
+def test_screen_dirty():
+    computer = run(project_05.Computer.constr())
+
+    # Initially, the whole screen needs to be drawn:
+    assert computer.take_screen_dirty() == set(range(0x2000))
+    assert computer.take_screen_dirty() == set()
+
+    computer.init_rom(SCREEN_PROGRAM)
+    for _ in range(len(SCREEN_PROGRAM)):
+        computer.ticktock()
+    assert computer.peek_screen(0x0021) == -1
+    assert computer.screen_buffer()[0x0021] == -1
+    assert len(computer.screen_buffer()) == 0x2000
+    assert computer.take_screen_dirty() == {0x0021, 0x1FFF}
+
+    # Writes to main memory aren't tracked:
+    computer.poke(100, 1)
+    computer.poke_screen(5, 1)
+    assert computer.take_screen_dirty() == {5}
+
+
+SCREEN_PROGRAM = [
+    0x4021,                 # @0x4021
+    0b1110111010001000,     # M=-1
+    0x5FFF,                 # @0x5FFF
+    0b1110111111001000,     # M=1
+    0x0010,                 # @0x0010
+    0b1110111111001000,     # M=1
+]
+
+
+def test_memory_address_from_bits():
+    """When the address isn't just a register, it's assembled from its bits, and every bit
+    counts, including the one that selects the screen."""
+
+    computer = nand.syntax.run(SplitAddressMemory, simulator="codegen")
+
+    computer.in_ = -1
+    computer.load = True
+    computer.hi = 0x40
+    computer.lo = 0x21
+    computer.ticktock()
+
+    assert computer.peek_screen(0x0021) == -1
+    assert computer.peek(0x0021) == 0
+
+
+@nand.syntax.chip
+def SplitAddressMemory(inputs, outputs):
+    """MemorySystem, with the address wired bit by bit from two 8-bit inputs (as in alt/eight.py)."""
+
+    from nand.solutions.solved_05 import MemorySystem
+
+    mem = MemorySystem(in_=inputs.in_, load=inputs.load, address=Splice(hi=inputs.hi, lo=inputs.lo).out)
+    outputs.out = mem.out
+
+    # A ROM makes this a complete "computer", with RAM and screen:
+    outputs.instruction = nand.syntax.ROM(15)(address=inputs.pc).out
+
+
+def test_ram_address_from_bits():
+    """The same goes for a plain RAM, which can have more than 14 address bits."""
+
+    computer = nand.syntax.run(SplitAddressRAM, simulator="codegen")
+
+    computer.in_ = -1
+    computer.load = True
+    computer.hi = 0x40
+    computer.lo = 0x21
+    computer.ticktock()
+
+    assert computer.peek(0x4021) == -1
+    assert computer.peek(0x0021) == 0
+
+
+@nand.syntax.chip
+def SplitAddressRAM(inputs, outputs):
+    ram = nand.syntax.RAM(15)(in_=inputs.in_, load=inputs.load, address=Splice(hi=inputs.hi, lo=inputs.lo).out)
+    outputs.out = ram.out
+
+    outputs.instruction = nand.syntax.ROM(15)(address=inputs.pc).out
+
+
+@nand.syntax.chip
+def Splice(inputs, outputs):
+    for i in range(8):
+        outputs.out[i] = inputs.lo[i]
+        outputs.out[i+8] = inputs.hi[i]
+
+
+def test_tty_log():
+    computer = run(project_05.Computer.constr())
+    computer.init_rom(TTY_PROGRAM)
+
+    assert computer.take_tty_log() == []
+
+    for _ in range(len(TTY_PROGRAM)):
+        computer.ticktock()
+
+    # get_tty() only sees the last value, but the log has every one:
+    assert computer.take_tty_log() == [1, -1]
+    assert computer.get_tty() == -1
+    assert computer.take_tty_log() == []
+
+
+TTY_PROGRAM = [
+    0x6000,                 # @0x6000
+    0b1110111111001000,     # M=1
+    0b1110111010001000,     # M=-1
+]
+
+
+def test_ticktock_until():
+    computer = run(project_05.Computer.constr())
+    computer.init_rom(LOOP_PROGRAM)
+
+    # Stops as soon as the PC gets to one of the addresses:
+    assert computer.ticktock_until(100, {3}) == 3
+    assert computer.pc == 3
+
+    # Always runs at least one cycle, even if it starts at a stop:
+    assert computer.ticktock_until(100, {0, 3}) == 1
+    assert computer.pc == 0
+
+    # Otherwise, runs all the cycles:
+    assert computer.ticktock_until(10, {100}) == 10
+    assert computer.peek(0) == 4
+
+
+def test_ticktock_until_changed():
+    computer = run(project_05.Computer.constr())
+    computer.init_rom(LOOP_PROGRAM)
+
+    # Stops as soon as the word is written with a new value:
+    assert computer.ticktock_until_changed(100, 0) == 2
+    assert computer.peek(0) == 1
+    assert computer.ticktock_until_changed(100, 0) == 4
+    assert computer.peek(0) == 2
+
+    # Otherwise, runs all the cycles:
+    assert computer.ticktock_until_changed(10, 1) == 10
+    assert computer.ticktock_until_changed(10, 0x4000) == 10
+    assert computer.peek(0) == 7
+
+
+LOOP_PROGRAM = [
+    0x0000,                 # @0
+    0b1111110111001000,     # M=M+1
+    0x0000,                 # @0
+    0b1110101010000111,     # 0;JMP
+]
@@ -0,0 +1,180 @@
+from nand import run
+from nand.debugger import TimeMachine
+from nand.solutions import solved_05, solved_06
+
+
+SUM_ASM = """
+(LOOP)
+    @24576
+    D=M
+    @sum
+    M=M+D
+    @count
+    M=M+1
+    @LOOP
+    0;JMP
+""".split("\n")
+
+SUM, SUM_SYMBOLS, _ = solved_06.assemble(SUM_ASM)
+SUM_ADDR = 16    # sum
+COUNT_ADDR = 17  # count
+
+
+def new_computer():
+    computer = run(solved_05.Computer, simulator="codegen")
+    computer.init_rom(SUM)
+    return computer
+
+
+def plain_state(cycles, keys=()):
+    """State after running the program normally, with (cycle, keycode) events."""
+
+    computer = new_computer()
+    cycle = 0
+    for at, key in keys:
+        if at > cycles:
+            break
+        computer.ticktock(at - cycle)
+        cycle = at
+        computer.set_keydown(key)
+    computer.ticktock(cycles - cycle)
+    return computer.save_state()
+
+
+def test_goto():
+    tm = TimeMachine(new_computer(), interval=100, keyframe_every=4)
+    tm.run(2_000)
+    assert tm.computer.save_state() == plain_state(2_000)
+
+    for cycle in (1_234, 0, 999, 1_000, 1_001, 1_999, 150, 3_000):
+        tm.goto(cycle)
+        assert tm.cycle == cycle
+        assert tm.computer.save_state() == plain_state(cycle)
+
+
+def test_step_back():
+    tm = TimeMachine(new_computer(), interval=100)
+    tm.run(555)
+
+    tm.step_back()
+    assert tm.cycle == 554
+    assert tm.computer.save_state() == plain_state(554)
+
+    tm.step_back(1_000)
+    assert tm.cycle == 0
+    assert tm.computer.pc == 0
+
+
+def test_keys_replayed():
+    tm = TimeMachine(new_computer(), interval=100, keyframe_every=4)
+    tm.run(321)
+    tm.set_keydown(3)
+    tm.run(200)
+    tm.set_keydown(0)
+    tm.run(1_000)
+
+    keys = [(321, 3), (521, 0)]
+    for cycle in (1_521, 400, 521, 322, 10, 1_000):
+        tm.goto(cycle)
+        assert tm.computer.save_state() == plain_state(cycle, keys), cycle
+
+    # Changing the past changes the future:
+    tm.goto(400)
+    tm.set_keydown(5)
+    tm.run(600)
+    assert tm.computer.save_state() == plain_state(1_000, [(321, 3), (400, 5)])
+
+
+def test_run_until():
+    tm = TimeMachine(new_computer(), interval=100)
+    tm.run(10)
+
+    assert tm.run_until({SUM_SYMBOLS["LOOP"]}, 1_000)
+    assert tm.cycle == 16
+    assert tm.computer.pc == 0
+
+    assert not tm.run_until({1_000}, 1_000)
+    assert tm.cycle == 1_016
+
+
+def test_reverse_continue():
+    tm = TimeMachine(new_computer(), interval=100)
+    tm.run(1_005)
+
+    # The loop is 8 instructions, so the last time at the top was 1,000:
+    assert tm.reverse_continue({0})
+    assert tm.cycle == 1_000
+    assert tm.reverse_continue({0})
+    assert tm.cycle == 992
+
+    # Either of two addresses, from the middle of an interval:
+    tm.goto(1_050)
+    assert tm.reverse_continue({3, 5})
+    assert tm.cycle == 1_045
+    assert tm.reverse_continue({3, 5})
+    assert tm.cycle == 1_043
+
+    assert not tm.reverse_continue({1_000})
+    assert tm.cycle == 1_043
+    assert tm.computer.save_state() == plain_state(1_043)
+
+
+def test_last_change():
+    tm = TimeMachine(new_computer(), interval=100)
+    tm.run(500)
+    tm.set_keydown(1)
+    tm.run(50)
+    tm.set_keydown(0)
+    tm.run(2_000)
+
+    cycle = tm.last_change(SUM_ADDR)
+    assert tm.cycle == 2_550  # unchanged
+
+    # That's the cycle when the last write took effect:
+    keys = [(500, 1), (550, 0)]
+    assert 500 < cycle < 570
+    assert plain_state(cycle, keys)["ram"][SUM_ADDR] == tm.computer.peek(SUM_ADDR)
+    assert plain_state(cycle - 1, keys)["ram"][SUM_ADDR] == tm.computer.peek(SUM_ADDR) - 1
+
+    # Changing all the time:
+    assert tm.last_change(COUNT_ADDR) > 2_540
+
+    # Never changed:
+    assert tm.last_change(100) is None
+    assert tm.last_change(0x4000) is None
+
+
+KEY_ASM = """
+(LOOP)
+    @24576
+    D=M
+    @key
+    M=D
+    @LOOP
+    0;JMP
+""".split("\n")
+
+KEY, _, _ = solved_06.assemble(KEY_ASM)
+KEY_ADDR = 16    # key
+
+
+def test_last_change_undone():
+    """A change that's undone before the next snapshot is still found."""
+
+    computer = run(solved_05.Computer, simulator="codegen")
+    computer.init_rom(KEY)
+    tm = TimeMachine(computer, interval=100)
+    tm.run(510)
+    tm.set_keydown(1)
+    tm.run(20)
+    tm.set_keydown(0)
+    tm.run(1_000)
+
+    cycle = tm.last_change(KEY_ADDR)
+    assert tm.cycle == 1_530  # unchanged
+
+    assert 530 < cycle < 540
+    tm.goto(cycle)
+    assert tm.computer.peek(KEY_ADDR) == 0
+    tm.goto(cycle - 1)
+    assert tm.computer.peek(KEY_ADDR) == 1
@@ -0,0 +1,154 @@
+import pytest
+
+from nand import run
+from nand.fastforward import FastForward
+from nand.solutions import solved_05, solved_06
+
+
+COUNTDOWN_ASM = """
+    @1000
+    D=A
+    @count
+    M=D
+(LOOP)
+    @count
+    M=M-1
+    D=M
+    @LOOP
+    D;JGT
+
+    @done
+    M=1
+(HALT)
+    @HALT
+    0;JMP
+""".split("\n")
+
+COUNTDOWN, COUNTDOWN_SYMBOLS, _ = solved_06.assemble(COUNTDOWN_ASM)
+
+
+def in_loop(pc):
+    return COUNTDOWN_SYMBOLS["LOOP"] <= pc < COUNTDOWN_SYMBOLS["HALT"]
+
+
+def run_countdown(simulator, cycles, batch, in_wait_region=(lambda _: False)):
+    computer = run(solved_05.Computer, simulator=simulator)
+    computer.init_rom(COUNTDOWN)
+    ff = FastForward(computer, in_wait_region=in_wait_region)
+    for _ in range(cycles//batch):
+        ff.ticktock(batch)
+    return computer, ff
+
+
+def plain_state(simulator, cycles):
+    computer = run(solved_05.Computer, simulator=simulator)
+    computer.init_rom(COUNTDOWN)
+    computer.ticktock(cycles)
+    return computer.save_state()
+
+
+@pytest.mark.parametrize("batch", [10_000, 100, 37])
+def test_skip_counting_loop(batch):
+    computer, ff = run_countdown("codegen", 10_000, batch, in_wait_region=in_loop)
+
+    assert computer.save_state() == plain_state("codegen", 10_000)
+    assert computer.peek(17) == 1  # done
+    assert ff.skipped > 0
+
+
+def test_skip_counting_loop_partially():
+    """Stopping part of the way through the loop leaves the counter exactly where it would be."""
+
+    for cycles in (1_000, 2_345, 4_999):
+        computer = run(solved_05.Computer, simulator="codegen")
+        computer.init_rom(COUNTDOWN)
+        computer.ticktock(10)  # into the loop
+        ff = FastForward(computer, in_wait_region=in_loop)
+        ff.ticktock(cycles - 10)
+
+        assert computer.save_state() == plain_state("codegen", cycles)
+        assert ff.skipped > 0
+
+
+def test_counting_loop_only_in_wait_region():
+    computer, ff = run_countdown("codegen", 4_000, 4_000)
+
+    assert computer.save_state() == plain_state("codegen", 4_000)
+    assert ff.skipped == 0
+
+
+def test_skip_halt_loop():
+    """The halt loop repeats exactly, so it's skipped even outside of any wait region."""
+
+    computer, ff = run_countdown("codegen", 100_000, 10_000)
+
+    assert computer.save_state() == plain_state("codegen", 100_000)
+    assert computer.pc == COUNTDOWN_SYMBOLS["HALT"] or computer.pc == COUNTDOWN_SYMBOLS["HALT"] + 1
+    # Roughly, the first 5000 cycles are needed to get through the counting loop:
+    assert ff.skipped > 80_000
+
+
+def test_skip_halt_loop_vector():
+    """With the vector simulator, only the exact repeat is recognized."""
+
+    computer = run(solved_05.Computer, simulator="vector")
+    computer.init_rom(solved_06.assemble(["(HALT)", "@HALT", "0;JMP"])[0])
+    ff = FastForward(computer, in_wait_region=lambda _: True)
+    for _ in range(10):
+        ff.ticktock(100)
+
+    assert computer.pc in (0, 1)
+    assert ff.skipped > 500
+
+
+KEYWAIT_ASM = """
+(WAIT)
+    @1000
+    D=A
+    @count
+    M=D
+    @24576
+    D=M
+    @WAIT
+    D;JEQ
+    @key
+    M=D
+(COUNT)
+    @after
+    M=M+1
+    @COUNT
+    0;JMP
+""".split("\n")
+
+
+@pytest.mark.parametrize("batch", [100, 37])
+@pytest.mark.parametrize("key_offset", range(8))
+def test_key_between_calls(batch, key_offset):
+    """A key pressed between calls is seen at the same cycle, even though the loop polling the
+    keyboard was recognized by an earlier call."""
+
+    program, _, _ = solved_06.assemble(KEYWAIT_ASM)
+
+    def run_with_key(ticktock_fn_for):
+        computer = run(solved_05.Computer, simulator="codegen")
+        computer.init_rom(program)
+        ticktock = ticktock_fn_for(computer)
+        for _ in range(5_000//batch + key_offset):
+            ticktock(batch)
+        computer.set_keydown(65)
+        for _ in range(1_000//batch):
+            ticktock(batch)
+        return computer
+
+    ffs = []
+    def fast(computer):
+        ffs.append(FastForward(computer))
+        return ffs[0].ticktock
+
+    computer = run_with_key(fast)
+    expected = run_with_key(lambda computer: computer.ticktock)
+
+    assert computer.peek(17) == 65  # key
+    assert computer.save_state() == expected.save_state()
+    assert computer.peek(18) > 0  # after
+    assert ffs[0].skipped > 0
@@ -0,0 +1,93 @@
+import os
+import pytest
+
+from nand import link
+from nand.platform import BUNDLED_PLATFORM
+from nand.translate import translate_dir, translate_library
+
+
+PONG = "examples/project_11/Pong"
+
+
+def translate_all(platform, path):
+    translator = platform.translator()
+    translator.preamble()
+    translate_dir(translator, platform, path)
+    translate_library(translator, platform)
+    translator.finish()
+    return translator.asm
+
+
+def test_same_as_translating_together():
+    """Linking gives the same program, apart from the names of some labels."""
+
+    platform = BUNDLED_PLATFORM
+
+    asm1 = translate_all(platform, PONG)
+    objects = link.compile_dir(platform, PONG) + link.compile_library(platform)
+    link.check_references(objects)
+    asm2 = link.link(platform, objects)
+
+    ops1, _, statics1 = platform.assemble(asm1)
+    ops2, _, statics2 = platform.assemble(asm2)
+    assert ops2 == ops1
+    assert statics2 == statics1
+    assert list(asm2.src_map.items()) == list(asm1.src_map.items())
+    assert asm2.find_function("Sys", "wait") == asm1.find_function("Sys", "wait")
+
+
+def test_labels_scoped():
+    main, = link.compile_dir(BUNDLED_PLATFORM, f"{PONG}/Main.jack")
+
+    assert main.name == "Main"
+    assert main.defined_functions == ["Main.main"]
+    assert "main.main" in main.labels
+    assert all(l == "main.main" or l.startswith("Main$") for l in main.labels)
+    assert "PongGame.run" in main.referenced_functions
+
+
+def test_override():
+    objects = link.compile_library(BUNDLED_PLATFORM) + [link.sys_wait_override(BUNDLED_PLATFORM)]
+    asm = link.link(BUNDLED_PLATFORM, objects)
+
+    # The override comes last, after the rest of Sys:
+    start, _ = asm.find_function("Sys", "wait")
+    assert start > asm.find_function("Sys", "halt")[0]
+    assert [fn.name for fn in asm.src_map.functions].count("Sys.wait") == 2
+
+
+def test_duplicate_names():
+    main, = link.compile_dir(BUNDLED_PLATFORM, f"{PONG}/Main.jack")
+    with pytest.raises(Exception):
+        link.link(BUNDLED_PLATFORM, [main, main])
+
+
+def test_cache(tmp_path):
+    cache = link.ObjectCache(str(tmp_path))
+    objects1 = link.compile_dir(BUNDLED_PLATFORM, PONG, cache)
+    assert (cache.hits, cache.misses) == (0, 4)
+    assert len(os.listdir(tmp_path)) == 4
+
+    cache = link.ObjectCache(str(tmp_path))
+    objects2 = link.compile_dir(BUNDLED_PLATFORM, PONG, cache)
+    assert (cache.hits, cache.misses) == (4, 0)
+    assert [o.stream for o in objects2] == [o.stream for o in objects1]
+
+    # A change to the source means a new object:
+    src = "class Main { function void main() { return; } }"
+    link.compile_jack(BUNDLED_PLATFORM, src, cache)
+    assert cache.misses == 1
+    link.compile_jack(BUNDLED_PLATFORM, src.replace("main", "run"), cache)
+    assert cache.misses == 2
+    link.compile_jack(BUNDLED_PLATFORM, src, cache)
+    assert cache.hits == 5
+
+
+def test_parallel(tmp_path):
+    objects1 = link.compile_dir(BUNDLED_PLATFORM, PONG) + link.compile_library(BUNDLED_PLATFORM)
+
+    cache = link.ObjectCache(str(tmp_path))
+    objects2 = link.compile_dir(BUNDLED_PLATFORM, PONG, cache, jobs=3) + link.compile_library(BUNDLED_PLATFORM, cache, jobs=3)
+
+    assert list(link.link(BUNDLED_PLATFORM, objects2)) == list(link.link(BUNDLED_PLATFORM, objects1))
+    assert cache.misses == len(objects1)
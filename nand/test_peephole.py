@@ -0,0 +1,128 @@
+from nand import peephole
+from nand.platform import BUNDLED_PLATFORM
+from nand.solutions import solved_07
+from nand.syntax import run
+from nand.translate import AssemblySource, translate_dir, translate_library
+
+
+def assemble_lines(*lines):
+    """An AssemblySource, with "op" comments starting each op, as the translators emit them."""
+
+    asm = AssemblySource()
+    for line in lines:
+        if line.startswith("//"):
+            asm.start(line[2:].strip())
+        elif line.startswith("("):
+            asm.label(line[1:-1])
+        else:
+            asm.instr(line)
+    return asm
+
+def instrs(asm):
+    return [item[1] if item[0] != "label" else f"({item[1]})"
+            for item in asm.stream if item[0] in ("a", "instr", "label")]
+
+
+def test_repeated_load():
+    asm = assemble_lines("@SP", "M=M+1", "@SP", "A=M-1", "M=D", "@SP", "AM=M-1")
+
+    assert peephole.optimize(asm) == 1
+    assert instrs(asm) == ["@SP", "M=M+1", "A=M-1", "M=D", "@SP", "AM=M-1"]
+
+def test_repeated_load_after_label():
+    """Any jump to the label could have loaded some other address."""
+
+    asm = assemble_lines("@SP", "M=M+1", "(LOOP)", "@SP", "M=M+1", "@LOOP", "0;JMP")
+
+    assert peephole.optimize(asm) == 0
+
+def test_dead_d_write():
+    asm = assemble_lines("D=M", "@5", "D=A", "@R13", "M=D")
+
+    assert peephole.optimize(asm) == 1
+    assert instrs(asm) == ["@5", "D=A", "@R13", "M=D"]
+
+    asm = assemble_lines("D=M", "@5", "D=D+A")
+    assert peephole.optimize(asm) == 0
+
+def test_jump_to_next():
+    asm = assemble_lines("@END", "D;JEQ", "(SKIP)", "(END)", "D=M")
+
+    assert peephole.optimize(asm) == 2
+    assert instrs(asm) == ["(SKIP)", "(END)", "D=M"]
+
+def test_push_pop():
+    asm = assemble_lines("D=M", "@SP", "M=M+1", "A=M-1", "M=D", "@SP", "AM=M-1", "D=M", "@R5", "M=D")
+
+    assert peephole.optimize(asm) == 7
+    assert instrs(asm) == ["D=M", "@R5", "M=D"]
+
+    # Here, A=A-1 needs the address of the top of the stack:
+    asm = assemble_lines("@SP", "M=M+1", "A=M-1", "M=D", "@SP", "AM=M-1", "D=M", "A=A-1", "M=D+M")
+    assert peephole.optimize(asm) == 0
+
+def test_unknown_instructions():
+    """An instruction the rules don't understand might do anything."""
+
+    asm = assemble_lines("@SP", "SP++=D", "@SP", "D=M", "M>>1", "@3", "D=A")
+
+    assert peephole.optimize(asm) == 0
+
+
+def test_src_map():
+    """Each op moves to the new address of its first instruction, or the next one if all its
+    instructions are gone."""
+
+    asm = assemble_lines(
+        "// push local 0",  "@LCL", "A=M", "D=M", "@SP", "M=M+1", "A=M-1", "M=D",
+        "// pop static 1",  "@SP", "AM=M-1", "D=M", "@Main.1", "M=D",
+        "// goto END",      "@END", "0;JMP",
+        "// label END",     "(END)",
+        "// push static 1", "@Main.1", "D=M")
+
+    assert peephole.optimize(asm) == 9
+    assert instrs(asm) == ["@LCL", "A=M", "D=M", "@Main.1", "M=D", "(END)", "@Main.1", "D=M"]
+    assert list(asm.src_map.items()) == [
+        (0, "push local 0"),
+        (3, "pop static 1"),
+        (5, "goto END"),
+        (5, "label END"),
+        (5, "push static 1"),
+    ]
+    assert [item[1] for item in asm.stream if item[0] == "comment"] == [
+        "0: push local 0", "3: pop static 1", "5: goto END", "5: label END", "5: push static 1"]
+    assert asm.instruction_count == 7
+
+
+def translate_pong(translator):
+    translator.preamble()
+    translate_dir(translator, BUNDLED_PLATFORM, "examples/project_11/Pong")
+    translate_library(translator, BUNDLED_PLATFORM)
+    translator.finish()
+    return translator.asm
+
+
+class UnoptimizedTranslator(solved_07.Translator):
+    PEEPHOLE_RULES = ()
+
+def test_pong_smaller():
+    optimized = translate_pong(BUNDLED_PLATFORM.translator())
+    unoptimized = translate_pong(UnoptimizedTranslator())
+
+    assert optimized.instruction_count < unoptimized.instruction_count - 500
+    assert len(optimized.src_map) <= len(unoptimized.src_map)
+    assert optimized.find_function("Main", "main") is not None
+
+def test_optimized_program_runs():
+    translator = BUNDLED_PLATFORM.translator()
+    translator.preamble()
+    translate_dir(translator, BUNDLED_PLATFORM, "examples/project_12/MathTest.jack")
+    translate_library(translator, BUNDLED_PLATFORM)
+    translator.finish()
+
+    computer = run(BUNDLED_PLATFORM.chip)
+    translator.asm.run(BUNDLED_PLATFORM.assemble, computer, stop_cycles=1_000_000)
+
+    assert computer.peek(8000) == 6       # multiply(2, 3)
+    assert computer.peek(8005) == 3       # divide(9, 3)
+    assert computer.peek(8009) == 181     # sqrt(32767)
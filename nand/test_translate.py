@@ -0,0 +1,248 @@
+from nand.platform import BUNDLED_PLATFORM
+from nand.syntax import run
+from nand.translate import (
+    AssemblySource, FUSED_OP_NAMES, PruningTranslator, SourceMap, expand_op, fuse_ops,
+    reachable_functions, translate_dir, translate_library, translate_ops, vm_functions)
+
+
+def small_program():
+    """Two functions, one with no locals, so its "function" op emits no instructions."""
+
+    asm = AssemblySource()
+    asm.start("function Main.main 1")
+    asm.label("main.main")
+    asm.instr("@SP")
+    asm.instr("M=M+1")
+    asm.start("call Main.double 1")
+    asm.instr("@main.double")
+    asm.instr("0;JMP")
+    asm.start("return")
+    asm.instr("@RETURN")
+    asm.instr("0;JMP")
+    asm.start("function Main.double 0")
+    asm.label("main.double")
+    asm.start("push argument 0")
+    asm.instr("@ARG")
+    asm.instr("A=M")
+    asm.instr("D=M")
+    asm.start("return")
+    asm.instr("@RETURN")
+    asm.instr("0;JMP")
+    return asm
+
+
+def test_multiple_ops_per_address():
+    src_map = small_program().src_map
+
+    assert list(src_map) == [0, 2, 4, 6, 9]
+    assert src_map.ops_at(6) == ["function Main.double 0", "push argument 0"]
+    assert src_map[6] == "push argument 0"
+    assert src_map.get(7) is None
+    assert src_map.ops_at(7) == ()
+    assert list(src_map.items())[3:5] == [(6, "function Main.double 0"), (6, "push argument 0")]
+
+
+def test_op_containing():
+    src_map = small_program().src_map
+
+    assert src_map.op_containing(0) == (0, "function Main.main 1")
+    assert src_map.op_containing(3) == (2, "call Main.double 1")
+    assert src_map.op_containing(8) == (6, "push argument 0")
+    assert src_map.op_containing(100) == (9, "return")
+
+    assert SourceMap().op_containing(0) is None
+
+
+def test_functions():
+    asm = small_program()
+    src_map = asm.src_map
+
+    assert [(fn.name, fn.start, fn.end, fn.returns) for fn in src_map.functions] == [
+        ("Main.main", 0, 6, [4]),
+        ("Main.double", 6, None, [9]),
+    ]
+    assert src_map.function_containing(5).name == "Main.main"
+    assert src_map.function_containing(6).name == "Main.double"
+    assert src_map.function_containing(1000).name == "Main.double"
+
+    assert asm.find_function("Main", "double") == (6, [9])
+    assert asm.find_function("Main", "triple") is None
+
+
+def test_overridden_function():
+    """The last definition of a function is the one that's found."""
+
+    asm = small_program()
+    asm.start("function Main.double 0")
+    asm.label("main.double")
+    asm.instr("@RETURN")
+    asm.instr("0;JMP")
+
+    assert asm.find_function("Main", "double") == (11, [13])
+    assert asm.src_map.function_containing(8).name == "Main.double"
+    assert asm.src_map.function_containing(8).start == 6
+
+
+def test_translate_parallel():
+    """Compiling in more than one process gives exactly the same result."""
+
+    def translate(jobs):
+        translator = BUNDLED_PLATFORM.translator()
+        translator.preamble()
+        translate_dir(translator, BUNDLED_PLATFORM, "examples/project_11/Pong", jobs=jobs)
+        translate_library(translator, BUNDLED_PLATFORM, jobs=jobs)
+        translator.finish()
+        return list(translator.asm)
+
+    assert translate(jobs=3) == translate(jobs=1)
+
+
+def translate_pruned(platform, path):
+    translator = PruningTranslator(platform.translator())
+    translator.preamble()
+    translate_dir(translator, platform, path)
+    translate_library(translator, platform)
+    translator.finish()
+    return translator
+
+
+def test_prune_unreachable():
+    translator = translate_pruned(BUNDLED_PLATFORM, "examples/project_11/Pong")
+    translator.check_references()
+
+    assert "Screen.drawCircle" in translator.dropped_functions
+    assert "String.intValue" in translator.dropped_functions
+    assert "Sys.init" in translator.kept_functions
+    assert "Bat.move" in translator.kept_functions
+
+    full = BUNDLED_PLATFORM.translator()
+    full.preamble()
+    translate_dir(full, BUNDLED_PLATFORM, "examples/project_11/Pong")
+    translate_library(full, BUNDLED_PLATFORM)
+    full.finish()
+
+    assert translator.words_saved() == full.asm.instruction_count - translator.asm.instruction_count
+    assert translator.words_saved() > 3_000
+
+
+def test_pruned_program_runs():
+    translator = translate_pruned(BUNDLED_PLATFORM, "examples/project_12/MathTest.jack")
+
+    computer = run(BUNDLED_PLATFORM.chip)
+    translator.asm.run(BUNDLED_PLATFORM.assemble, computer, stop_cycles=1_000_000)
+
+    assert computer.peek(8000) == 6       # multiply(2, 3)
+    assert computer.peek(8005) == 3       # divide(9, 3)
+    assert computer.peek(8009) == 181     # sqrt(32767)
+
+
+def test_reachable_functions():
+    ops = [
+        ("function", ("Main", "main", 0)),
+        ("call", ("Main", "f", 0)),
+        ("return_op", ()),
+        ("function", ("Main", "f", 0)),
+        ("return_op", ()),
+        ("function", ("Main", "g", 0)),
+        ("call", ("Main", "main", 0)),
+        ("return_op", ()),
+    ]
+    functions = vm_functions(ops)
+
+    assert [(name, len(fn_ops), refs) for name, fn_ops, refs in functions] == [
+        ("Main.main", 3, {"Main.f"}),
+        ("Main.f", 2, set()),
+        ("Main.g", 3, {"Main.main"}),
+    ]
+    assert reachable_functions(functions, ["Main.main"]) == {"Main.main", "Main.f"}
+    assert reachable_functions(functions, ["Main.g"]) == {"Main.main", "Main.f", "Main.g"}
+
+
+LOOP_OPS = [
+    ("label", ("LOOP",)),
+    ("push_local", (0,)),
+    ("push_local", (1,)),
+    ("add", ()),
+    ("push_constant", (10,)),
+    ("lt", ()),
+    ("not_op", ()),
+    ("if_goto", ("END",)),
+    ("push_local", (0,)),
+    ("push_constant", (1,)),
+    ("add", ()),
+    ("pop_local", (0,)),
+    ("goto", ("LOOP",)),
+    ("label", ("END",)),
+]
+
+
+def test_fuse_ops():
+    fused = fuse_ops(LOOP_OPS, FUSED_OP_NAMES)
+
+    assert fused == [
+        ("label", ("LOOP",)),
+        ("add_locals", (0, 1)),
+        ("push_constant", (10,)),
+        ("if_compare_goto", ("GE", "END")),
+        ("push_local", (0,)),
+        ("add_constant", (1,)),
+        ("pop_local", (0,)),
+        ("goto", ("LOOP",)),
+        ("label", ("END",)),
+    ]
+    assert [o for op in fused for o in (expand_op(op) if op[0] in FUSED_OP_NAMES else [op])] == LOOP_OPS
+
+    assert fuse_ops(LOOP_OPS, ["if_not_goto"])[5:7] == [("lt", ()), ("if_not_goto", ("END",))]
+    assert fuse_ops(LOOP_OPS, []) == LOOP_OPS
+
+
+def test_if_not_goto(platform=BUNDLED_PLATFORM, simulator='codegen'):
+    """`not; if-goto` branches for any value but -1 (true), not only for 0 (false)."""
+
+    values = [0, -1, 4, -2]
+    ops = []
+    for i, value in enumerate(values):
+        ops += [("push_constant", (abs(value),))]
+        if value < 0:
+            ops += [("neg", ())]
+        ops += [
+            ("not_op", ()),
+            ("if_goto", (f"TAKEN{i}",)),
+            ("goto", (f"NEXT{i}",)),
+            ("label", (f"TAKEN{i}",)),
+            ("push_constant", (1,)),
+            ("pop_temp", (i,)),
+            ("label", (f"NEXT{i}",)),
+        ]
+
+    translator = platform.translator()
+    assert ("if_not_goto", ("TAKEN2",)) in translator.rewrite_ops(ops)
+    translate_ops(translator, ops)
+    translator.finish()
+
+    computer = run(platform.chip, simulator=simulator)
+    computer.poke(0, 256)
+    translator.asm.run(platform.assemble, computer, stop_cycles=500)
+
+    assert [computer.peek(5 + i) for i in range(len(values))] == [1, 0, 1, 1]
+
+
+def test_fused_op_fallback():
+    """A translator that doesn't implement a fused op gets the original ops instead."""
+
+    class Recorder:
+        def __init__(self):
+            self.ops = []
+        def rewrite_ops(self, ops):
+            return fuse_ops(ops, FUSED_OP_NAMES)
+        def handle(self, op):
+            self.ops.append(op)
+        def add_constant(self, value):
+            pass
+
+    translator = Recorder()
+    translate_ops(translator, LOOP_OPS)
+
+    assert ("add_constant", (1,)) in translator.ops
+    assert ("add_locals", (0, 1)) not in translator.ops
+    assert translator.ops[1:4] == LOOP_OPS[1:4]
@@ -138,4 +138,81 @@ def test_back_edges_goofy():
     nv, _ = synthesize(ic)
     assert nv.non_back_edge_mask == 0b011  # i.e. not nand2, yes nand1 and reset
 
-    
\ No newline at end of file
+    
+
+def test_screen_dirty():
+    import nand.syntax
+    import project_05
+    from nand.test_codegen import SCREEN_PROGRAM
+
+    computer = nand.syntax.run(project_05.Computer, simulator="vector")
+
+    # Initially, the whole screen needs to be drawn:
+    assert computer.take_screen_dirty() == set(range(0x2000))
+    assert computer.take_screen_dirty() == set()
+
+    computer.init_rom(SCREEN_PROGRAM)
+    for _ in range(len(SCREEN_PROGRAM)):
+        computer.ticktock()
+    assert computer.peek_screen(0x0021) == -1
+    assert computer.screen_buffer()[0x0021] == -1
+    assert len(computer.screen_buffer()) == 0x2000
+    assert computer.take_screen_dirty() == {0x0021, 0x1FFF}
+
+    computer.poke(100, 1)
+    computer.poke_screen(5, 1)
+    assert computer.take_screen_dirty() == {5}
+
+
+def test_tty_log():
+    import nand.syntax
+    import project_05
+    from nand.test_codegen import TTY_PROGRAM
+
+    computer = nand.syntax.run(project_05.Computer, simulator="vector")
+    computer.init_rom(TTY_PROGRAM)
+
+    assert computer.take_tty_log() == []
+
+    for _ in range(len(TTY_PROGRAM)):
+        computer.ticktock()
+
+    assert computer.take_tty_log() == [1, -1]
+    assert computer.get_tty() == -1
+    assert computer.take_tty_log() == []
+
+
+def test_ticktock_until():
+    import nand.syntax
+    import project_05
+    from nand.test_codegen import LOOP_PROGRAM
+
+    computer = nand.syntax.run(project_05.Computer, simulator="vector")
+    computer.init_rom(LOOP_PROGRAM)
+
+    assert computer.ticktock_until(100, {3}) == 3
+    assert computer.pc == 3
+
+    assert computer.ticktock_until(100, {0, 3}) == 1
+    assert computer.pc == 0
+
+    assert computer.ticktock_until(10, {100}) == 10
+    assert computer.peek(0) == 4
+
+
+def test_ticktock_until_changed():
+    import nand.syntax
+    import project_05
+    from nand.test_codegen import LOOP_PROGRAM
+
+    computer = nand.syntax.run(project_05.Computer, simulator="vector")
+    computer.init_rom(LOOP_PROGRAM)
+
+    assert computer.ticktock_until_changed(100, 0) == 2
+    assert computer.peek(0) == 1
+    assert computer.ticktock_until_changed(100, 0) == 4
+    assert computer.peek(0) == 2
+
+    assert computer.ticktock_until_changed(10, 1) == 10
+    assert computer.ticktock_until_changed(10, 0x4000) == 10
+    assert computer.peek(0) == 7
@@ -1,3 +1,5 @@
+import bisect
+import multiprocessing
 import os
 import re
 
@@ -12,20 +14,37 @@ class AssemblySource:
     but the nomenclature is certainly confusing, and the src_map feature doesn't make sense
     since "instruction" (opcode) counts aren't significant.
     TODO: pull out "VMSource" as a separate type.
+
+    Each line is recorded as a tuple, so an assembler doesn't have to parse the text again (see
+    solved_06.assemble()):
+    - ("label", name)
+    - ("a", text, value): an A-instruction, where value is a symbol, or an int for a numeric value
+    - ("instr", text): any other instruction (for Hack, a C-instruction)
+    - ("comment", text)
+    - ("blank",)
+    - ("raw", text): anything at all (see add_line_raw()), to be parsed by the assembler
+    The text of each line is only formatted when it's needed (`lines`, iteration, or pretty().)
     """
 
     def __init__(self):
         self.seq = 0
         self.instruction_count = 0
-        self.lines = []
-        self.src_map = {}
+        self.stream = []
+        self.src_map = SourceMap()
+
+        self.label_scope = None
+        """If not None, generated labels are prefixed with this, so they can't collide with labels
+        generated for other code that's translated separately (see nand.link.)"""
 
 
     def next_label(self, name):
-        """Generate a unique label starting with `name`.
+        """Generate a unique label based on `name`.
         """
 
-        result = f"{name}_{self.seq}"
+        if self.label_scope is None:
+            result = f"{name}_{self.seq}"
+        else:
+            result = f"{self.label_scope}${name}_{self.seq}"
         self.seq += 1
         return result
 
@@ -35,37 +54,48 @@ class AssemblySource:
         and a comment is automatically inserted.
         """
 
-        self.src_map[self.instruction_count] = op
+        self.src_map.add(self.instruction_count, op)
         self.comment(f"{self.instruction_count}: {op}")
 
 
     def comment(self, comment):
         """Add a comment line to the instruction stream, but do not record it as the location of an opcode."""
-        self.lines.append(f"// {comment}")
+        self.stream.append(("comment", comment))
 
 
     def label(self, name):
-        self.lines.append(f"({name})")
+        self.stream.append(("label", name))
 
 
     def instr(self, instr):
         instr = instr.strip()
         if instr.startswith("/") or instr.startswith("("):
             raise SyntaxError(f"Expected an instruction (not a comment or label); found {instr!r}")
-        self.lines.append(f"  {instr}")
+        m = A_INSTR_PATTERN.fullmatch(instr)
+        if m and m.group(1):
+            self.stream.append(("a", instr, int(m.group(1), 0)))
+        elif m:
+            self.stream.append(("a", instr, m.group(2)))
+        else:
+            self.stream.append(("instr", instr))
         self.instruction_count += 1
 
 
     def blank(self):
-        self.lines.append("")
+        self.stream.append(("blank",))
 
 
     def add_line_raw(self, value):
         """Add a "line" to the stream without any sanity checking or tracking. Useful for hacks."""
-        self.lines.append(value)
+        self.stream.append(("raw", value))
+
+    @property
+    def lines(self):
+        """The text of every line, as a list."""
+        return list(self)
 
     def __iter__(self):
-        return self.lines.__iter__()
+        return (format_line(item) for item in self.stream)
 
 
     def find_function(self, class_name, function_name):
@@ -79,39 +109,26 @@ class AssemblySource:
 
         Note: the point is that you can tell that you're leaving the function when one of its
         returns is executed, even if it has made some subroutine calls in the meantime.
-        """
-
-        start = None
 
-        # Note: reversed, so we always find the _last_ occurrence, in case the function has been overridden
-        for addr, op in sorted(self.src_map.items(), reverse=True):
-            if op.startswith(f"function {class_name}.{function_name} "):
-                start = addr
-                break
+        See SourceMap.find_function() for more detail.
+        """
 
-        if start is None:
+        fn = self.src_map.find_function(class_name, function_name)
+        if fn is None:
             return None
-
-        ends = []
-        for addr, op in [t for t in sorted(self.src_map.items()) if t[0] > start]:
-            if op == "return":
-                ends.append(addr)
-            elif op.startswith("function"):
-                if ends == []:
-                    ends.append(addr-1)  # somewhat bogus, but don't want to trigger if we hit the exact start of the next fn.
-                break
-
-        if ends == []:
+        elif fn.returns:
+            return fn.start, fn.returns
+        elif fn.end is not None:
+            return fn.start, [fn.end - 1]  # somewhat bogus, but don't want to trigger if we hit the exact start of the next fn.
+        else:
             # Must be Sys.halt (which is allowed to have no "return"), and must be the last in ROM.
-            ends.append(self.instruction_count)
-
-        return start, ends
+            return fn.start, [self.instruction_count]
 
 
     def pretty(self, start_addr=0):
         """Lines of code, including the location in ROM of each instruction, as a geneerator."""
         loc = start_addr
-        for l in self.lines:
+        for l in self:
             raw = l.strip()
             if raw == "" or raw.startswith("//"):
                 yield f"         {l}"
@@ -140,7 +157,7 @@ class AssemblySource:
 
         if debug:
             # print_lines(self.lines)
-            print('\n'.join(self.lines))
+            print('\n'.join(self))
             print()
 
         asm, symbols, statics = assembler(self)
@@ -237,39 +254,207 @@ class AssemblySource:
                     tty.write(chr(c))
 
 
+class SourceMap:
+    """The ops (e.g. VM opcodes) whose instructions start at each location in ROM.
+
+    More than one op can start at the same address, when all but the last of them emit no
+    instructions of their own (e.g. "label", or "function" for a function with no locals), so each
+    address maps to a list of ops, in the order they were added. `src_map[addr]` and `get()`
+    give the last one, which is the op whose instructions are actually found there.
+
+    The addresses are also kept in order, so finding the op containing any address (i.e. the
+    nearest one at or before it) is a binary search. The range of addresses covered by each
+    function is worked out when it's first needed, and kept until another op is added.
+    """
+
+    def __init__(self):
+        self._ops = {}    # address -> [op]
+        self._addrs = []  # sorted
+        self._functions = None  # see _index_functions()
+        self._function_starts = None
+        self._functions_by_name = None
+
+    def add(self, addr, op):
+        ops = self._ops.get(addr)
+        if ops is not None:
+            ops.append(op)
+        else:
+            self._ops[addr] = [op]
+            if self._addrs and addr < self._addrs[-1]:
+                bisect.insort(self._addrs, addr)
+            else:
+                self._addrs.append(addr)
+        self._functions = None
+
+    def __len__(self):
+        return len(self._addrs)
+
+    def __iter__(self):
+        """Each address where some op starts, in order."""
+        return iter(self._addrs)
+
+    def __contains__(self, addr):
+        return addr in self._ops
+
+    def __getitem__(self, addr):
+        return self._ops[addr][-1]
+
+    def get(self, addr, default=None):
+        ops = self._ops.get(addr)
+        return ops[-1] if ops is not None else default
+
+    def ops_at(self, addr):
+        """All the ops starting at an address, possibly none."""
+        return self._ops.get(addr, ())
+
+    def items(self):
+        """(address, op) for every op, in order of address."""
+        return ((addr, op) for addr in self._addrs for op in self._ops[addr])
+
+    def op_containing(self, addr):
+        """(address, op) for the op whose instructions include `addr`, or None if it comes before
+        any op.
+        """
+
+        i = bisect.bisect_right(self._addrs, addr) - 1
+        if i < 0:
+            return None
+        start = self._addrs[i]
+        return start, self._ops[start][-1]
+
+    @property
+    def functions(self):
+        """A FunctionRange for each "function" op, in order of address."""
+        self._index_functions()
+        return self._functions
+
+    def function_containing(self, addr):
+        """The FunctionRange for the function whose instructions include `addr`, or None."""
+
+        self._index_functions()
+        i = bisect.bisect_right(self._function_starts, addr) - 1
+        if i < 0 or addr not in self._functions[i]:
+            return None
+        return self._functions[i]
+
+    def find_function(self, class_name, function_name):
+        """The FunctionRange for a function, or None if there's no such function.
+
+        If the same function appears more than once, the last one is found, because that's the
+        one the assembler will use (see override_sys_wait().)
+        """
+
+        self._index_functions()
+        return self._functions_by_name.get(f"{class_name}.{function_name}")
+
+    def _index_functions(self):
+        if self._functions is not None:
+            return
+
+        functions = []
+        for addr, op in self.items():
+            if op.startswith("function "):
+                if functions:
+                    functions[-1].end = addr
+                functions.append(FunctionRange(op.split()[1], addr))
+            elif op == "return" and functions:
+                functions[-1].returns.append(addr)
+        self._functions = functions
+        self._function_starts = [fn.start for fn in functions]
+        self._functions_by_name = {fn.name: fn for fn in functions}
+
+
+class FunctionRange:
+    """The location of a function's instructions: from the "function" op at `start`, up to the
+    next function's `start` (`end`, or None for the last function in ROM), with the address of
+    each "return" op in between.
+    """
+
+    def __init__(self, name, start):
+        self.name = name
+        self.start = start
+        self.end = None
+        self.returns = []
+
+    def __contains__(self, addr):
+        return self.start <= addr and (self.end is None or addr < self.end)
+
+    def __repr__(self):
+        return f"FunctionRange({self.name!r}, {self.start}, {self.end}, {self.returns})"
+
+
+A_INSTR_PATTERN = re.compile(r"@(?:(0x[0-9a-fA-F]+|[1-9][0-9]*|0)|(\D.*))")
+"""An A-instruction: either a numeric value (decimal or hex), or a symbol."""
+
+
+def format_line(item):
+    """The text of a line of assembly, given one of the tuples recorded by AssemblySource."""
+
+    kind = item[0]
+    if kind == "a" or kind == "instr":
+        return f"  {item[1]}"
+    elif kind == "label":
+        return f"({item[1]})"
+    elif kind == "comment":
+        return f"// {item[1]}"
+    elif kind == "blank":
+        return ""
+    else:
+        return item[1]
+
+
 # TODO: not necessarily a dir_path anymore
-def translate_dir(translator, platform, path, print_ops=False):
+def translate_dir(translator, platform, path, print_ops=False, jobs=1):
     """Compile/translate Jack/VM programs from a directory or file,
     feeding the resulting VM instructions through the given translator.
+
+    With `jobs` > 1, the files are parsed and compiled in that many processes (see parallel_map()),
+    and the ops are translated here, in the usual order, so the result is the same.
     """
 
-    def load_file(file_path):
-        if file_path.endswith(".vm"):
-            # print(f"// Loading VM source: {file_path}")
-            with open(file_path, mode='r') as f:
-                ops = [platform.parse_line(l) for l in f if platform.parse_line(l) is not None]
-            translate_ops(translator, ops)
+    if os.path.isdir(path):
+        file_paths = [os.path.join(path, fn) for fn in os.listdir(path)]
+    else:
+        file_paths = [path]
 
-        elif file_path.endswith(".jack"):
-            # print(f"// Loading Jack source: {file_path}")
-            with open(file_path, mode='r') as f:
-                chars = "\n".join(f.readlines())
-                translate_jack(translator, platform, chars, print_ops)
+    for lines, ops in parallel_map(platform, _compile_file, file_paths, jobs):
+        if print_ops:
+            for l in lines: print(f"    {l}")
+        translate_ops(translator, ops)
 
-        else:
-            raise Exception(f"Don't know what to do with file: {file_path}")
 
-    if os.path.isdir(path):
-        for fn in os.listdir(path):
-            load_file(os.path.join(path, fn))
+def _compile_file(platform, file_path):
+    """VM ops from a file, and the lines of VM code they came from, if it was Jack source."""
+
+    if file_path.endswith(".vm"):
+        # print(f"// Loading VM source: {file_path}")
+        with open(file_path, mode='r') as f:
+            ops = [platform.parse_line(l) for l in f if platform.parse_line(l) is not None]
+        return [], ops
+
+    elif file_path.endswith(".jack"):
+        # print(f"// Loading Jack source: {file_path}")
+        with open(file_path, mode='r') as f:
+            chars = f.read()
+        return _compile_jack(platform, chars)
+
     else:
-        load_file(path)
+        raise Exception(f"Don't know what to do with file: {file_path}")
 
 
 def translate_jack(translator, platform, src, print_ops=False):
     """Compile Jack source code, then run the resulting VM instructions through the given translator.
     """
 
+    lines, ops = _compile_jack(platform, src)
+
+    if print_ops:
+        for l in lines: print(f"    {l}")
+
+    translate_ops(translator, ops)
+
+
+def _compile_jack(platform, src):
     if isinstance(src, str):
         ast = platform.parser(src)
     else:
@@ -280,12 +465,9 @@ def translate_jack(translator, platform, src, print_ops=False):
     asm = AssemblySource()
     platform.compiler(ast, asm)
 
-    if print_ops:
-        for l in asm.lines: print(f"    {l}")
-
-    ops = [platform.parse_line(l) for l in asm.lines if platform.parse_line(l) is not None]
-
-    translate_ops(translator, ops)
+    lines = asm.lines
+    ops = [platform.parse_line(l) for l in lines if platform.parse_line(l) is not None]
+    return lines, ops
 
 
 def translate_ops(translator, ops):
@@ -299,26 +481,284 @@ def translate_ops(translator, ops):
 
     better_ops = translator.rewrite_ops(ops)
     for op in better_ops:
-        translator.handle(op)
+        if op[0] in FUSED_OP_NAMES and not hasattr(translator, op[0]):
+            for original_op in expand_op(op):
+                translator.handle(original_op)
+        else:
+            translator.handle(op)
+
+
+class Fusion:
+    """A "superinstruction": a single op that does the work of a fixed sequence of VM ops, so a
+    translator can generate one, more efficient, sequence of instructions for the whole thing.
+
+    `pattern` is the sequence of ops, each an op name followed by the names of its arguments, which
+    are captured when the pattern matches. The fused op's arguments are `fixed` (which tell apart
+    the different patterns that share the same fused op), followed by the captured arguments.
+
+    For example, `Fusion("add_constant", [("push_constant", "n"), ("add",)])` matches
+    `push constant 5; add`, giving the op `("add_constant", (5,))`.
+    """
+
+    def __init__(self, name, pattern, fixed=()):
+        self.name = name
+        self.pattern = pattern
+        self.fixed = fixed
+
+    def match(self, ops, i):
+        """If the ops starting at index i match, the fused op, otherwise None."""
+
+        if i + len(self.pattern) > len(ops):
+            return None
+        captured = []
+        for (op_name, *arg_names), op in zip(self.pattern, ops[i:]):
+            if not isinstance(op, tuple) or op[0] != op_name or len(op[1]) != len(arg_names):
+                return None
+            captured.extend(op[1])
+        return (self.name, self.fixed + tuple(captured))
+
+    def expand(self, args):
+        """The original ops, given the fused op's args."""
+
+        captured = list(args[len(self.fixed):])
+        result = []
+        for op_name, *arg_names in self.pattern:
+            result.append((op_name, tuple(captured[:len(arg_names)])))
+            captured = captured[len(arg_names):]
+        return result
+
+
+FUSIONS = [
+    # A comparison followed by a branch never needs to materialize the boolean; the jump condition
+    # is the one used by the "J" part of a Hack instruction (e.g. "LT" for "D;JLT").
+    Fusion("if_compare_goto", [("eq",), ("not_op",), ("if_goto", "label")], ("NE",)),
+    Fusion("if_compare_goto", [("lt",), ("not_op",), ("if_goto", "label")], ("GE",)),
+    Fusion("if_compare_goto", [("gt",), ("not_op",), ("if_goto", "label")], ("LE",)),
+    Fusion("if_compare_goto", [("eq",), ("if_goto", "label")], ("EQ",)),
+    Fusion("if_compare_goto", [("lt",), ("if_goto", "label")], ("LT",)),
+    Fusion("if_compare_goto", [("gt",), ("if_goto", "label")], ("GT",)),
+    Fusion("if_not_goto", [("not_op",), ("if_goto", "label")]),
+
+    Fusion("add_locals", [("push_local", "i"), ("push_local", "j"), ("add",)]),
+    Fusion("add_constant", [("push_constant", "n"), ("add",)]),
+    Fusion("sub_constant", [("push_constant", "n"), ("sub",)]),
+]
+"""All the fused ops, in the order they're tried (so longer patterns go first.)"""
+
+FUSED_OP_NAMES = {f.name for f in FUSIONS}
+
+
+def fuse_ops(ops, names):
+    """Replace each sequence of ops that matches one of the FUSIONS with the fused op, but only
+    for the fused ops in `names` (usually the ones a translator implements.)
+    """
+
+    fusions = [f for f in FUSIONS if f.name in names]
+    if not fusions:
+        return ops
+
+    result = []
+    i = 0
+    while i < len(ops):
+        for f in fusions:
+            fused = f.match(ops, i)
+            if fused is not None:
+                result.append(fused)
+                i += len(f.pattern)
+                break
+        else:
+            result.append(ops[i])
+            i += 1
+    return result
+
+
+def expand_op(op):
+    """The original VM ops making up a fused op."""
+
+    name, args = op
+    for f in FUSIONS:
+        if f.name == name and args[:len(f.fixed)] == f.fixed:
+            return f.expand(args)
+    raise Exception(f"Not a fused op: {op}")
+
+
+def format_op(op):
+    """VM source for an op, as it would appear in a .vm file."""
+
+    name, args = op
+    if name in ("and_op", "or_op", "not_op", "return_op"):
+        name = name[:-len("_op")]
+    elif name.startswith("push_") or name.startswith("pop_"):
+        name = name.replace("_", " ", 1)
+    elif name == "if_goto":
+        name = "if-goto"
+    elif name in ("function", "call"):
+        return f"{name} {args[0]}.{args[1]} {args[2]}"
+    return " ".join([name] + [str(a) for a in args])
+
+
+class PruningTranslator:
+    """Wraps any translator, and leaves out every function that can't be reached from Sys.init.
+
+    Ops are collected as they're handed over (after the translator's own rewrite_ops()), and
+    nothing is translated until finish(), when the whole program is known. Then the call graph is
+    traced from `roots`, and only the functions that can be reached are passed to the translator,
+    in their original order. Anything else (preamble(), asm, check_references(), etc.) goes
+    straight to the translator.
+
+    The standard OS is about half of the ROM in a program like Pong, and much of it (e.g.
+    Screen.drawCircle, most of String) is never used.
+
+    Ops are split into functions by `split_functions()`, if the translator has one (for
+    translators that don't handle VM ops; see alt/reg.py), otherwise by vm_functions(). After
+    finish(), words_saved() tells how much smaller the program is.
+    """
+
+    def __init__(self, translator, roots=("Sys.init",)):
+        self.translator = translator
+        self.roots = roots
+        self.ops = []
+        self.kept_functions = None
+        self.dropped_functions = None
+        self._dropped_ops = None
+
+    def __getattr__(self, name):
+        return getattr(self.translator, name)
+
+    def handle(self, op):
+        if self.kept_functions is None:
+            self.ops.append(op)
+        else:
+            # After finish() (e.g. override_sys_wait()), there's nothing left to decide:
+            self.translator.handle(op)
+
+    def finish(self):
+        split = getattr(self.translator, "split_functions", vm_functions)
+        functions = split(self.ops)
+        reachable = reachable_functions(functions, self.roots)
+
+        self.kept_functions = []
+        self.dropped_functions = []
+        self._dropped_ops = []
+        for name, ops, _ in functions:
+            if name is None or name in reachable:
+                self.kept_functions.append(name)
+                for op in ops:
+                    self.translator.handle(op)
+            else:
+                self.dropped_functions.append(name)
+                self._dropped_ops.extend(ops)
+        self.ops = []
+
+        self.translator.finish()
+
+    def words_saved(self):
+        """Number of instructions the dropped functions would have taken up, found by translating
+        them separately, with a new translator of the same type (compared to one that translates
+        nothing, since finish() may also change the runtime code.)
+        """
+
+        def count(ops):
+            scratch = type(self.translator)()
+            for op in ops:
+                scratch.handle(op)
+            scratch.finish()
+            return scratch.asm.instruction_count
+
+        return count(self._dropped_ops) - count([])
+
+
+def vm_functions(ops):
+    """Split VM ops into functions, each starting with a "function" op.
+
+    Returns a list of tuples (function name, [ops], {names of functions it refers to}). Any ops
+    ahead of the first function are grouped under the name None.
+    """
+
+    result = []
+    name, fn_ops, refs = None, [], set()
+    for op in ops:
+        op_name, args = op
+        if op_name == "function":
+            if fn_ops:
+                result.append((name, fn_ops, refs))
+            name, fn_ops, refs = f"{args[0]}.{args[1]}", [], set()
+        elif op_name == "call":
+            refs.add(f"{args[0]}.{args[1]}")
+        fn_ops.append(op)
+    if fn_ops:
+        result.append((name, fn_ops, refs))
+    return result
+
+
+def reachable_functions(functions, roots):
+    """Names of all the functions that are reachable from the roots, following the references
+    from vm_functions() (or a translator's split_functions()).
+
+    A function that's defined more than once (see override_sys_wait()) refers to everything any
+    of its definitions refers to.
+    """
+
+    refs = {}
+    for name, _, fn_refs in functions:
+        refs.setdefault(name, set()).update(fn_refs)
+
+    reachable = set()
+    pending = list(roots)
+    while pending:
+        name = pending.pop()
+        if name not in reachable:
+            reachable.add(name)
+            pending.extend(refs.get(name, ()))
+    return reachable
 
 
 EXTERNAL_LIBRARY_PATH = None
 # EXTERNAL_LIBRARY_PATH = "nand2tetris/tools/OS"
 
-def translate_library(translator, platform):
+def translate_library(translator, platform, jobs=1):
+    """Compile/translate the OS classes. See translate_dir() for `jobs`."""
+
     if EXTERNAL_LIBRARY_PATH is None:
-        for lib_class in platform.library:
-            ast = lib_class
+        for _, ops in parallel_map(platform, _compile_library_class, range(len(platform.library)), jobs):
+            translate_ops(translator, ops)
 
-            asm = AssemblySource()
-            platform.compiler(ast, asm)
+    else:
+        translate_dir(translator, platform, EXTERNAL_LIBRARY_PATH, jobs=jobs)
 
-            ops = [platform.parse_line(l) for l in asm.lines if platform.parse_line(l) is not None]
 
-            translate_ops(translator, ops)
+def _compile_library_class(platform, index):
+    return _compile_jack(platform, platform.library[index])
 
-    else:
-        translate_dir(translator, platform, EXTERNAL_LIBRARY_PATH)
+
+def parallel_map(platform, fn, items, jobs=1):
+    """Call `fn(platform, item)` for each item, using up to `jobs` processes, and return the
+    results in order.
+
+    The worker processes are forked, so they get the platform (and fn) without pickling (which
+    doesn't work for some platforms; see alt/reduce.py); the items and results are pickled. Where
+    fork isn't available (i.e. Windows), or with only one job, everything just happens here.
+    """
+
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return [fn(platform, item) for item in items]
+
+    context = multiprocessing.get_context("fork")
+    with context.Pool(min(jobs, len(items)), initializer=_init_worker, initargs=(platform, fn)) as pool:
+        return pool.map(_call_worker, items, chunksize=1)
+
+
+_worker_platform = None
+_worker_fn = None
+
+def _init_worker(platform, fn):
+    global _worker_platform, _worker_fn
+    _worker_platform = platform
+    _worker_fn = fn
+
+def _call_worker(item):
+    return _worker_fn(_worker_platform, item)
 
 
 def override_sys_wait(translator, platform):
@@ -332,9 +772,5 @@ def override_sys_wait(translator, platform):
     so here we just define the one we want to override, translate it last, and count on the
     assembler to favor the later occurrence of the label.
     """
-    asm = AssemblySource()
-    platform.compiler(platform.parser("class Sys { function void wait() { return; } }"), asm)
-    for op in translator.rewrite_ops(asm.lines):
-        parsed_op = platform.parse_line(op)
-        if parsed_op is not None:
-            translator.handle(parsed_op)
+    _, ops = _compile_jack(platform, "class Sys { function void wait() { return; } }")
+    translate_ops(translator, ops)
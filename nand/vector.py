@@ -207,6 +207,7 @@ class RAMOps(VectorOps):
     def __init__(self, comp):
         self.comp = comp
         self.storage = [0]*(2**comp.address_bits)
+        self.dirty = None
 
     def get(self, address):
         """Peek at the value in a single cell."""
@@ -215,10 +216,12 @@ class RAMOps(VectorOps):
     def set(self, address, value):
         """Poke a value into a single cell.
 
-        TODO: keep track of which cells are updated, for efficient updates when used as the
-        screen buffer?
+        If `dirty` has been set to a set (as it is for the screen buffer), the address is added
+        to it, so that a display can redraw only what has changed.
         """
         self.storage[address] = value
+        if self.dirty is not None:
+            self.dirty.add(address)
 
     def combine(self, address, out, **_unused):
         """Note: only using one of the inputs."""
@@ -270,6 +273,7 @@ class OutputOps(VectorOps):
     def __init__(self, comp):
         self.comp = comp
         self.value = 0
+        self.log = None
 
     def read(self):
         """Consume the last-written value, if any, and reset to 0."""
@@ -291,6 +295,8 @@ class OutputOps(VectorOps):
             if load_val:
                 in_val = extend_sign(get_multiple_traces(in_, traces))
                 self.value = in_val
+                if self.log is not None:
+                    self.log.append(in_val)
                 set_trace(ready[0], in_val == 0, traces)
             return traces
         return [custom_op(write)]
@@ -547,6 +553,9 @@ class NandVectorWrapper:
                                    key=lambda c: c.comp.address_bits, reverse=True)
         self._mem = nth(rams_by_size_desc, 0)
         self._screen = nth(rams_by_size_desc, 1)
+        if self._screen is not None:
+            # Every word is initially dirty, so the first update draws everything:
+            self._screen.dirty = set(range(len(self._screen.storage)))
         self._keyboard = nth((c for c in self._stateful if isinstance(c, InputOps)), 0)
         self._tty = nth((c for c in self._stateful if isinstance(c, OutputOps)), 0)
 
@@ -579,6 +588,29 @@ class NandVectorWrapper:
             self.tick()
             self.tock()
 
+    def ticktock_until(self, cycles, stop):
+        """Run up to `cycles` cycles, stopping early as soon as the PC is one of the addresses in
+        `stop` (a set), after at least one cycle. Returns the number of cycles actually run.
+        """
+        for n in range(1, cycles + 1):
+            self.ticktock()
+            if self.pc in stop:
+                return n
+        return cycles
+
+    def ticktock_until_changed(self, cycles, address):
+        """Run up to `cycles` cycles, stopping early as soon as the word at `address` (in RAM, or
+        the screen, at 0x4000 and up) has a different value than it had at the start. Returns the
+        number of cycles actually run.
+        """
+        peek = self.peek if address < 0x4000 else lambda a: self.peek_screen(a - 0x4000)
+        prev = peek(address)
+        for n in range(1, cycles + 1):
+            self.ticktock()
+            if peek(address) != prev:
+                return n
+        return cycles
+
     def __getattr__(self, name):
         """Get the value of a single- or multiple-bit output."""
 
@@ -692,7 +724,32 @@ class NandVectorWrapper:
         if self._screen is None:
             raise MissingComponent("No separate screen RAM present")
 
-        self._screen.storage[address] = value
+        self._screen.set(address, value)
+
+    def screen_buffer(self):
+        """The entire contents of the separate display RAM, as a list of words.
+
+        Note: this is the actual storage, not a copy, so it reflects any later writes.
+        """
+
+        if self._screen is None:
+            raise MissingComponent("No separate screen RAM present")
+
+        return self._screen.storage
+
+    def take_screen_dirty(self):
+        """Return the set of addresses in the display RAM that have been written since the
+        last call, and start tracking again from scratch.
+
+        On the first call, every address is included, since nothing has been drawn yet.
+        """
+
+        if self._screen is None:
+            raise MissingComponent("No separate screen RAM present")
+
+        dirty = self._screen.dirty
+        self._screen.dirty = set()
+        return dirty
 
     def peek_rom(self, address):
         """Read a single word from the Computer's ROM."""
@@ -702,6 +759,36 @@ class NandVectorWrapper:
 
         return self._rom.storage[address]
 
+    def save_state(self):
+        """Capture the complete state of the computer (every trace, which includes the registers,
+        plus the contents of the RAMs and the TTY port), as a dict of plain values that can be
+        compared, or handed back to load_state() later.
+
+        The ROM and the keyboard (which is an input) are not included.
+        """
+
+        state = {"traces": self._vector.traces}
+        if self._mem is not None:
+            state["ram"] = list(self._mem.storage)
+        if self._screen is not None:
+            state["screen"] = list(self._screen.storage)
+        if self._tty is not None:
+            state["tty"] = self._tty.value
+        return state
+
+    def load_state(self, state):
+        """Restore the state captured by save_state(). If the screen is different, it's all marked dirty."""
+
+        self._vector.traces = state["traces"]
+        self._vector.dirty = True
+        if self._mem is not None:
+            self._mem.storage[:] = state["ram"]
+        if self._screen is not None and state["screen"] != self._screen.storage:
+            self._screen.storage[:] = state["screen"]
+            self._screen.dirty = set(range(len(self._screen.storage)))
+        if self._tty is not None:
+            self._tty.value = state["tty"]
+
     def set_keydown(self, keycode):
         """Provide the code which identifies a single key which is currently pressed."""
 
@@ -720,6 +807,20 @@ class NandVectorWrapper:
         self._vector.dirty = True
         return self._tty.read()
 
+    def take_tty_log(self):
+        """Read every word that has been written to the tty port since the last call.
+
+        get_tty() sees only the most recent value, so when running many cycles at a time, any
+        earlier values are lost. The first call starts the log, so it always returns [].
+        """
+
+        if self._tty is None:
+            raise MissingComponent("No Output present")
+
+        log = self._tty.log or []
+        self._tty.log = []
+        return log
+
     # Tricky: SP might get special treatment in some implementations, so provide a named property
     # that subclasses can override.
     @property
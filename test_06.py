@@ -141,3 +141,75 @@ def test_load_pong():
     assert statics2["screen.0"] == 29
 
     assert ops2 == ops1
+
+
+def test_load_assembly_source():
+    """An AssemblySource is assembled straight from its structured lines, with the same result
+    as assembling its text."""
+
+    from nand.translate import AssemblySource
+
+    asm = AssemblySource()
+    asm.comment("Max, more or less")
+    asm.instr("@R0")
+    asm.instr("D=M")
+    asm.instr("@x")
+    asm.instr("D=D-M")
+    asm.instr("@OUTPUT_FIRST")
+    asm.instr("D;JGT")
+    asm.blank()
+    asm.instr("@0x10")
+    asm.instr("D=A")
+    asm.add_line_raw("(OUTPUT_FIRST)")
+    asm.label("INFINITE_LOOP")
+    asm.instr("@INFINITE_LOOP")
+    asm.instr("0;JMP")
+
+    assert asm.lines[:3] == ["// Max, more or less", "  @R0", "  D=M"]
+    assert asm.lines[7:11] == ["", "  @0x10", "  D=A", "(OUTPUT_FIRST)"]
+
+    ops, symbols, statics = project_06.assemble(asm)
+    assert (ops, symbols, statics) == project_06.assemble(asm.lines)
+    assert ops[6] == 16
+    assert symbols == {"OUTPUT_FIRST": 8, "INFINITE_LOOP": 8}
+    assert statics == {"x": 16}
+
+
+def test_forward_references_and_redefinition():
+    """Labels can be referred to before they're defined, and the last definition wins, regardless
+    of where the references are. Statics are allocated in order of first reference."""
+
+    from nand.solutions import solved_06
+
+    lines = """
+        @END
+        0;JMP
+        @y
+        M=0
+        (END)
+        @x
+        M=1
+        @y
+        M=1
+        (END)
+        @END
+        0;JMP
+    """.split("\n")
+
+    for assemble in (solved_06.assemble, solved_06.assemble_simple):
+        ops, symbols, statics = assemble(lines)
+        assert ops[0] == ops[8] == 8
+        assert symbols == {"END": 8}
+        assert statics == {"y": 16, "x": 17}
+
+
+def test_assemble_pong():
+    """The single-pass assembler gives the same result as the simple, three-pass one, for a large
+    program."""
+
+    from nand.solutions import solved_06
+
+    with open("examples/Pong.asm") as f:
+        lines = f.read().split("\n")
+
+    assert solved_06.assemble(lines) == solved_06.assemble_simple(lines)
@@ -516,3 +516,52 @@ def test_parse_array_test():
         ])
 
     assert ast == expected
+
+
+def test_token_locations():
+    from nand.solutions import solved_10
+
+    tokens = solved_10.lex(ARRAY_TEST)
+    assert tokens[0] == ("keyword", "class")
+    assert (tokens[0].line, tokens[0].column) == (10, 1)
+    let = tokens[23]
+    assert let == ("keyword", "let") and (let.line, let.column) == (16, 6)
+
+    with pytest.raises(Exception) as exc_info:
+        solved_10.lex('class Foo {\n  /* comment */ "unterminated\n}')
+    assert "line 2, column 17" in str(exc_info.value)
+
+    with pytest.raises(parsing.ParseFailure) as exc_info:
+        solved_10.parse_class("class Foo {\n  field int x\n}")
+    assert "line 3, column 1" in str(exc_info.value)
+
+
+def test_lex_large_sources():
+    """The single-pattern lexer gives the same tokens as the simple one, for the largest sources
+    around: the OS and Pong.
+    """
+
+    import glob
+    from nand.solutions import solved_10
+
+    for name, pattern in (("OS", "nand/solutions/solved_12/*.jack"), ("Pong", "examples/project_11/Pong/*.jack")):
+        src = "\n".join(open(path).read() for path in sorted(glob.glob(pattern)))
+
+        assert solved_10.lex(src) == solved_10.lex_simple(src), name
+
+
+def test_parse_memo():
+    """Parsing with a Memo gives the same AST, re-using some results (mostly terms that were
+    already parsed once as part of an expression.)
+    """
+
+    import glob
+    from nand.parsing import Memo
+    from nand.solutions import solved_10
+
+    for path in sorted(glob.glob("nand/solutions/solved_12/*.jack")):
+        src = open(path).read()
+        memo = Memo()
+        assert solved_10.parse_class(src, memo=memo) == solved_10.ClassP.parse(solved_10.lex(src))
+        assert memo.misses > 0
+        print(f"{path}: {memo}")
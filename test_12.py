@@ -151,10 +151,133 @@ def test_memory_lib_reuse():
     pass
 
 
-def test_memory_lib_stress():
-    # TODO: a series of alloc and deAlloc calls for blocks of various sizes, which will
-    # fragment the heap if no effort is made to prevent it.
-    pass  # TODO
+def test_memory_lib_split(memory_class=project_12.MEMORY_CLASS, platform=BUNDLED_PLATFORM, simulator='codegen'):
+    """Part of a free block is allocated, and then something bigger, which has to come from
+    further along the free list."""
+
+    split_test = platform.parser("""
+class Main {
+    function void main() {
+        var Array a, b, c, d;
+
+        let a = Memory.alloc(20);
+        let b = Memory.alloc(20);
+        do Memory.deAlloc(a);
+
+        // Only part of the freed block is needed, so it can be split:
+        let c = Memory.alloc(5);
+
+        // Too big for what's left of it:
+        let d = Memory.alloc(100);
+
+        // Fill each block, then add up what's in each one, to check that none of them overlap:
+        do Main.fill(b, 20, 1);
+        do Main.fill(c, 5, 2);
+        do Main.fill(d, 100, 3);
+        do Memory.poke(8000, Main.sum(b, 20));
+        do Memory.poke(8001, Main.sum(c, 5));
+        do Memory.poke(8002, Main.sum(d, 100));
+
+        return;
+    }
+
+    function void fill(Array arr, int size, int value) {
+        var int i;
+        let i = 0;
+        while (i < size) {
+            let arr[i] = value;
+            let i = i + 1;
+        }
+        return;
+    }
+
+    function int sum(Array arr, int size) {
+        var int i, total;
+        let i = 0;
+        let total = 0;
+        while (i < size) {
+            let total = total + arr[i];
+            let i = i + 1;
+        }
+        return total;
+    }
+}
+""")
+
+    translator = platform.translator()
+
+    translator.preamble()
+
+    translate_jack(translator, platform, memory_class)
+
+    translate_library(translator, platform, "Array")
+    translate_jack(translator, platform, minimal_sys_lib("Memory", platform))
+
+    translate_jack(translator, platform, split_test)
+
+    translator.finish()
+
+    translator.check_references()
+
+    computer, _ = run_to_halt(translator, platform, simulator)
+
+    assert computer.peek(8000) == 20
+    assert computer.peek(8001) == 10
+    assert computer.peek(8002) == 300
+
+
+def test_memory_lib_stress(memory_class=project_12.MEMORY_CLASS, platform=BUNDLED_PLATFORM, simulator='codegen'):
+    computer, cycles = run_memory_stress(memory_class, platform, simulator)
+
+    print(f"cycles: {cycles:0,d}")
+
+    assert computer.peek(8000) == 320  # blocks allocated
+    assert computer.peek(8001) == 0    # blocks corrupted
+
+
+def run_memory_stress(memory_class, platform, simulator='codegen'):
+    """Run MemoryStressTest, which makes a series of alloc and deAlloc calls for blocks of various
+    sizes, which will fragment the heap if no effort is made to prevent it.
+
+    :return: the computer, and the number of cycles until the program halted.
+    """
+
+    stress_test = _parse_jack_file("examples/project_12/MemoryStressTest.jack", platform)
+
+    translator = platform.translator()
+
+    translator.preamble()
+
+    translate_jack(translator, platform, memory_class)
+
+    translate_library(translator, platform, "Array")
+    translate_jack(translator, platform, minimal_sys_lib("Memory", platform))
+
+    translate_jack(translator, platform, stress_test)
+
+    translator.finish()
+
+    translator.check_references()
+
+    return run_to_halt(translator, platform, simulator)
+
+
+def run_to_halt(translator, platform, simulator='codegen', stop_cycles=10_000_000):
+    """Run the translated program until it reaches Sys.halt.
+
+    :return: the computer, and the number of cycles until the program halted.
+    """
+
+    computer = run(platform.chip, simulator=simulator)
+    asm, _, _ = platform.assemble(translator.asm)
+    computer.init_rom(asm)
+
+    halt_start, _ = translator.asm.find_function("Sys", "halt")
+
+    cycles = computer.ticktock_until(stop_cycles, {halt_start})
+    assert computer.pc == halt_start, f"still running after {cycles:0,d} cycles"
+
+    return computer, cycles
 
 
 def test_compile_keyboard_lib(keyboard_class=project_12.OUTPUT_CLASS, platform=BUNDLED_PLATFORM):
@@ -525,6 +648,25 @@ class Sys {
 }
 """)
 
+def test_os_ast_cache(tmp_path, monkeypatch):
+    """The OS classes are parsed once, then loaded from the cache, and re-parsed if the source changes."""
+
+    from nand.solutions import solved_10, solved_12
+
+    monkeypatch.setattr(solved_12, "_CACHE_DIR", str(tmp_path))
+
+    ast = solved_12._parse_jack_file("Math")
+    assert len(list(tmp_path.iterdir())) == 1
+    assert solved_12._parse_jack_file("Math") == ast
+    assert len(list(tmp_path.iterdir())) == 1
+
+    with open("nand/solutions/solved_12/Math.jack") as f:
+        assert ast == solved_10.parse_class(f.read())
+    assert solved_12.MATH_ABS in ast.subroutineDecs
+
+    assert solved_12._ast_key("class Foo {}") != solved_12._ast_key("class Bar {}")
+
+
 def _parse_jack_file(path, platform):
     with open(path) as f:
         src = "\n".join(f.readlines())